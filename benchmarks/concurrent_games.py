@@ -0,0 +1,114 @@
+"""
+Many games in one process against a process per game.
+
+Compiles the maze solver and runs it once per seed with --report, then once
+with --games for the same seeds on the given threads, checks that every seed
+has the same result line both ways and compares the games per second.
+The robot commands run on the virtual clock, so they don't wait.
+
+    python benchmarks/concurrent_games.py [--games N] [--threads N] [--size N|WxH] [--cc CC] [-O LEVEL] [--json FILE]
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+
+from slabes.main import Config, compile_program  # noqa: E402
+
+
+PROGRAM = ROOT / "tests" / "compile" / "maze_solver.slb"
+
+RESULT_PREFIX = "slabes-result "
+
+
+def result_lines(stderr: str) -> list[str]:
+    return [line[len(RESULT_PREFIX):] for line in stderr.splitlines() if line.startswith(RESULT_PREFIX)]
+
+
+def run_separately(binary: Path, seeds: range, options: list[str]) -> tuple[float, dict[int, str]]:
+    results = {}
+    start = time.perf_counter()
+    for seed in seeds:
+        process = subprocess.run(
+            [str(binary), f"--seed={seed}", "--report", *options],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, encoding="utf-8",
+        )
+        lines = result_lines(process.stderr)
+        results[seed] = lines[-1] if lines else f"exit code {process.returncode}"
+    return time.perf_counter() - start, results
+
+
+def run_together(binary: Path, seeds: range, threads: int, options: list[str]) -> tuple[float, dict[int, str]]:
+    start = time.perf_counter()
+    process = subprocess.run(
+        [str(binary), f"--seed={seeds.start}", f"--games={len(seeds)}", f"--threads={threads}", *options],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, encoding="utf-8",
+    )
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for line in result_lines(process.stderr):
+        seed, _, result = line.partition(" ")
+        results[int(seed.removeprefix("seed="))] = result
+    return elapsed, results
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("--games", type=int, default=200, help="Number of games, seeds 0 to N - 1")
+    argparser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Threads running the games in one process")
+    argparser.add_argument("--size", default="30", help="Field size, as for the programs")
+    argparser.add_argument("--cc", default="clang", help="C compiler of the program")
+    argparser.add_argument("-O", dest="optimize", type=int, default=2, help="Optimization level of the program")
+    argparser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = argparser.parse_args()
+
+    seeds = range(args.games)
+    options = ["--clock=virtual", f"--size={args.size}"]
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        conf = Config(
+            str(PROGRAM), out_dir / (PROGRAM.stem + ".out"), out_dir / (PROGRAM.stem + ".c"),
+            PROGRAM.read_text("utf-8"), optimize=args.optimize, cc=args.cc,
+        )
+        if compile_program(conf):
+            raise SystemExit(f"failed to compile {PROGRAM}")
+
+        separate_time, separate = run_separately(conf.bin_path, seeds, options)
+        together_time, together = run_together(conf.bin_path, seeds, args.threads, options)
+
+    different = [seed for seed in seeds if separate[seed] != together.get(seed)]
+    for seed in different[:10]:
+        print(f"seed {seed}:\n    separately: {separate[seed]}\n    together:   {together.get(seed)}")
+
+    print(f"{'':<24} {'time':>10} {'games/s':>10}")
+    print(f"{'a process per game':<24} {separate_time * 1000:>8.1f}ms {len(seeds) / separate_time:>10.1f}")
+    print(f"{f'--threads={args.threads}':<24} {together_time * 1000:>8.1f}ms {len(seeds) / together_time:>10.1f}")
+    print(f"{len(seeds) - len(different)} of {len(seeds)} games have the same result")
+
+    if args.json is not None:
+        results = {
+            "games": len(seeds), "threads": args.threads, "size": args.size,
+            "separate_time": separate_time, "together_time": together_time, "different_seeds": different,
+        }
+        Path(args.json).write_text(json.dumps(results, indent=4) + "\n", "utf-8")
+
+    if different:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
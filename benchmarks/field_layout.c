@@ -0,0 +1,226 @@
+/*
+Player moves on the two array Field of the game against the one byte per cell PackedField.
+
+For every side N it generates a backtracker maze on the N x (2N + 1) field and walks it
+with the left hand rule on both layouts until the robot made 2 moves per cell, which
+goes through the whole maze. It reports the median nanoseconds per attempted step
+and checks that both walks end in the same cell.
+
+Only a measurement: Field in libslabes/slabes.h keeps its walls and cells arrays,
+which the maze files, the traces, the shared games and the displays use as they are.
+
+    make bench_field
+    ./benchmarks/field_layout.out [-n RUNS] [SIDE...]
+*/
+
+#include "../slabes/libslabes/slabes.c"
+
+#include <time.h>
+
+#define DEFAULT_RUNS 5
+#define MOVES_PER_CELL 2
+
+static const size_t DEFAULT_SIDES[] = {100, 1000, 3000};
+
+// a compact copy of the field: one byte per cell, the walls in the low 6 bits with the edges
+// of the field closed like walls, and the cell in the top 2. The parity of the row is carried
+// along with the index, so a step is a mask test, a table lookup and an add, with no bounds checks
+typedef enum : uint8_t {
+    PackedEmpty = 0 << 6,
+    PackedPlayer = 1 << 6,
+    PackedFinish = 2 << 6,
+    PackedWall = 3 << 6,
+} PackedCell;
+
+#define PACKED_CELL_MASK 0xC0
+
+typedef struct {
+    size_t width, height;
+    uint8_t *cells;
+    ptrdiff_t neighbour_delta[2][AllDirections + 1];  // of the index, per row parity and direction
+} PackedField;
+
+PackedCell packed_cell(Cell cell) {
+    switch (cell) {
+        case Player: return PackedPlayer;
+        case Finish: return PackedFinish;
+        case Wall: return PackedWall;
+        default: return PackedEmpty;
+    }
+}
+
+void packed_field_construct(PackedField *packed, Field *field) {
+    packed->width = field->width;
+    packed->height = field->height;
+    packed->cells = (uint8_t *)SLABES_MALLOC(field->width * field->height);
+    for (size_t parity = 0; parity < 2; ++parity) {
+        for (size_t direction = 0; direction <= AllDirections; ++direction) {
+            packed->neighbour_delta[parity][direction] = NEIGHBOUR_DY[direction] * (ptrdiff_t)field->width + NEIGHBOUR_DX[parity][direction];
+        }
+    }
+
+    for (size_t y = 0; y < field->height; ++y) {
+        for (size_t x = 0; x < field->width; ++x) {
+            Walls walls = WALLS_AT(field, x, y) & AllDirections;
+            for (size_t i = 0; i < DirectionCount; ++i) {
+                Position pos = {x, y};
+                if (!field_move_position_in_direction(field, &pos, 1 << i)) {
+                    walls |= 1 << i;
+                }
+            }
+            packed->cells[INDEX_OF(field, x, y)] = walls | packed_cell(FIELD_AT(field, x, y));
+        }
+    }
+}
+
+void packed_field_destruct(PackedField *packed) {
+    SLABES_FREE(packed->cells);
+    packed->cells = NULL;
+}
+
+// game_try_step on the packed field, the player mark moves with the index
+bool packed_field_step(PackedField *packed, size_t *index, uint8_t *parity, Direction direction) {
+    direction &= AllDirections;
+    uint8_t *cell = &packed->cells[*index];
+    if (*cell & direction) {
+        return false;
+    }
+    size_t next = *index + packed->neighbour_delta[*parity][direction];
+    if ((packed->cells[next] & PACKED_CELL_MASK) == PackedWall) {
+        return false;
+    }
+    *cell &= AllDirections;
+    packed->cells[next] = (packed->cells[next] & AllDirections) | PackedPlayer;
+    *index = next;
+    *parity ^= NEIGHBOUR_DY[direction] & 1;
+    return true;
+}
+
+double now_seconds() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec / 1e9;
+}
+
+int compare_doubles(const void *a, const void *b) {
+    double x = *(const double *)a, y = *(const double *)b;
+    return (x > y) - (x < y);
+}
+
+// the left hand rule: turn left, then clockwise until a step works, the attempts are returned
+size_t walk_field(Game *game, size_t moves) {
+    size_t attempts = 0;
+    Direction direction = game->player_direction;
+    for (size_t i = 0; i < moves; ++i) {
+        direction = left_rotated_direction(direction);
+        for (size_t turn = 0; turn < DirectionCount; ++turn) {
+            ++attempts;
+            game->player_direction = direction;
+            if (game_try_step(game)) {
+                break;
+            }
+            direction = right_rotated_direction(direction);
+        }
+    }
+    return attempts;
+}
+
+size_t walk_packed(PackedField *packed, size_t *index, uint8_t *parity, Direction direction, size_t moves) {
+    size_t attempts = 0;
+    for (size_t i = 0; i < moves; ++i) {
+        direction = left_rotated_direction(direction);
+        for (size_t turn = 0; turn < DirectionCount; ++turn) {
+            ++attempts;
+            if (packed_field_step(packed, index, parity, direction)) {
+                break;
+            }
+            direction = right_rotated_direction(direction);
+        }
+    }
+    return attempts;
+}
+
+void measure(size_t side, int runs) {
+    Game game = {0};
+    rng_seed(&game.rng, 0);
+    size_t width = side, height = side * 2 + 1;
+    if (!field_size_is_valid(width, height)) {
+        printf("%10zu  too large\n", side);
+        return;
+    }
+    size_t cell_count = width * height;
+    size_t moves = cell_count * MOVES_PER_CELL;
+
+    field_construct(&game.field, width, height);
+    game_reset(&game);
+    game_set_player_position(&game, (Position){0, 0});
+    game_generate_a_maze(&game);
+    Position start = game.player_position;
+
+    double *field_elapsed = (double *)SLABES_MALLOC(sizeof(double) * runs);
+    double *packed_elapsed = (double *)SLABES_MALLOC(sizeof(double) * runs);
+    size_t field_attempts = 0, packed_attempts = 0;
+    bool same = true;
+    double pack_time = 0;
+    for (int i = 0; i < runs; ++i) {
+        game_set_player_position(&game, start);
+        game.player_direction = Up;
+        double begin = now_seconds();
+        field_attempts = walk_field(&game, moves);
+        field_elapsed[i] = now_seconds() - begin;
+        size_t field_end = INDEX_OF(&game.field, game.player_position.x, game.player_position.y);
+
+        game_set_player_position(&game, start);
+        begin = now_seconds();
+        PackedField packed;
+        packed_field_construct(&packed, &game.field);
+        pack_time = now_seconds() - begin;
+
+        size_t index = INDEX_OF(&game.field, start.x, start.y);
+        uint8_t parity = start.y % 2;
+        begin = now_seconds();
+        packed_attempts = walk_packed(&packed, &index, &parity, Up, moves);
+        packed_elapsed[i] = now_seconds() - begin;
+        packed_field_destruct(&packed);
+
+        same = same && packed_attempts == field_attempts && index == field_end;
+    }
+    qsort(field_elapsed, runs, sizeof(double), compare_doubles);
+    qsort(packed_elapsed, runs, sizeof(double), compare_doubles);
+    double field_ns = field_elapsed[runs / 2] * 1e9 / field_attempts;
+    double packed_ns = packed_elapsed[runs / 2] * 1e9 / packed_attempts;
+
+    printf("%10zu %12zu %12zu %10.2fns %10.2fns %8.2fx %10.2fms %s\n",
+        side, cell_count, field_attempts, field_ns, packed_ns, field_ns / packed_ns, pack_time * 1000, same? "same" : "DIFFERENT");
+
+    SLABES_FREE(packed_elapsed);
+    SLABES_FREE(field_elapsed);
+    field_destruct(&game.field);
+}
+
+int main(int argc, char *argv[]) {
+    int runs = DEFAULT_RUNS;
+    size_t sides[64];
+    size_t side_count = 0;
+
+    for (int i = 1; i < argc; ++i) {
+        if (strcmp(argv[i], "-n") == 0 && i + 1 < argc) {
+            runs = atoi(argv[++i]);
+        } else if (side_count < sizeof(sides) / sizeof(*sides)) {
+            sides[side_count++] = strtoull(argv[i], NULL, 10);
+        }
+    }
+    if (runs < 1) {
+        runs = 1;
+    }
+    if (side_count == 0) {
+        side_count = sizeof(DEFAULT_SIDES) / sizeof(*DEFAULT_SIDES);
+        memcpy(sides, DEFAULT_SIDES, sizeof(DEFAULT_SIDES));
+    }
+
+    printf("%10s %12s %12s %12s %12s %9s %12s\n", "side", "cells", "steps", "field", "packed", "speedup", "packing");
+    for (size_t i = 0; i < side_count; ++i) {
+        measure(sides[i], runs);
+    }
+    return EXIT_SUCCESS;
+}
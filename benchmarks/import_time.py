@@ -0,0 +1,105 @@
+"""
+Startup time of the compiler.
+
+Every scenario runs in a fresh interpreter, "cold" with an empty cache
+(so the prelude and the lexer tables are generated) and "warm" with
+the cache filled by a previous run.
+
+    python benchmarks/import_time.py [-n RUNS] [--json FILE]
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SAMPLE = ROOT / "tests" / "compile" / "fibonacci_recur.slb"
+
+SCENARIOS = {
+    "import": ["-c", "import slabes.main"],
+    "help": ["-m", "slabes", "--help"],
+    "lexer": ["-c", "from slabes.lexer import get_lexer; get_lexer()"],
+    "prelude": ["-c", "from slabes.codegen import get_prelude; get_prelude()"],
+    "c code": [
+        "-c",
+        "import sys; from slabes.main import parse_args, generate_c;"
+        f" generate_c(parse_args(['slabes', {str(SAMPLE)!r}]))",
+    ],
+}
+
+
+def run(args: list[str], cache_dir: str) -> float:
+    env = dict(os.environ, XDG_CACHE_HOME=cache_dir, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def measure(args: list[str], runs: int) -> dict[str, float]:
+    cold = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold.append(run(args, cache_dir))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        run(args, cache_dir)
+        warm = [run(args, cache_dir) for _ in range(runs)]
+
+    return {"cold": statistics.median(cold), "warm": statistics.median(warm)}
+
+
+def slowest_imports(count: int) -> list[tuple[str, int]]:
+    """Modules with the largest self time (in microseconds) on a warm start"""
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, XDG_CACHE_HOME=cache_dir)
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import slabes.main"],
+            cwd=ROOT, env=env, check=True, capture_output=True, encoding="utf-8",
+        )
+
+    result = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        result.append((name.strip(), int(self_time)))
+    return sorted(result, key=lambda it: it[1], reverse=True)[:count]
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("-n", "--runs", type=int, default=5, help="Runs per scenario, the median is reported")
+    argparser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = argparser.parse_args()
+
+    results = {}
+    print(f"{'scenario':<10} {'cold':>9} {'warm':>9}")
+    for name, scenario in SCENARIOS.items():
+        results[name] = measure(scenario, args.runs)
+        print(f"{name:<10} {results[name]['cold'] * 1000:>7.1f}ms {results[name]['warm'] * 1000:>7.1f}ms")
+
+    print()
+    print("slowest imports (self time):")
+    imports = slowest_imports(10)
+    for name, self_time in imports:
+        print(f"    {self_time / 1000:>7.1f}ms {name}")
+
+    if args.json is not None:
+        results["imports"] = dict(imports)
+        Path(args.json).write_text(json.dumps(results, indent=4) + "\n", "utf-8")
+
+
+if __name__ == "__main__":
+    main()
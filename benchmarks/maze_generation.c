@@ -0,0 +1,94 @@
+/*
+Maze generation throughput of libslabes across field sizes.
+
+For every generator and side N it generates mazes on the N x (2N + 1) field
+and reports the median number of cells per second.
+
+    make bench_maze
+    ./benchmarks/maze_generation.out [-n RUNS] [-g GENERATOR] [SIDE...]
+*/
+
+#include "../slabes/libslabes/slabes.c"
+
+#include <time.h>
+
+#define DEFAULT_RUNS 5
+
+static const size_t DEFAULT_SIDES[] = {10, 100, 300, 1000, 3000};
+
+double now_seconds() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec / 1e9;
+}
+
+int compare_doubles(const void *a, const void *b) {
+    double x = *(const double *)a, y = *(const double *)b;
+    return (x > y) - (x < y);
+}
+
+void measure(MazeGenerator generator, size_t side, int runs) {
+    Game game = {0};
+    game.maze_generator = generator;
+    rng_seed(&game.rng, 0);
+    size_t width = side, height = side * 2 + 1;
+    if (!field_size_is_valid(width, height)) {
+        printf("%-12s %10zu  too large\n", maze_generator_name(generator), side);
+        return;
+    }
+    size_t cell_count = width * height;
+
+    field_construct(&game.field, width, height);
+    double *elapsed = (double *)SLABES_MALLOC(sizeof(double) * runs);
+    for (int i = 0; i < runs; ++i) {
+        game_reset(&game);
+        game_set_player_position(&game, (Position){0, 0});
+
+        double start = now_seconds();
+        game_generate_a_maze(&game);
+        elapsed[i] = now_seconds() - start;
+    }
+    qsort(elapsed, runs, sizeof(double), compare_doubles);
+    double median = elapsed[runs / 2];
+
+    printf("%-12s %10zu %12zu %12.2fms %14.0f\n", maze_generator_name(generator), side, cell_count, median * 1000, cell_count / median);
+
+    SLABES_FREE(elapsed);
+    field_destruct(&game.field);
+}
+
+int main(int argc, char *argv[]) {
+    int runs = DEFAULT_RUNS;
+    size_t sides[64];
+    size_t side_count = 0;
+    MazeGenerator only = MazeGeneratorCount;
+
+    for (int i = 1; i < argc; ++i) {
+        if (strcmp(argv[i], "-n") == 0 && i + 1 < argc) {
+            runs = atoi(argv[++i]);
+        } else if (strcmp(argv[i], "-g") == 0 && i + 1 < argc) {
+            if (!maze_generator_from_name(argv[++i], &only)) {
+                printf("unknown generator %s\n", argv[i]);
+                return EXIT_FAILURE;
+            }
+        } else if (side_count < sizeof(sides) / sizeof(*sides)) {
+            sides[side_count++] = strtoull(argv[i], NULL, 10);
+        }
+    }
+    if (runs < 1) {
+        runs = 1;
+    }
+    if (side_count == 0) {
+        side_count = sizeof(DEFAULT_SIDES) / sizeof(*DEFAULT_SIDES);
+        memcpy(sides, DEFAULT_SIDES, sizeof(DEFAULT_SIDES));
+    }
+
+    printf("%-12s %10s %12s %14s %14s\n", "generator", "side", "cells", "median", "cells/sec");
+    for (MazeGenerator generator = 0; generator < MazeGeneratorCount; ++generator) {
+        if (only != MazeGeneratorCount && generator != only) { continue; }
+        for (size_t i = 0; i < side_count; ++i) {
+            measure(generator, sides[i], runs);
+        }
+    }
+    return 0;
+}
@@ -0,0 +1,115 @@
+"""
+Bytecode vm against the native code generation.
+
+For every program it measures the time from the source to something
+runnable (front end + bytecode vs front end + c code + cc) and the run
+time of the vm and of the compiled binary. Robot commands don't sleep.
+
+    python benchmarks/vm_vs_native.py [-n RUNS] [--cc CC] [-O LEVEL] [--json FILE]
+"""
+
+from __future__ import annotations
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+
+from slabes.main import Config, front_end, compile_program, compile_vm  # noqa: E402
+from slabes.bytecode import generate_bytecode  # noqa: E402
+
+
+PROGRAMS = [
+    ROOT / "tests" / "compile" / "fibonacci_recur.slb",
+    ROOT / "tests" / "compile" / "maze_solver.slb",
+]
+
+DEFINES = ("NO_DELAY_ON_ROBOT_OP",)
+
+
+def timed(function) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def make_config(path: Path, out_dir: Path, args: argparse.Namespace) -> Config:
+    return Config(
+        str(path), out_dir / (path.stem + ".out"), out_dir / (path.stem + ".c"),
+        path.read_text("utf-8"),
+        optimize=args.optimize, cc=args.cc, defines=DEFINES,
+    )
+
+
+def compile_bytecode(conf: Config) -> Path:
+    program = generate_bytecode(conf.source, front_end(conf), conf.in_path)
+    path = conf.bin_path.with_suffix(".sbc")
+    path.write_bytes(program.to_bytes())
+    return path
+
+
+def run(args: list[str]) -> None:
+    subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+
+
+def measure(path: Path, vm: Path, out_dir: Path, args: argparse.Namespace) -> dict[str, float]:
+    native_compile, vm_compile, native_run, vm_run = [], [], [], []
+    for _ in range(args.runs):
+        conf = make_config(path, out_dir, args)
+        elapsed, returncode = timed(lambda: compile_program(conf))
+        if returncode:
+            raise SystemExit(f"failed to compile {path}")
+        native_compile.append(elapsed)
+
+        conf = make_config(path, out_dir, args)
+        elapsed, bytecode = timed(lambda: compile_bytecode(conf))
+        vm_compile.append(elapsed)
+
+        native_run.append(timed(lambda: run([str(conf.bin_path)]))[0])
+        vm_run.append(timed(lambda: run([str(vm), str(bytecode)]))[0])
+
+    return {
+        "native compile": statistics.median(native_compile),
+        "vm compile": statistics.median(vm_compile),
+        "native run": statistics.median(native_run),
+        "vm run": statistics.median(vm_run),
+    }
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("-n", "--runs", type=int, default=5, help="Runs per program, the median is reported")
+    argparser.add_argument("--cc", default="clang", help="C compiler for the binaries and the vm")
+    argparser.add_argument("-O", dest="optimize", type=int, default=2, help="Optimization level of the binaries and the vm")
+    argparser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = argparser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        vm = out_dir / "slabes_vm.out"
+        if not compile_vm(make_config(PROGRAMS[0], out_dir, args), vm):
+            raise SystemExit("failed to compile the vm")
+
+        columns = ["native compile", "vm compile", "native run", "vm run"]
+        print(f"{'program':<18}" + "".join(f"{name:>16}" for name in columns))
+        for path in PROGRAMS:
+            results[path.name] = measure(path, vm, out_dir, args)
+            print(f"{path.name:<18}" + "".join(f"{results[path.name][name] * 1000:>14.1f}ms" for name in columns))
+
+    if args.json is not None:
+        Path(args.json).write_text(json.dumps(results, indent=4) + "\n", "utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import os
+import sys
+import csv
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+from pathlib import Path
+from dataclasses import dataclass, asdict, fields
+
+from .game import MAZE_GENERATORS, Field
+from .main import add_build_arguments, make_config, compile_program, report_timing
+
+
+# Runs a compiled solver on many seeded mazes at once. Every run is a separate
+# process with the virtual clock and --report, the result line it prints on
+# stderr (slabes_report_result in slabes_prelude.c) is all that is kept.
+# The timeout is passed to the program as --time-limit, so a stuck run still
+# reports where it got to, it's only killed if it doesn't stop by itself.
+
+SOURCE_SUFFIX = ".slb"
+TRACE_SUFFIX = ".trace"
+RESULT_PREFIX = "slabes-result"
+
+PERCENTILES = (50, 90, 99)
+
+DEFAULT_TIMEOUT = 10.0
+KILL_GRACE = 1.0  # seconds after the timeout before the program is killed
+
+EXIT_BUDGET = 3  # SLABES_EXIT_BUDGET
+
+# the numbers of the result line kept in RunResult
+RESULT_FIELDS = ("steps", "robot_ops", "iterations", "x", "y", "simulated_ms", "cycle_length", "wall_bumps", "distinct_cells")
+
+
+@dataclass
+class RunResult:
+    seed: int
+    # finished, stopped (the program ended elsewhere or made no maze), robot_ops_exhausted, iterations_exhausted,
+    # time_limit (stopped by the program), cycle (the robot repeats itself), timeout (killed), crashed
+    status: str
+    returncode: int | None
+    wall_time: float
+    steps: int | None = None
+    robot_ops: int | None = None
+    iterations: int | None = None
+    x: int | None = None
+    y: int | None = None
+    simulated_ms: int | None = None
+    cycle_length: int | None = None
+    wall_bumps: int | None = None
+    distinct_cells: int | None = None
+
+
+def parse_seeds(spec: str) -> range:
+    """'N' for the seeds 0 to N - 1 or 'START:STOP' for START to STOP - 1"""
+
+    start, _, stop = spec.rpartition(":")
+    try:
+        seeds = range(int(start or 0), int(stop))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid seed range '{spec}', expected N or START:STOP") from None
+    if not seeds or seeds.start < 0:
+        raise argparse.ArgumentTypeError(f"empty seed range '{spec}'")
+    return seeds
+
+
+def parse_result_line(stderr: str) -> dict[str, str] | None:
+    for line in reversed(stderr.splitlines()):
+        if line.startswith(RESULT_PREFIX + " "):
+            return dict(it.split("=", 1) for it in line.split()[1:] if "=" in it)
+    return None
+
+
+async def run_one(binary: Path, seed: int, program_args: list[str], timeout: float, limit: asyncio.Semaphore, trace_dir: Path | None) -> RunResult:
+    if trace_dir is not None:
+        program_args = [*program_args, f"--trace={trace_dir / f'seed-{seed}{TRACE_SUFFIX}'}"]
+    async with limit:
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            str(binary), f"--seed={seed}", "--clock=virtual", f"--time-limit={timeout:g}", "--report", *program_args,
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout + KILL_GRACE)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return RunResult(seed, "timeout", None, time.perf_counter() - start)
+        wall_time = time.perf_counter() - start
+
+    values = parse_result_line(stderr.decode("utf-8", "replace"))
+    if process.returncode not in (0, EXIT_BUDGET) or values is None:
+        return RunResult(seed, "crashed", process.returncode, wall_time)
+
+    result = RunResult(seed, values.get("status", "stopped"), process.returncode, wall_time)
+    for name in RESULT_FIELDS:
+        if name in values:
+            setattr(result, name, int(values[name]))
+    return result
+
+
+async def run_all(binary: Path, seeds: range, program_args: list[str], timeout: float, jobs: int, trace_dir: Path | None) -> list[RunResult]:
+    limit = asyncio.Semaphore(jobs)
+    return await asyncio.gather(*(run_one(binary, seed, program_args, timeout, limit, trace_dir) for seed in seeds))
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Linear interpolation between the closest ranks, values must be sorted"""
+
+    position = (len(values) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def distribution(values: list[float]) -> dict[str, float] | None:
+    if not values:
+        return None
+    values = sorted(values)
+    result = {"min": values[0], "mean": sum(values) / len(values)}
+    for p in PERCENTILES:
+        result[f"p{p}"] = percentile(values, p)
+    result["max"] = values[-1]
+    return result
+
+
+def summarize(results: list[RunResult], wall_time: float) -> dict[str, object]:
+    finished = [it for it in results if it.status == "finished"]
+    counts: dict[str, int] = {}
+    for it in results:
+        counts[it.status] = counts.get(it.status, 0) + 1
+    return {
+        "runs": len(results),
+        "statuses": counts,
+        "success_rate": len(finished) / len(results),
+        "steps_to_finish": distribution([it.steps for it in finished if it.steps is not None]),
+        "robot_ops_to_finish": distribution([it.robot_ops for it in finished if it.robot_ops is not None]),
+        "wall_bumps": distribution([it.wall_bumps for it in results if it.wall_bumps is not None]),
+        "distinct_cells": distribution([it.distinct_cells for it in results if it.distinct_cells is not None]),
+        "run_wall_time": distribution([it.wall_time for it in results]),
+        "total_wall_time": wall_time,
+        "runs_per_second": len(results) / wall_time if wall_time > 0 else None,
+    }
+
+
+def print_summary(summary: dict[str, object]) -> None:
+    statuses = ", ".join(f"{count} {status}" for status, count in sorted(summary["statuses"].items()))
+    print(f"{summary['runs']} runs: {statuses}, success rate {summary['success_rate']:.1%}")
+
+    columns = ["min", "mean", *(f"p{p}" for p in PERCENTILES), "max"]
+    print(f"{'':<20}" + "".join(f"{name:>12}" for name in columns))
+    for name, unit in (("steps_to_finish", ""), ("robot_ops_to_finish", ""), ("wall_bumps", ""), ("distinct_cells", ""), ("run_wall_time", "ms")):
+        values = summary[name]
+        if values is None:
+            print(f"{name:<20}" + f"{'-':>12}" * len(columns))
+            continue
+        scale = 1000 if unit == "ms" else 1
+        print(f"{name:<20}" + "".join(f"{values[it] * scale:>10.1f}{unit:<2}" for it in columns))
+
+    print(f"total {summary['total_wall_time']:.3f}s, {summary['runs_per_second']:.1f} runs/s")
+
+
+def write_csv(path: Path, results: list[RunResult]) -> None:
+    with path.open("w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=[it.name for it in fields(RunResult)])
+        writer.writeheader()
+        for it in results:
+            writer.writerow(asdict(it))
+
+
+def compile_source(args: argparse.Namespace, source: Path, out_dir: Path) -> Path | None:
+    conf = make_config(args, str(source), source.read_text("utf-8"), out_dir / (source.stem + ".c"), out_dir / (source.stem + ".out"))
+    try:
+        returncode = compile_program(conf)
+    finally:
+        report_timing(conf)
+    return None if returncode else conf.bin_path.absolute()
+
+
+def main(argv: list[str] = sys.argv) -> None:
+    argparser = argparse.ArgumentParser(prog="slabes bench-run", description="Run a solver on many seeded mazes on all cores and report how it did")
+    argparser.add_argument("program", help=f"Compiled program, or a {SOURCE_SUFFIX} source to compile first")
+    argparser.add_argument("--seeds", type=parse_seeds, default=parse_seeds("100"), metavar="N|START:STOP", help="Maze seeds, N for 0 to N - 1 (default: 100)")
+    argparser.add_argument("--size", default=None, metavar="N|WxH", help="Field size, as for the programs")
+    argparser.add_argument("--maze", choices=MAZE_GENERATORS, default=None, help="Maze generator")
+    argparser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Number of programs running at once")
+    argparser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help=f"Seconds a run may take, the program stops itself then and is killed {KILL_GRACE:g}s later (default: {DEFAULT_TIMEOUT:g})")
+    argparser.add_argument("--max-robot-ops", type=int, default=None, metavar="N", help="Stop a run after this many robot commands")
+    argparser.add_argument("--max-iterations", type=int, default=None, metavar="N", help="Stop a run after this many loop iterations")
+    argparser.add_argument("--cycle-limit", type=int, default=None, metavar="N", help="Stop a run when the robot is in the same state for the N-th time")
+    argparser.add_argument("--json", default=None, metavar="FILE", help="Write the summary and every run to this file")
+    argparser.add_argument("--csv", default=None, metavar="FILE", help="Write every run to this file, one row per seed")
+    argparser.add_argument("--trace-dir", default=None, metavar="DIR", help=f"Record every run to DIR/seed-N{TRACE_SUFFIX}, for libslabes/slabes_replay")
+    argparser.add_argument("program_args", nargs="*", help="Passed to the program")
+    add_build_arguments(argparser)
+
+    args = argparser.parse_args(argv[1:])
+
+    program_args = list(args.program_args)
+    if args.size is not None:
+        try:
+            Field.parse_size(args.size)
+        except ValueError as e:
+            print(f"slabes bench-run: {e}", file=sys.stderr)
+            exit(1)
+        program_args.insert(0, f"--size={args.size}")
+    if args.maze is not None:
+        program_args.insert(0, f"--maze={args.maze}")
+    if args.max_robot_ops is not None:
+        program_args.insert(0, f"--max-robot-ops={args.max_robot_ops}")
+    if args.max_iterations is not None:
+        program_args.insert(0, f"--max-iterations={args.max_iterations}")
+    if args.cycle_limit is not None:
+        program_args.insert(0, f"--cycle-limit={args.cycle_limit}")
+    if not args.timeout > 0:
+        print("slabes bench-run: the timeout must be positive", file=sys.stderr)
+        exit(1)
+
+    trace_dir = None
+    if args.trace_dir is not None:
+        trace_dir = Path(args.trace_dir).absolute()
+        trace_dir.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        program = Path(args.program)
+        if program.suffix == SOURCE_SUFFIX:
+            binary = compile_source(args, program, Path(tmp))
+            if binary is None:
+                exit(1)
+        else:
+            binary = program.absolute()
+
+        start = time.perf_counter()
+        try:
+            results = asyncio.run(run_all(binary, args.seeds, program_args, args.timeout, max(1, args.jobs), trace_dir))
+        except OSError as e:
+            print(f"slabes bench-run: {e}", file=sys.stderr)
+            exit(1)
+        wall_time = time.perf_counter() - start
+
+    summary = summarize(results, wall_time)
+    print_summary(summary)
+
+    if args.json is not None:
+        report = {"program": args.program, "program_args": program_args, "summary": summary, "runs": [asdict(it) for it in results]}
+        Path(args.json).write_text(json.dumps(report, indent=4) + "\n", "utf-8")
+    if args.csv is not None:
+        write_csv(Path(args.csv), results)
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import io
+import os
+import sys
+import glob
+import time
+import argparse
+import traceback
+import subprocess
+
+from pathlib import Path
+from dataclasses import dataclass, field
+from contextlib import redirect_stdout
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from . import errors
+from .cache import BuildCache
+from .main import Config, add_build_arguments, make_config, build_key, build_prelude, cc_command, generate_c
+from .timing import TimeReport, write_chrome_trace
+
+
+SOURCE_SUFFIX = ".slb"
+
+
+@dataclass
+class FrontEndResult:
+    c_code: str | None
+    output: str
+    time: float
+    timing: TimeReport  # filled in the worker process
+
+
+@dataclass
+class BuildResult:
+    conf: Config
+    status: str = "pending"  # ok, cached, error
+    output: str = ""
+    front_end_time: float = 0.0
+    cc_time: float = 0.0
+    key: str | None = field(default=None, repr=False)
+
+    @property
+    def total_time(self) -> float:
+        return self.front_end_time + self.cc_time
+
+
+def collect_sources(patterns: list[str]) -> list[Path]:
+    """Expand files, directories (searched recursively for .slb files) and glob patterns"""
+
+    result: list[Path] = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            result.extend(sorted(path.rglob("*" + SOURCE_SUFFIX)))
+        elif path.exists():
+            result.append(path)
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                print(f"warning: '{pattern}' did not match any files")
+            result.extend(Path(it) for it in matches)
+
+    unique: dict[Path, None] = {}
+    for path in result:
+        unique.setdefault(path.resolve(), None)
+    return [Path(os.path.relpath(it)) for it in unique]
+
+
+def output_paths(sources: list[Path], out_dir: Path | None) -> list[tuple[Path, Path]]:
+    if out_dir is None:
+        return [(it.with_suffix(".c"), it.with_suffix(".out")) for it in sources]
+
+    # keep the directory structure, so files with the same name don't collide
+    root = Path(os.path.commonpath([it.resolve().parent for it in sources]))
+    result = []
+    for source in sources:
+        relative = source.resolve().relative_to(root)
+        result.append(((out_dir / relative).with_suffix(".c"), (out_dir / relative).with_suffix(".out")))
+    return result
+
+
+def front_end(conf: Config) -> FrontEndResult:
+    """Run in a worker process: source -> c code, capturing all the diagnostics"""
+
+    start = time.perf_counter()
+    output = io.StringIO()
+    c_code = None
+    with redirect_stdout(output):
+        try:
+            c_code = generate_c(conf)
+        except SystemExit:
+            pass  # errors are reported and then exit is called
+        except Exception:
+            traceback.print_exc(file=output)
+        finally:
+            errors.clear_reported()
+    return FrontEndResult(c_code, output.getvalue(), time.perf_counter() - start, conf.timing)
+
+
+def back_end(result: BuildResult, c_code: str) -> BuildResult:
+    conf = result.conf
+    start = time.perf_counter()
+    try:
+        conf.c_path.parent.mkdir(parents=True, exist_ok=True)
+        conf.c_path.write_text(c_code, "utf-8")
+        with conf.timing.phase("cc"):
+            process = subprocess.run(cc_command(conf), input=c_code, capture_output=True, encoding="utf-8")
+    except OSError as e:
+        result.status = "error"
+        result.output += f"{e}\n"
+    else:
+        result.status = "ok" if process.returncode == 0 else "error"
+        result.output += process.stderr
+    result.cc_time = time.perf_counter() - start
+    return result
+
+
+def print_summary(results: list[BuildResult], wall_time: float) -> None:
+    width = max([len("file")] + [len(str(it.conf.in_path)) for it in results])
+    print(f"{'file':<{width}}  {'result':<7} {'front-end':>10} {'cc':>10} {'total':>10}")
+    for it in results:
+        print(
+            f"{str(it.conf.in_path):<{width}}  {it.status:<7}"
+            f" {it.front_end_time:>9.3f}s {it.cc_time:>9.3f}s {it.total_time:>9.3f}s"
+        )
+
+    counts = {status: 0 for status in ("ok", "cached", "error")}
+    for it in results:
+        counts[it.status] = counts.get(it.status, 0) + 1
+    print(
+        f"{len(results)} files: {counts['ok']} ok, {counts['cached']} cached,"
+        f" {counts['error']} failed in {wall_time:.3f}s"
+    )
+
+
+def build(confs: list[Config], jobs: int) -> list[BuildResult]:
+    results = [BuildResult(conf) for conf in confs]
+
+    cache = None
+    if confs and confs[0].cache_dir is not None:
+        cache = BuildCache(confs[0].cache_dir, confs[0].cache_size)
+
+        if confs[0].precompiled_prelude:
+            prelude_object = build_prelude(confs[0], cache)
+            if prelude_object is None:
+                for it in results:
+                    it.status = "error"
+                    it.output = "failed to build the runtime prelude\n"
+                return results
+            for conf in confs:
+                conf.prelude_object = prelude_object
+
+        for it in results:
+            it.key = build_key(it.conf)
+            if cache.load(it.key, {".c": it.conf.c_path, ".out": it.conf.bin_path}):
+                it.status = "cached"
+
+    pending = [it for it in results if it.status == "pending"]
+    if not pending:
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as front_pool, \
+            ThreadPoolExecutor(max_workers=jobs) as cc_pool:
+        front_futures = {front_pool.submit(front_end, it.conf): it for it in pending}
+        cc_futures: list[Future[BuildResult]] = []
+
+        for future in as_completed(front_futures):
+            result = front_futures[future]
+            try:
+                front = future.result()
+            except Exception as e:  # the worker died
+                result.status = "error"
+                result.output = f"front-end failed: {e!r}\n"
+                continue
+
+            result.front_end_time = front.time
+            result.output = front.output
+            result.conf.timing = front.timing
+            if front.c_code is None:
+                result.status = "error"
+                continue
+
+            cc_futures.append(cc_pool.submit(back_end, result, front.c_code))
+
+        for cc_future in as_completed(cc_futures):
+            result = cc_future.result()
+            if result.status == "ok" and cache is not None and result.key is not None:
+                cache.save(result.key, {".c": result.conf.c_path, ".out": result.conf.bin_path})
+
+    return results
+
+
+def main(argv: list[str] = sys.argv) -> None:
+    argparser = argparse.ArgumentParser(prog="slabes build", description="Compile many programs at once")
+    argparser.add_argument("sources", nargs="+", help="Input files, directories or glob patterns")
+    argparser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Number of parallel jobs")
+    argparser.add_argument("--out-dir", default=None, help="Directory for the output files (default: next to the sources)")
+    add_build_arguments(argparser)
+
+    args = argparser.parse_args(argv[1:])
+
+    sources = collect_sources(args.sources)
+    if not sources:
+        print("no input files")
+        exit(1)
+
+    out_dir = None if args.out_dir is None else Path(args.out_dir)
+    confs = []
+    for source, (c_file, bin_file) in zip(sources, output_paths(sources, out_dir)):
+        text = source.read_text("utf-8")
+        confs.append(make_config(args, str(source), text, c_file, bin_file))
+
+    start = time.perf_counter()
+    results = build(confs, max(1, args.jobs))
+    wall_time = time.perf_counter() - start
+
+    for it in results:
+        if it.output.strip() or it.conf.timing.phases:
+            print(f"==> {it.conf.in_path} ({it.status})")
+            if it.output.strip():
+                print(it.output.rstrip())
+            if it.conf.timing.phases:
+                it.conf.timing.print()
+            print()
+
+    print_summary(results, wall_time)
+
+    if args.trace is not None:
+        write_chrome_trace(Path(args.trace), {str(it.conf.in_path): it.conf.timing for it in results})
+        print(f"trace written to {args.trace}")
+
+    exit(any(it.status == "error" for it in results))
@@ -0,0 +1,618 @@
+from __future__ import annotations
+
+import struct
+
+from enum import IntEnum
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+from typing import Callable
+
+from . import types as ts
+from . import errors
+from . import eval as ev
+from .errors import report_fatal_at
+from .codegen import MAIN_FUNCTION, is_variable
+from .name_table import lookup_origin
+from .parser_base import DEFAULT_FILENAME
+from .pygen import IntRange, int_range, convert, bin_op_type
+
+
+# Bytecode backend: the evaluated tree is compiled into a register based
+# bytecode that libslabes/slabes_vm.c interprets, so running a program
+# needs only the python front end and a vm that is built once.
+#
+# Every instruction is four 32 bit words: the opcode with the type index
+# in the high bits, and the operands a, b and c. Registers are per call
+# frame, globals live in a separate array, jump targets are relative to
+# the start of the function. Integer semantics follow the python backend,
+# which follows the c prelude.
+
+
+MAGIC = b"SLBC"
+VERSION = 1
+
+TYPE_SHIFT = 8
+NO_FUNCTION = -1
+
+
+class Op(IntEnum):
+    """Keep in sync with enum Opcode in libslabes/slabes_vm.c"""
+
+    CONST = 0         # a = b
+    MOVE = 1          # a = reg b
+    GET_GLOBAL = 2    # a = global b
+    SET_GLOBAL = 3    # global a = reg b
+    CLAMP = 4         # a = reg b clamped into the range of the type
+    WRAP = 5          # a = reg b converted to the storage of the type
+    ADD = 6           # a = b + c, saturating in the type
+    SUB = 7
+    MUL = 8
+    DIV = 9
+    EQ = 10           # a = b == c
+    NE = 11
+    LE = 12
+    GE = 13
+    JUMP = 14         # to a
+    JUMP_IF = 15      # to b if reg a
+    JUMP_IF_NOT = 16  # to b if not reg a
+    CALL = 17         # a = function b, arguments start at reg c
+    RET = 18          # return reg a
+    MATRIX_INIT = 19  # fill matrix in reg a (allocated if null) with b, c is the side
+    MATRIX_INDEX = 20 # a = b + c * side, side is the max of the index type
+    MATRIX_GET = 21   # a = matrix b [c]
+    MATRIX_SET = 22   # matrix a [b] = c
+    MATRIX_FREE = 23  # free the matrix in reg a
+    PRINT = 24        # print reg a with the format of the type
+    PRINT_MATRIX = 25 # print reg a as a pointer
+    PRINT_END = 26
+    ASSERT = 27       # fail with string b if not reg a
+    ROBOT = 28        # a = robot command b
+
+
+class Robot(IntEnum):
+    GO = 0
+    RL = 1
+    RR = 2
+    SONAR = 3
+    COMPASS = 4
+    GENERATE_MAZE = 5
+
+
+ROBOT_COMMANDS = {
+    ev.RobotCommandGo: Robot.GO,
+    ev.RobotCommandRL: Robot.RL,
+    ev.RobotCommandRR: Robot.RR,
+    ev.RobotCommandSonar: Robot.SONAR,
+    ev.RobotCommandCompass: Robot.COMPASS,
+    ev.FuncGenerateMaze: Robot.GENERATE_MAZE,
+}
+
+BIN_OPS = {"add": Op.ADD, "sub": Op.SUB, "mul": Op.MUL, "div": Op.DIV}
+
+CMP_OPS = {"eq": Op.EQ, "ne": Op.NE, "le": Op.LE, "ge": Op.GE}
+
+# ops that use the type index
+TYPED_OPS = {
+    Op.CLAMP, Op.WRAP, Op.ADD, Op.SUB, Op.MUL, Op.DIV,
+    Op.MATRIX_INIT, Op.MATRIX_INDEX, Op.PRINT,
+}
+
+
+@dataclass
+class Instruction:
+    op: Op
+    a: int = 0
+    b: int = 0
+    c: int = 0
+    type: int = 0
+
+    def __str__(self) -> str:
+        name = self.op.name
+        if self.op in TYPED_OPS:
+            name += f".{self.type}"
+        return f"{name:<16} {self.a:>6} {self.b:>6} {self.c:>6}"
+
+
+@dataclass
+class FunctionCode:
+    name: str
+    arg_count: int
+    register_count: int = 0
+    code: list[Instruction] = field(default_factory=list)
+
+
+@dataclass
+class Program:
+    types: list[IntRange] = field(default_factory=list)
+    global_count: int = 0
+    strings: list[str] = field(default_factory=list)
+    functions: list[FunctionCode] = field(default_factory=list)
+    init: int = NO_FUNCTION
+    main: int = NO_FUNCTION
+
+    def to_bytes(self) -> bytes:
+        """Little endian, see load_program in libslabes/slabes_vm.c"""
+
+        out = bytearray(MAGIC)
+        out += struct.pack("<I", VERSION)
+
+        out += struct.pack("<I", len(self.types))
+        for tp in self.types:
+            out += struct.pack("<iiii", tp.min, tp.max, tp.bits, tp.signed)
+
+        out += struct.pack("<I", self.global_count)
+
+        out += struct.pack("<I", len(self.strings))
+        for string in self.strings:
+            data = string.encode("utf-8")
+            out += struct.pack("<I", len(data)) + data
+
+        start = 0
+        out += struct.pack("<I", len(self.functions))
+        for function in self.functions:
+            out += struct.pack("<IIII", function.arg_count, function.register_count, start, len(function.code))
+            start += len(function.code)
+
+        out += struct.pack("<ii", self.init, self.main)
+
+        out += struct.pack("<I", start)
+        for function in self.functions:
+            for it in function.code:
+                out += struct.pack("<iiii", it.op | it.type << TYPE_SHIFT, it.a, it.b, it.c)
+
+        return bytes(out)
+
+    def disassemble(self) -> str:
+        lines = []
+        for i, tp in enumerate(self.types):
+            lines.append(f"type {i}: [{tp.min}, {tp.max}] in {'' if tp.signed else 'u'}int{tp.bits}")
+        lines.append(f"globals: {self.global_count}")
+        for i, string in enumerate(self.strings):
+            lines.append(f"string {i}: {string!r}")
+
+        for i, function in enumerate(self.functions):
+            lines.append("")
+            lines.append(f"function {i} {function.name}({function.arg_count} args, {function.register_count} registers)")
+            for j, it in enumerate(function.code):
+                lines.append(f"  {j:>4}  {it}")
+        return "\n".join(lines) + "\n"
+
+
+INIT_FUNCTION = "<module>"
+
+
+@dataclass
+class GenerateBytecode:
+    program: Program = field(default_factory=Program)
+
+    function_indices: dict[str, int] = field(default_factory=dict)
+    type_indices: dict[str, int] = field(default_factory=dict)
+    string_indices: dict[str, int] = field(default_factory=dict)
+    globals: dict[str, int] = field(default_factory=dict)
+
+    function: FunctionCode = field(init=False)
+    scope: ev.ScopeValue = field(init=False)
+    registers: dict[str, int] = field(default_factory=dict)
+    named_registers: int = 0
+    next_register: int = 0
+    last_result: Instruction | None = None
+
+    _filepath: str = field(default=DEFAULT_FILENAME)
+    _lines: list[str] = field(default_factory=list)
+
+    def visit(self, node):
+        method = "visit_" + node.__class__.__name__
+        visitor = getattr(self, method, None)
+        if visitor is None:
+            report_fatal_at(
+                node.loc,
+                errors.SyntaxError,
+                f"analysis node '{type(node).__name__}' is currently not supported for the bytecode backend",
+                self._lines,
+            )
+        return visitor(node)
+
+    def generate(
+        self, code: str, eval: ev.Module, filepath: str = DEFAULT_FILENAME
+    ) -> Program:
+        self._filepath = filepath
+        self._lines = code.splitlines()
+        self.visit(eval)
+
+        for function in self.program.functions:
+            if not function.code:
+                assert False, f"function '{function.name}' is called, but never defined"
+        return self.program
+
+    def emit(self, op: Op, a: int = 0, b: int = 0, c: int = 0, type: int = 0) -> Instruction:
+        it = Instruction(op, a, b, c, type)
+        self.function.code.append(it)
+        return it
+
+    def label(self) -> int:
+        return len(self.function.code)
+
+    def patch(self, jump: Instruction, target: int) -> None:
+        if jump.op == Op.JUMP:
+            jump.a = target
+        else:
+            jump.b = target
+
+    def result(self, it: Instruction) -> int:
+        """Register written by the instruction that computed the value of an expression"""
+
+        self.last_result = it
+        return it.a
+
+    def move(self, dst: int, reg: int) -> None:
+        """Copy, or make the instruction that computed a temporary write directly to dst"""
+
+        if dst == reg:
+            return
+        last = self.computed(reg)
+        if last is not None:
+            last.a = dst
+        else:
+            self.emit(Op.MOVE, dst, reg)
+
+    def computed(self, reg: int) -> Instruction | None:
+        """The last instruction, if it computed the temporary reg and nothing else refers to it yet"""
+
+        last = self.function.code[-1] if self.function.code else None
+        if last is not None and last is self.last_result and last.a == reg and reg >= self.named_registers:
+            return last
+        return None
+
+    def fold(self, reg: int, operation: Callable[[int], int]) -> int | None:
+        """Apply the conversion at compile time if reg holds a constant"""
+
+        last = self.computed(reg)
+        if last is None or last.op != Op.CONST:
+            return None
+        last.b = operation(last.b)
+        return reg
+
+    def function_index(self, name: str, arg_count: int = 0) -> int:
+        index = self.function_indices.get(name)
+        if index is None:
+            index = len(self.program.functions)
+            self.function_indices[name] = index
+            self.program.functions.append(FunctionCode(name, arg_count))
+        return index
+
+    def type_index(self, name: str) -> int:
+        index = self.type_indices.get(name)
+        if index is None:
+            index = len(self.program.types)
+            self.type_indices[name] = index
+            self.program.types.append(int_range(name))
+        return index
+
+    def string_index(self, string: str) -> int:
+        index = self.string_indices.get(string)
+        if index is None:
+            index = len(self.program.strings)
+            self.string_indices[string] = index
+            self.program.strings.append(string)
+        return index
+
+    def temporary(self, count: int = 1) -> int:
+        result = self.next_register
+        self.next_register += count
+        self.function.register_count = max(self.function.register_count, self.next_register)
+        return result
+
+    @contextmanager
+    def statement(self):
+        """Temporaries are freed after every statement"""
+
+        start = self.next_register
+        try:
+            yield
+        finally:
+            self.next_register = start
+
+    @contextmanager
+    def new_function(self, function: FunctionCode, scope: ev.ScopeValue):
+        old = (
+            getattr(self, "function", None), getattr(self, "scope", None),
+            self.registers, self.named_registers, self.next_register,
+        )
+        self.function, self.scope = function, scope
+        self.registers, self.named_registers, self.next_register = {}, 0, 0
+        try:
+            yield function
+        finally:
+            function.register_count = max(function.register_count, self.next_register)
+            (
+                self.function, self.scope,  # type: ignore[assignment]
+                self.registers, self.named_registers, self.next_register,
+            ) = old
+
+    def local_matrices(self, node: ev.ScopeValue) -> list[int]:
+        return [
+            self.registers[name]
+            for name, value in node.name_to_value.items()
+            if not node.names[name].is_arg and isinstance(value, ev.Matrix)
+        ]
+
+    def visit_Module(self, node: ev.Module):
+        for name, value in node.name_to_value.items():
+            if is_variable(value.type):
+                self.globals[name] = len(self.globals)
+        self.program.global_count = len(self.globals)
+
+        init = self.function_index(INIT_FUNCTION)
+        self.program.init = init
+        with self.new_function(self.program.functions[init], node):
+            for it in node.body:
+                with self.statement():
+                    self.visit(it)
+            zero = self.temporary()
+            self.emit(Op.CONST, zero, 0)
+            self.emit(Op.RET, zero)
+
+    def visit_Function(self, node: ev.Function):
+        if not isinstance(self.scope, ev.Module):
+            report_fatal_at(
+                node.loc,
+                errors.SyntaxError,
+                "nested functions are not supported for the bytecode backend",
+                self._lines,
+            )
+
+        args = node.args or {}
+        index = self.function_index(node.name, len(args))
+        if node.name == MAIN_FUNCTION:
+            self.program.main = index
+
+        with self.new_function(self.program.functions[index], node):
+            for name in args:
+                self.registers[name] = self.temporary()
+            for name, value in node.name_to_value.items():
+                if node.names[name].is_arg or not is_variable(value.type):
+                    continue
+                self.registers[name] = self.temporary()
+            self.named_registers = self.next_register
+
+            for it in node.body:
+                with self.statement():
+                    self.visit(it)
+
+            # falling off the end of a function is undefined in c, be predictable here
+            for reg in self.local_matrices(node):
+                self.emit(Op.MATRIX_FREE, reg)
+            zero = self.temporary()
+            self.emit(Op.CONST, zero, 0)
+            self.emit(Op.RET, zero)
+
+    def is_global(self, name: str) -> bool:
+        if name in self.registers:
+            return False
+        origin = lookup_origin(self.scope, name)
+        return isinstance(origin, ev.Module) and name in self.globals
+
+    def load_name(self, name: str) -> int:
+        if not self.is_global(name):
+            return self.registers[name]
+        return self.result(self.emit(Op.GET_GLOBAL, self.temporary(), self.globals[name]))
+
+    def store_name(self, name: str, reg: int) -> None:
+        if self.is_global(name):
+            self.emit(Op.SET_GLOBAL, self.globals[name], reg)
+        else:
+            self.move(self.registers[name], reg)
+
+    def visit_Assign(self, node: ev.Assign):
+        for target in node.targets:
+            if isinstance(target, ev.SubscriptOperation):
+                item = target.value.evaluated.type.item_type.name()
+                value = self.wrap(self.expr(node.value), node.value.evaluated.type.name(), item)
+                matrix, index = self.element(target)
+                self.emit(Op.MATRIX_SET, matrix, index, value)
+                continue
+
+            assert isinstance(target, ev.Name)
+            name = target.value
+            origin = lookup_origin(self.scope, name) or self.scope
+            tp = origin.name_to_value[name].type
+
+            if isinstance(node.value, ev.Matrix):
+                assert isinstance(tp, ts.MatrixType), "Matrix evaluated not to MatrixType"
+                item = int_range(tp.item_type.name())
+                size = int_range(node.value.type.index_type.name()).max
+                reg = self.load_name(name)
+                self.emit(Op.MATRIX_INIT, reg, item.wrap(node.value.value), size, self.type_index(tp.item_type.name()))
+                self.store_name(name, reg)
+                continue
+
+            if not is_variable(tp):
+                self.visit(node.value)
+                continue
+
+            if isinstance(node.value, ev.Int):
+                assert isinstance(tp, ts.IntType), "Int evaluated not to IntType"
+                signed = "" if tp.signed else "unsigned_"
+                value = int_range(signed + "big").wrap(self.constant(node.value))
+                reg = self.result(self.emit(Op.CONST, self.temporary(), convert(value, signed + "big", tp.name())))
+            elif isinstance(tp, ts.IntType) and isinstance(node.value.evaluated.type, ts.IntType):
+                reg = self.convert(self.expr(node.value), node.value.evaluated.type.name(), tp.name())
+            else:
+                reg = self.expr(node.value)
+            self.store_name(name, reg)
+
+    def constant(self, node: ev.Int) -> int:
+        return int_range(node.type.name()).clamp(node.value)
+
+    def convert(self, reg: int, name1: str, name2: str) -> int:
+        if name1 == name2:
+            return reg
+        folded = self.fold(reg, lambda value: convert(value, name1, name2))
+        if folded is not None:
+            return folded
+        return self.result(self.emit(Op.CLAMP, self.temporary(), reg, type=self.type_index(name2)))
+
+    def wrap(self, reg: int, name: str, result_name: str) -> int:
+        """Implicit c conversion of the value of type name to the storage type of result_name"""
+
+        source, result = int_range(name), int_range(result_name)
+        if result.storage_min <= source.storage_min and source.storage_max <= result.storage_max:
+            return reg
+        folded = self.fold(reg, result.wrap)
+        if folded is not None:
+            return folded
+        return self.result(self.emit(Op.WRAP, self.temporary(), reg, type=self.type_index(result_name)))
+
+    def visit_Return(self, node: ev.Return):
+        if not isinstance(node.evaluated, ev.Int):
+            report_fatal_at(
+                node.loc,
+                errors.TypeError,
+                f"return type '{node.evaluated.type}' is not supported in the bytecode backend"
+            )
+        reg = self.wrap(self.expr(node.evalue), node.evalue.evaluated.type.name(), node.evaluated.type.name())
+        if isinstance(self.scope, ev.Function):
+            for matrix in self.local_matrices(self.scope):
+                self.emit(Op.MATRIX_FREE, matrix)
+        self.emit(Op.RET, reg)
+
+    def visit_Condition(self, node: ev.Condition):
+        with self.statement():
+            jump = self.emit(Op.JUMP_IF_NOT, self.expr(node.test))
+        for it in node.body:
+            with self.statement():
+                self.visit(it)
+        self.patch(jump, self.label())
+
+    def visit_Loop(self, node: ev.Loop):
+        start = self.label()
+        with self.statement():
+            jump = self.emit(Op.JUMP_IF, self.expr(node.test))
+        for it in node.body:
+            with self.statement():
+                self.visit(it)
+        self.patch(self.emit(Op.JUMP), start)
+        self.patch(jump, self.label())
+
+    def visit_Call(self, node: ev.Call):
+        self.call(node, used=False)
+
+    def visit_Int(self, node: ev.Int):
+        pass
+
+    def visit_BinaryOperation(self, node: ev.BinaryOperation):
+        self.expr(node)
+
+    def visit_CompareOperation(self, node: ev.CompareOperation):
+        self.expr(node)
+
+    def visit_Name(self, node: ev.Name):
+        pass
+
+    def visit_SubscriptOperation(self, node: ev.SubscriptOperation):
+        self.expr(node)
+
+    def element(self, node: ev.SubscriptOperation) -> tuple[int, int]:
+        """Registers of the matrix and of the flat index of the element"""
+
+        matrix = self.expr(node.value)
+        index1 = self.expr(node.index1)
+        index2 = self.expr(node.index2)
+        index = self.temporary()
+        self.emit(Op.MATRIX_INDEX, index, index1, index2, self.type_index(node.value.evaluated.type.index_type.name()))
+        return matrix, index
+
+    def expr(self, node: ev.Eval) -> int:
+        """Register with the value of the node"""
+
+        if isinstance(node, ev.Int):
+            return self.result(self.emit(Op.CONST, self.temporary(), self.constant(node)))
+
+        if isinstance(node, ev.Name):
+            return self.load_name(node.value)
+
+        if isinstance(node, ev.BinaryOperation):
+            name1 = node.lhs.evaluated.type.name()
+            name2 = node.rhs.evaluated.type.name()
+            name = bin_op_type(name1, name2)
+            lhs = self.convert(self.expr(node.lhs), name1, name)
+            rhs = self.convert(self.expr(node.rhs), name2, name)
+            return self.result(self.emit(BIN_OPS[node.op.name.lower()], self.temporary(), lhs, rhs, self.type_index(name)))
+
+        if isinstance(node, ev.CompareOperation):
+            # like in c, the middle operands are evaluated twice
+            reg = self.temporary()
+            jumps = []
+            lhs = node.operand
+            for i, (op, rhs) in enumerate(zip(node.ops, node.operands)):
+                if i:
+                    jumps.append(self.emit(Op.JUMP_IF_NOT, reg))
+                it = self.emit(CMP_OPS[op.name.lower()], reg, self.expr(lhs), self.expr(rhs))
+                lhs = rhs
+            if not jumps:
+                return self.result(it)
+            for jump in jumps:
+                self.patch(jump, self.label())
+            return reg
+
+        if isinstance(node, ev.SubscriptOperation):
+            matrix, index = self.element(node)
+            return self.result(self.emit(Op.MATRIX_GET, self.temporary(), matrix, index))
+
+        if isinstance(node, ev.Call):
+            return self.call(node)
+
+        report_fatal_at(
+            node.loc,
+            errors.SyntaxError,
+            f"'{type(node).__name__}' is currently not supported as an expression in the bytecode backend",
+            self._lines,
+        )
+
+    def call(self, node: ev.Call, used: bool = True) -> int:
+        function = node.operand.evaluated
+        result = self.temporary()
+
+        if isinstance(function, ev.FuncPrint):
+            for arg in node.args:
+                tp = arg.evaluated.type
+                if isinstance(tp, ts.MatrixType):
+                    self.emit(Op.PRINT_MATRIX, self.expr(arg))
+                else:
+                    self.emit(Op.PRINT, self.expr(arg), type=self.type_index(tp.name()))
+            self.emit(Op.PRINT_END)
+            if used:
+                self.emit(Op.CONST, result, 0)
+            return result
+
+        if isinstance(function, ev.FuncAssert):
+            for arg in node.args:
+                exact_str = arg.loc.get_exact_str_from_lines(self._lines)
+                if exact_str is None:
+                    message = "expression"
+                else:
+                    message = "'" + exact_str + "'"
+                message += f" evaluated to false (at {arg.loc})"
+                value = self.convert(self.expr(arg), arg.evaluated.type.name(), "unsigned_tiny")
+                self.emit(Op.ASSERT, value, self.string_index(message))
+            if used:
+                self.emit(Op.CONST, result, 1)
+            return result
+
+        command = ROBOT_COMMANDS.get(type(function))
+        if command is not None:
+            return self.result(self.emit(Op.ROBOT, result, command))
+
+        assert isinstance(function, ev.Function), report_fatal_at(
+            node.loc, errors.TypeError, "Not a function"
+        )
+        params = list((function.args or {}).values())
+        first = self.temporary(len(params))
+        for i, (arg, param) in enumerate(zip(node.args, params)):
+            reg = self.wrap(self.expr(arg), arg.evaluated.type.name(), param.type.name())
+            self.move(first + i, reg)
+        return self.result(self.emit(Op.CALL, result, self.function_index(function.name, len(params)), first))
+
+
+def generate_bytecode(code: str, module: ev.Module, filepath: str = DEFAULT_FILENAME) -> Program:
+    return GenerateBytecode().generate(code, module, filepath)
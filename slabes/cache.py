@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import os
+import hmac
+import json
+import shutil
+import hashlib
+import tempfile
+import subprocess
+
+from pathlib import Path
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
+
+from . import __version__
+
+
+DIR = Path(__file__).parent
+
+CACHE_VERSION = 1
+TABLES_VERSION = 3  # 2: keyed by the compiler sources, stored with a digest, 3: json and literals
+
+TABLE_SUFFIX = ".table"
+TABLE_DIGEST_SIZE = hashlib.sha256().digest_size
+TABLES_KEPT = 4  # of every name, the least recently used ones are evicted
+
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024  # bytes
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME")
+    if base:
+        return Path(base) / "slabes"
+    return Path.home() / ".cache" / "slabes"
+
+
+@lru_cache(maxsize=None)
+def compiler_version(cc: str) -> str:
+    try:
+        result = subprocess.run([cc, "--version"], capture_output=True, encoding="utf-8")
+    except OSError:
+        return ""
+    return result.stdout
+
+
+def files_hash(paths: list[Path]) -> str:
+    hasher = hashlib.sha256()
+    for path in paths:
+        hasher.update(path.relative_to(DIR).as_posix().encode("utf-8"))
+        hasher.update(b"\0")
+        hasher.update(path.read_bytes())
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def compiler_sources_hash() -> str:
+    """Hash of everything that can change the produced binary
+    besides the user program: the compiler itself and the runtime."""
+
+    paths = sorted(DIR.glob("*.py")) + sorted(DIR.glob("*.[ch]")) + sorted((DIR / "libslabes").glob("*.[ch]"))
+    return files_hash(paths)
+
+
+def make_key(*parts: object) -> str:
+    hasher = hashlib.sha256()
+    hasher.update(f"slabes {__version__} cache {CACHE_VERSION}".encode("utf-8"))
+    for part in parts:
+        hasher.update(b"\0")
+        hasher.update(str(part).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+_tables_cache_dir: Path | None = default_cache_dir()
+
+
+def use_tables_cache(cache_dir: Path | None) -> None:
+    """Keep the tables under the build cache directory, None to make them on every start"""
+
+    global _tables_cache_dir
+    _tables_cache_dir = cache_dir
+
+
+def tables_dir() -> Path | None:
+    """Tables that the compiler itself derives from its sources (prelude, lexer), None if they aren't kept"""
+
+    if _tables_cache_dir is None:
+        return None
+    return _tables_cache_dir / f"tables-v{TABLES_VERSION}"
+
+
+def table_digest(key: str, data: bytes) -> bytes:
+    return hashlib.sha256(key.encode("utf-8") + b"\0" + data).digest()
+
+
+def load_table_bytes(name: str, key: str) -> bytes | None:
+    """
+    The data save_table_bytes stored under the key, None if there is none
+    or it doesn't match the digest it was stored with (a partial or corrupted file),
+    then the caller rebuilds it. The digest is not a signature, the tables
+    hold data only and are loaded without running any code.
+    """
+
+    directory = tables_dir()
+    if directory is None:
+        return None
+    path = directory / f"{name}-{key}{TABLE_SUFFIX}"
+    try:
+        content = path.read_bytes()
+        os.utime(path)  # mark as recently used
+    except OSError:
+        return None
+    digest, data = content[:TABLE_DIGEST_SIZE], content[TABLE_DIGEST_SIZE:]
+    if not hmac.compare_digest(digest, table_digest(key, data)):
+        return None
+    return data
+
+
+def save_table_bytes(name: str, key: str, data: bytes) -> None:
+    """Stored as the digest of the key and the data followed by the data"""
+
+    directory = tables_dir()
+    if directory is None:
+        return
+    try:
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    except OSError:
+        return  # the table is just rebuilt next time
+
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(table_digest(key, data))
+            file.write(data)
+        os.replace(tmp, directory / f"{name}-{key}{TABLE_SUFFIX}")
+    except OSError:
+        pass
+    finally:
+        Path(tmp).unlink(missing_ok=True)
+    evict_tables(directory, name)
+
+
+def evict_tables(directory: Path, name: str) -> None:
+    """
+    Other checkouts and versions of slabes share the directory and keep tables of their own sources,
+    so only the least recently used ones beyond TABLES_KEPT are deleted
+    """
+
+    tables = []
+    for path in directory.glob(f"{name}-*{TABLE_SUFFIX}"):
+        try:
+            tables.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            continue
+    tables.sort(reverse=True)
+    for _, path in tables[TABLES_KEPT:]:
+        path.unlink(missing_ok=True)
+
+
+def load_table(name: str, key: str) -> object | None:
+    """A table saved with save_table, json"""
+
+    data = load_table_bytes(name, key)
+    if data is None:
+        return None
+    try:
+        return json.loads(data)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None
+
+
+def save_table(name: str, key: str, value: object) -> None:
+    save_table_bytes(name, key, json.dumps(value).encode("utf-8"))
+
+
+@dataclass
+class BuildCache:
+    """
+    Content-addressed store of build artifacts.
+    Every entry is a group of files that share the key and differ by suffix.
+    Least recently used entries are evicted once the total size exceeds max_size.
+    """
+
+    directory: Path
+    max_size: int = DEFAULT_CACHE_SIZE
+
+    @property
+    def builds_dir(self) -> Path:
+        return self.directory / f"builds-v{CACHE_VERSION}"
+
+    def entry_path(self, key: str, suffix: str) -> Path:
+        return self.builds_dir / (key + suffix)
+
+    def load(self, key: str, targets: dict[str, Path]) -> bool:
+        """Copy the cached files of the entry into targets (suffix -> path)"""
+
+        paths = {suffix: self.entry_path(key, suffix) for suffix in targets}
+        if not all(path.is_file() for path in paths.values()):
+            return False
+
+        try:
+            for suffix, target in targets.items():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(paths[suffix], target)
+                shutil.copymode(paths[suffix], target)
+                os.utime(paths[suffix])  # mark as recently used
+        except FileNotFoundError:  # evicted by a concurrent build
+            return False
+
+        return True
+
+    def save(self, key: str, sources: dict[str, Path]) -> None:
+        """Store copies of sources (suffix -> path) under the key"""
+
+        self.builds_dir.mkdir(parents=True, exist_ok=True)
+        for suffix, source in sources.items():
+            self.save_file(self.entry_path(key, suffix), source)
+        self.evict()
+
+    def produce(self, key: str, suffix: str, create: Callable[[Path], bool]) -> Path | None:
+        """Return the cached file, creating it with create(path) if it is missing"""
+
+        path = self.entry_path(key, suffix)
+        if path.is_file():
+            os.utime(path)  # mark as recently used
+            return path
+
+        self.builds_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.builds_dir, prefix=".tmp-", suffix=suffix)
+        os.close(fd)
+        try:
+            if not create(Path(tmp)):
+                return None
+            os.replace(tmp, path)
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+        self.evict()
+        return path
+
+    def save_file(self, path: Path, source: Path) -> None:
+        # write to a temporary file first, so concurrent builds
+        # never observe a partially written entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp)
+            shutil.copymode(source, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def evict(self) -> None:
+        entries: dict[str, tuple[float, int, list[Path]]] = {}
+        for path in self.builds_dir.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            key = path.name.split(".", 1)[0]
+            used, size, files = entries.get(key, (0.0, 0, []))
+            files.append(path)
+            entries[key] = (max(used, stat.st_mtime), size + stat.st_size, files)
+
+        total = sum(size for _, size, _ in entries.values())
+        for used, size, files in sorted(entries.values(), key=lambda it: it[0]):
+            if total <= self.max_size:
+                break
+            for path in files:
+                path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        shutil.rmtree(self.builds_dir, ignore_errors=True)
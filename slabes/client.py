@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import socket
+import argparse
+
+from pathlib import Path
+
+from .main import add_build_arguments
+from .server import default_options, default_socket_path
+
+
+def send_request(path: Path, request: dict) -> dict | None:
+    """Send the request to the server, None if the server is not running"""
+
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+
+    with sock, sock.makefile("rwb") as file:
+        file.write(json.dumps(request).encode("utf-8") + b"\n")
+        file.flush()
+        line = file.readline()
+
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def main(argv: list[str] = sys.argv) -> None:
+    argparser = argparse.ArgumentParser(prog="slabes client", description="Send a request to the compiler server or run it in-process if the server is not running")
+    argparser.add_argument("command", choices=["check", "c", "compile", "ping", "shutdown"])
+    argparser.add_argument("filename", nargs="?", default=None, help="Input file ('-' to use stdin)")
+    argparser.add_argument("-c", nargs="?", default=None, help="Output c file")
+    argparser.add_argument("-o", "--output", nargs="?", default=None, help="Output binary file")
+    argparser.add_argument("--socket", default=None, help=f"Socket path (default: {default_socket_path()})")
+    argparser.add_argument("--no-server", action="store_true", help="Always compile in-process")
+    add_build_arguments(argparser)
+
+    args = argparser.parse_args(argv[1:])
+
+    request: dict = {"command": args.command, "cwd": os.getcwd()}
+    if args.command not in ("ping", "shutdown"):
+        if args.filename is None:
+            argparser.error(f"{args.command} requires a filename")
+
+        if args.filename in ("", "-"):
+            request["path"] = "<stdin>"
+            request["source"] = sys.stdin.read()
+        else:
+            request["path"] = args.filename
+            request["source"] = Path(args.filename).read_text("utf-8")
+
+        request["c_path"] = args.c
+        request["bin_path"] = args.output
+        request["options"] = {
+            name: getattr(args, name)
+            for name in default_options()
+        }
+
+    socket_path = default_socket_path() if args.socket is None else Path(args.socket)
+    response = None
+    if not args.no_server:
+        response = send_request(socket_path, request)
+
+    if response is None:
+        if args.command in ("ping", "shutdown"):
+            print(f"server is not running on {socket_path}")
+            exit(1)
+
+        from .server import handle_request
+
+        response = handle_request(request)
+
+    print(response["diagnostics"], end="")
+    if args.command == "c" and "c_code" in response:
+        if args.c is None:
+            print(response["c_code"], end="")
+        else:
+            Path(args.c).write_text(response["c_code"], "utf-8")
+
+    exit(response["returncode"])
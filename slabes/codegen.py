@@ -1,7 +1,9 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterable
 
 from . import ast_nodes as ast
 from . import types as ts
@@ -10,6 +12,7 @@ from . import eval as ev
 from .errors import report_fatal_at
 from .location import Location
 from .parser_base import DEFAULT_FILENAME
+from .cache import compiler_sources_hash, load_table, make_key, save_table
 
 
 DIR = Path(__file__).parent
@@ -45,13 +48,44 @@ INT_TYPE_INFO = {
 SIGN_UNSING = ["", "unsigned_"]
 
 
-INT_TYPE_TEMPLATE = """
+@dataclass
+class PreludePart:
+    """
+    Piece of the runtime prelude.
+    Declarations go into every generated file,
+    definitions can be compiled once and linked in.
+    """
+
+    name: str
+    decl: str
+    defn: str = ""
+    deps: tuple[str, ...] = ()  # names of the parts this one refers to
+
+    def replace(self, old: str, new: str) -> PreludePart:
+        return PreludePart(
+            self.name.replace(old, new),
+            self.decl.replace(old, new),
+            self.defn.replace(old, new),
+            tuple(dep.replace(old, new) for dep in self.deps),
+        )
+
+
+def declaration(definition: str) -> str:
+    """Turn a function definition template into a declaration"""
+
+    signature, _ = definition.strip().split("{", 1)
+    return "\n" + signature.strip() + ";\n"
+
+
+INT_TYPE_DECL_TEMPLATE = """
 typedef /*ctype*/ slabes_type_/*name*/;
 
 #define slabes_format_/*name*/ "/*format*/"
 #define slabes_max_value_/*name*/ /*max_value*/
 #define slabes_min_value_/*name*/ /*min_value*/
+"""
 
+INT_TYPE_TEMPLATE = """
 void assign_slabes_type_/*name*/(slabes_type_/*name*/ *var, slabes_type_/*name*/ value) {
 #ifdef SLABES_DEBUG_OP
     printf("assign_slabes_type_/*name*/(%p, " slabes_format_/*name*/ ")\\n", var, value);
@@ -61,6 +95,13 @@ void assign_slabes_type_/*name*/(slabes_type_/*name*/ *var, slabes_type_/*name*/
 """
 
 
+INT_TYPE_PART = PreludePart(
+    "slabes_type_/*name*/",
+    INT_TYPE_DECL_TEMPLATE + declaration(INT_TYPE_TEMPLATE),
+    INT_TYPE_TEMPLATE,
+)
+
+
 def make_int_types():
     for info in INT_TYPE_INFO.values():
         min_unsigned, max_unsigned = info.unsigned_range()
@@ -69,14 +110,14 @@ def make_int_types():
         else:
             min_signed, max_signed = min_unsigned, max_unsigned
         yield (
-            INT_TYPE_TEMPLATE.replace("/*ctype*/", info.ctype)
+            INT_TYPE_PART.replace("/*ctype*/", info.ctype)
             .replace("/*name*/", info.name)
             .replace("/*format*/", info.format + "i")
             .replace("/*max_value*/", str(max_signed))
             .replace("/*min_value*/", str(min_signed))
         )
         yield (
-            INT_TYPE_TEMPLATE.replace("/*ctype*/", "unsigned_" + info.ctype)
+            INT_TYPE_PART.replace("/*ctype*/", "unsigned_" + info.ctype)
             .replace("/*name*/", "unsigned_" + info.name)
             .replace("/*format*/", info.format + "u")
             .replace("/*max_value*/", str(max_unsigned))
@@ -84,9 +125,6 @@ def make_int_types():
         )
 
 
-INT_TYPES = "\n".join(make_int_types())
-
-
 INT_BIN_OP_TEMPLATE = """
 slabes_type_/*name*/ slabes_op_/*op_name*/__/*name1*/__/*name2*/(slabes_type_/*name1*/ lhs, slabes_type_/*name2*/ rhs) {
     slabes_type_/*name*/ result;
@@ -175,9 +213,27 @@ INT_BIN_OP_INFO_UNSIGNED = [
 ]
 
 
+INT_BIN_OP_PART = PreludePart(
+    "slabes_op_/*op_name*/__/*name1*/__/*name2*/",
+    declaration(INT_BIN_OP_TEMPLATE),
+    INT_BIN_OP_TEMPLATE,
+    ("slabes_type_/*name*/",),
+)
+
+INT_BIN_OP_PART_DIFFERENT_TYPES = PreludePart(
+    "slabes_op_/*op_name*/__/*name1*/__/*name2*/",
+    INT_BIN_OP_TEMPLATE_DIFFERENT_TYPES,
+    deps=(
+        "slabes_op_/*op_name*/__/*name*/__/*name*/",
+        "slabes_convert_/*name1*/_to_/*name*/",
+        "slabes_convert_/*name2*/_to_/*name*/",
+    ),
+)
+
+
 def make_int_bin_ops():
     for info in INT_TYPE_INFO.values():
-        template = INT_BIN_OP_TEMPLATE
+        template = INT_BIN_OP_PART
         for sign, bin_info in zip(SIGN_UNSING, [INT_BIN_OP_INFO_SIGNED, INT_BIN_OP_INFO_UNSIGNED]):
             for op_name, op in bin_info:
                 yield (
@@ -199,7 +255,7 @@ def make_int_bin_ops():
                     for unsig2 in SIGN_UNSING:
                         if i == j and unsig1 == unsig2:
                             continue
-                        template = INT_BIN_OP_TEMPLATE_DIFFERENT_TYPES
+                        template = INT_BIN_OP_PART_DIFFERENT_TYPES
                         yield (
                             template
                             .replace("/*name*/", [unsig1, unsig2][ind_max] + info.name)
@@ -209,9 +265,6 @@ def make_int_bin_ops():
                         )
 
 
-INT_BIN_OPS = "\n".join(make_int_bin_ops())
-
-
 INT_CMP_OP_TEMPLATE = """
 slabes_type_tiny slabes_op_/*op_name*/__/*name1*/__/*name2*/(slabes_type_/*name1*/ lhs, slabes_type_/*name2*/ rhs) {
 #ifdef SLABES_DEBUG_OP
@@ -240,11 +293,19 @@ INT_CMP_OP_INFO = {
 }
 
 
+INT_CMP_OP_PART = PreludePart(
+    "slabes_op_/*op_name*/__/*name1*/__/*name2*/",
+    declaration(INT_CMP_OP_TEMPLATE),
+    INT_CMP_OP_TEMPLATE,
+    ("slabes_type_/*name1*/", "slabes_type_/*name2*/", "slabes_type_tiny", "slabes_type_unsigned_tiny"),
+)
+
+
 def make_int_cmp_ops():
     for info1 in INT_TYPE_INFO.values():
         for info2 in INT_TYPE_INFO.values():
             for op_name, op in INT_CMP_OP_INFO.items():
-                template = INT_CMP_OP_TEMPLATE
+                template = INT_CMP_OP_PART
 
                 for unsig1 in SIGN_UNSING:
                     for unsig2 in SIGN_UNSING:
@@ -257,9 +318,6 @@ def make_int_cmp_ops():
                         )
 
 
-INT_CMP_OPS = "\n".join(make_int_cmp_ops())
-
-
 INT_CONVERT_TEMPLATE = """
 slabes_type_/*name2*/ slabes_convert_/*name1*/_to_/*name2*/(slabes_type_/*name1*/ value) {
 #ifdef SLABES_DEBUG_OP
@@ -289,8 +347,11 @@ INT_CONVERT_TEMPLATE_NOOP = """
 #define slabes_convert_/*name1*/_to_/*name2*/(value) (value)
 """
 
-INT_REMOVE_SIGN = """
+INT_REMOVE_SIGN_MACRO = """
 #define slabes_remove_sign_/*name*/ slabes_convert_/*name*/_to_unsigned_/*name*/
+"""
+
+INT_REMOVE_SIGN = """
 slabes_type_unsigned_/*name*/ slabes_convert_/*name*/_to_unsigned_/*name*/(slabes_type_/*name*/ value) {
 #ifdef SLABES_DEBUG_OP
     printf("slabes_convert_/*name*/_to_unsigned_/*name*/(" slabes_format_/*name*/ ")", value);
@@ -310,8 +371,11 @@ slabes_type_unsigned_/*name*/ slabes_convert_/*name*/_to_unsigned_/*name*/(slabe
 }
 """
 
-INT_ADD_SIGN = """
+INT_ADD_SIGN_MACRO = """
 #define slabes_add_sign_/*name*/ slabes_convert_unsigned_/*name*/_to_/*name*/
+"""
+
+INT_ADD_SIGN = """
 slabes_type_/*name*/ slabes_convert_unsigned_/*name*/_to_/*name*/(slabes_type_unsigned_/*name*/ value) {
 #ifdef SLABES_DEBUG_OP
     printf("slabes_convert_unsigned_/*name*/_to_/*name*/(" slabes_format_/*name*/ ")", value);
@@ -332,19 +396,46 @@ slabes_type_/*name*/ slabes_convert_unsigned_/*name*/_to_/*name*/(slabes_type_un
 """
 
 
+INT_CONVERT_PART = PreludePart(
+    "slabes_convert_/*name1*/_to_/*name2*/",
+    declaration(INT_CONVERT_TEMPLATE),
+    INT_CONVERT_TEMPLATE,
+    ("slabes_type_/*name1*/", "slabes_type_/*name2*/"),
+)
+
+INT_CONVERT_PART_NOOP = PreludePart(
+    "slabes_convert_/*name1*/_to_/*name2*/",
+    INT_CONVERT_TEMPLATE_NOOP,
+)
+
+INT_REMOVE_SIGN_PART = PreludePart(
+    "slabes_convert_/*name*/_to_unsigned_/*name*/",
+    INT_REMOVE_SIGN_MACRO + declaration(INT_REMOVE_SIGN),
+    INT_REMOVE_SIGN,
+    ("slabes_type_/*name*/", "slabes_type_unsigned_/*name*/"),
+)
+
+INT_ADD_SIGN_PART = PreludePart(
+    "slabes_convert_unsigned_/*name*/_to_/*name*/",
+    INT_ADD_SIGN_MACRO + declaration(INT_ADD_SIGN),
+    INT_ADD_SIGN,
+    ("slabes_type_/*name*/", "slabes_type_unsigned_/*name*/"),
+)
+
+
 def make_int_convertions():
     for info in INT_TYPE_INFO.values():
         yield (
-            INT_REMOVE_SIGN
+            INT_REMOVE_SIGN_PART
             .replace("/*name*/", info.name)
         )
         yield (
-            INT_ADD_SIGN
+            INT_ADD_SIGN_PART
             .replace("/*name*/", info.name)
         )
         for unsig in SIGN_UNSING:
             yield (
-                INT_CONVERT_TEMPLATE_NOOP
+                INT_CONVERT_PART_NOOP
                 .replace("/*name1*/", unsig + info.name)
                 .replace("/*name2*/", unsig + info.name)
             )
@@ -357,20 +448,19 @@ def make_int_convertions():
             for unsig1 in SIGN_UNSING:
                 for unsig2 in SIGN_UNSING:
                     yield (
-                        INT_CONVERT_TEMPLATE
+                        INT_CONVERT_PART
                         .replace("/*name1*/", unsig1 + info1.name)
                         .replace("/*name2*/", unsig2 + info2.name)
                     )
 
 
-INT_CONVERTIONS = "\n".join(make_int_convertions())
-
-
-MATRIX_TYPE_TEMPLATE = """
+MATRIX_TYPE_DECL_TEMPLATE = """
 typedef slabes_type_/*name*/ *slabes_type_matrix_/*name*/;
 
 #define slabes_format_matrix_/*name*/ "%p"
+"""
 
+MATRIX_TYPE_INIT_TEMPLATE = """
 void init_slabes_type_matrix_/*name*/(slabes_type_matrix_/*name*/ *var, slabes_type_/*name*/ value, size_t size) {
 #ifdef SLABES_DEBUG_OP
     printf("assign_slabes_type_matrix_/*name*/(%p, " slabes_format_/*name*/ ")\\n", var, value);
@@ -382,7 +472,9 @@ void init_slabes_type_matrix_/*name*/(slabes_type_matrix_/*name*/ *var, slabes_t
         (*var)[i] = value;
     }
 }
+"""
 
+MATRIX_TYPE_TEMPLATE = """
 void assign_slabes_type_matrix_/*name*/(slabes_type_matrix_/*name*/ *var, slabes_type_matrix_/*name*/ value) {
 #ifdef SLABES_DEBUG_OP
     printf("assign_slabes_type_matrix_/*name*/(%p, " slabes_format_matrix_/*name*/ ")\\n", var, value);
@@ -392,27 +484,138 @@ void assign_slabes_type_matrix_/*name*/(slabes_type_matrix_/*name*/ *var, slabes
 """
 
 
+MATRIX_TYPE_PART = PreludePart(
+    "slabes_type_matrix_/*name*/",
+    MATRIX_TYPE_DECL_TEMPLATE + declaration(MATRIX_TYPE_INIT_TEMPLATE) + declaration(MATRIX_TYPE_TEMPLATE),
+    MATRIX_TYPE_INIT_TEMPLATE + MATRIX_TYPE_TEMPLATE,
+    ("slabes_type_/*name*/",),
+)
+
+
 def make_matrix_types():
     for info in INT_TYPE_INFO.values():
-        yield MATRIX_TYPE_TEMPLATE.replace("/*name*/", info.name)
-        yield MATRIX_TYPE_TEMPLATE.replace("/*name*/", "unsigned_" + info.name)
+        yield MATRIX_TYPE_PART.replace("/*name*/", info.name)
+        yield MATRIX_TYPE_PART.replace("/*name*/", "unsigned_" + info.name)
 
 
-MATRIX_TYPES = "\n".join(make_matrix_types())
+# used by the builtins that are always present in the prelude
+PRELUDE_ROOTS = ("slabes_type_unsigned_tiny", "slabes_type_unsigned_small")
 
-TEMPLATE = Path(DIR / "slabes_template.c").read_text()
 
-TEMPLATE = (
-    TEMPLATE.replace("/*types*/", INT_TYPES + MATRIX_TYPES)
-    .replace("/*ops*/", INT_BIN_OPS + INT_CMP_OPS)
-    .replace("/*conv*/", INT_CONVERTIONS)
-)
+def join_parts(parts: list[PreludePart], attr: str, names: set[str] | None) -> str:
+    return "\n".join(
+        getattr(part, attr)
+        for part in parts
+        if names is None or part.name in names
+    )
+
+
+PRELUDE_PART_LISTS = ("int_types", "matrix_types", "int_bin_ops", "int_cmp_ops", "int_convertions")
+PRELUDE_TEMPLATES = ("header_template", "source_template", "template")
+
+
+@dataclass
+class Prelude:
+    int_types: list[PreludePart]
+    matrix_types: list[PreludePart]
+    int_bin_ops: list[PreludePart]
+    int_cmp_ops: list[PreludePart]
+    int_convertions: list[PreludePart]
+
+    header_template: str
+    source_template: str
+    template: str
+
+    parts: dict[str, PreludePart] = field(init=False)
+    header: str = field(init=False)
+    source: str = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.parts = {
+            part.name: part
+            for part in self.int_types + self.matrix_types + self.int_bin_ops + self.int_cmp_ops + self.int_convertions
+        }
+        self.header = self.render(self.header_template, "decl")
+        self.source = self.render(self.source_template, "defn")
+
+    def to_table(self) -> dict[str, object]:
+        """The prelude as json, see from_table"""
+
+        table: dict[str, object] = {name: [asdict(part) for part in getattr(self, name)] for name in PRELUDE_PART_LISTS}
+        table.update((name, getattr(self, name)) for name in PRELUDE_TEMPLATES)
+        return table
+
+    @classmethod
+    def from_table(cls, table: object) -> Prelude | None:
+        """None if the table isn't a prelude"""
+
+        try:
+            parts = {
+                name: [PreludePart(part["name"], part["decl"], part["defn"], tuple(part["deps"])) for part in table[name]]
+                for name in PRELUDE_PART_LISTS
+            }
+            templates = {name: table[name] for name in PRELUDE_TEMPLATES}
+        except (TypeError, KeyError):
+            return None
+        return cls(**parts, **templates)
+
+    def closure(self, names: Iterable[str]) -> set[str]:
+        """Names of the given prelude parts and all parts they depend on"""
+
+        result = set()
+        stack = [*names, *PRELUDE_ROOTS]
+        while stack:
+            name = stack.pop()
+            if name in result or name not in self.parts:
+                continue
+            result.add(name)
+            stack.extend(self.parts[name].deps)
+        return result
+
+    def render(self, template: str, attr: str, names: set[str] | None = None) -> str:
+        """Render the prelude with only the named parts, or all of them if names is None"""
+
+        return (
+            template.replace("/*types*/", join_parts(self.int_types, attr, names) + join_parts(self.matrix_types, attr, names))
+            .replace("/*ops*/", join_parts(self.int_bin_ops, attr, names) + join_parts(self.int_cmp_ops, attr, names))
+            .replace("/*conv*/", join_parts(self.int_convertions, attr, names))
+        )
+
+
+def make_prelude() -> Prelude:
+    return Prelude(
+        list(make_int_types()),
+        list(make_matrix_types()),
+        list(make_int_bin_ops()),
+        list(make_int_cmp_ops()),
+        list(make_int_convertions()),
+        Path(DIR / "slabes_prelude.h").read_text(),
+        Path(DIR / "slabes_prelude.c").read_text(),
+        Path(DIR / "slabes_template.c").read_text(),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_prelude() -> Prelude:
+    """Generating the prelude takes a noticeable part of the startup,
+    so it's done on first use and the result is kept in the cache"""
+
+    key = make_key("prelude", compiler_sources_hash())
+    prelude = Prelude.from_table(load_table("prelude", key))
+    if prelude is None:
+        prelude = make_prelude()
+        save_table("prelude", key, prelude.to_table())
+    return prelude
 
 
 PART_SEPARATOR: str = " "
 
 MAIN_FUNCTION = "main"
 
+# every function of the program and the robot builtins get the SlabesContext
+# of the run as the first argument, there's no global state in the generated code
+CONTEXT_ARG = "slabes_context"
+
 
 def is_variable(type):
     return not (
@@ -428,6 +631,12 @@ class GenerateC:
 
     current_temp: int = 0
 
+    # only declarations of the prelude are emitted,
+    # definitions are linked in from the precompiled prelude
+    precompiled_prelude: bool = False
+
+    used_prelude: set[str] = field(default_factory=set)
+
     scope: ev.ScopeValue = field(init=False)
 
     _filepath: str = field(default=DEFAULT_FILENAME)
@@ -457,12 +666,29 @@ class GenerateC:
         assert (
             len(self.temporary_parts) == 0
         ), "temporary_parts should be saved before generation"
+        return self.render(get_prelude().closure(self.used_prelude))
+
+    def render(self, prelude_names: set[str] | None = None) -> str:
+        """Put the generated code into the template,
+        prelude is restricted to prelude_names unless it's None"""
+
+        full = get_prelude()
+        prelude = full.render(full.header_template, "decl", prelude_names)
+        if not self.precompiled_prelude:
+            prelude += "\n" + full.render(full.source_template, "defn", prelude_names)
         return (
-            TEMPLATE.replace("/*file*/", filepath)
+            full.template.replace("/*prelude*/", prelude)
+            .replace("/*file*/", self._filepath)
             .replace("/*decl*/", self.merge_parts(self.declaration_parts))
             .replace("/*main*/", self.merge_parts(self.main_parts))
         )
 
+    def use(self, name: str) -> str:
+        """Mark the prelude part as used by the program"""
+
+        self.used_prelude.add(name)
+        return name
+
     def collect(self, *args, **kwargs) -> str:
         previous = len(self.temporary_parts)
         self.put(*args, **kwargs)
@@ -568,10 +794,10 @@ class GenerateC:
 
         with self.isolate() as decl:
             self.put(self.type_name(node.return_value.type))
-            args = []
+            args = ["SlabesContext *" + CONTEXT_ARG]
             for arg_name, arg in (node.args or {}).items():
                 args.append(self.type_name(arg.type) + " " + self.var_name(arg_name))
-            self.put(name, "(", ", ".join(args) or "void", ")")
+            self.put(name, "(", ", ".join(args), ")")
 
         with self.isolate() as defn:
             self.put("{\n")
@@ -585,12 +811,14 @@ class GenerateC:
         self.save(defn, self.main_parts)
 
     def type_name(self, node: ts.Type) -> str:
-        return "slabes_type_" + node.name()
+        return self.use("slabes_type_" + node.name())
 
     def type_max(self, node: ts.Type) -> str:
+        self.type_name(node)
         return "slabes_max_value_" + node.name()
 
     def type_min(self, node: ts.Type) -> str:
+        self.type_name(node)
         return "slabes_min_value_" + node.name()
 
     def var_name(self, name: str) -> str:
@@ -608,6 +836,7 @@ class GenerateC:
 
             if isinstance(node.value, ev.Matrix):
                 assert isinstance(tp, ts.MatrixType), "Matrix evaluated not to MatrixType"
+                self.type_name(tp)
                 self.put(f"init_slabes_type_matrix_{tp.item_type.name()}(&{self.var_name(name)},", node.value, ",", self.type_max(node.value.type.index_type) ,")")
                 continue
 
@@ -622,10 +851,10 @@ class GenerateC:
             if isinstance(node.value, ev.Int):
                 assert isinstance(tp, ts.IntType), "Int evaluated not to IntType"
                 signed = "" if tp.signed else "unsigned_"
-                conv = "slabes_convert_" + signed + "big" + "_to_" + tp.name()
+                conv = self.use("slabes_convert_" + signed + "big" + "_to_" + tp.name())
                 self.put(conv, "(", node.value, ")")
             elif isinstance(tp, ts.IntType) and isinstance(node.value.evaluated.type, ts.IntType):
-                conv = "slabes_convert_" + node.value.evaluated.type.name() + "_to_" + tp.name()
+                conv = self.use("slabes_convert_" + node.value.evaluated.type.name() + "_to_" + tp.name())
                 self.put(conv, "(", node.value, ")")
             else:
                 self.put(node.value)
@@ -652,10 +881,11 @@ class GenerateC:
                 node.loc, errors.TypeError, "Not a function"
             )
 
-            args = self.collect(*node.args, sep=",")
+            args = self.collect(CONTEXT_ARG, *node.args, sep=",")
             self.put(self.function_name(node.operand.evaluated.name), "(", args, ")")
 
     def as_format(self, node: ts.Type) -> str:
+        self.type_name(node)
         return "slabes_format_" + node.name()
 
     def handle_print(self, node: ev.Call):
@@ -666,12 +896,12 @@ class GenerateC:
         format += r'"\n"'
 
         args = self.collect(format, *node.args, sep=",")
-        self.put("printf(", args, ")")
+        self.put("slabes_printf(", CONTEXT_ARG, ",", args, ")")
 
     def handle_assert(self, node: ev.Call):
         for arg in node.args:
             value = arg.evaluated
-            convert = "slabes_convert_" + value.type.name() + "_to_unsigned_tiny"
+            convert = self.use("slabes_convert_" + value.type.name() + "_to_unsigned_tiny")
             exact_str = arg.loc.get_exact_str_from_lines(self._lines)
             if exact_str is None:
                 message = "expression"
@@ -684,13 +914,13 @@ class GenerateC:
         return "slabes_op_" + op.name.lower()
 
     def visit_BinaryOperation(self, node: ev.BinaryOperation):
-        self.put(
+        self.put(self.use(
             self.bin_op_name(node.op)
             + "__"
             + node.lhs.evaluated.type.name()
             + "__"
             + node.rhs.evaluated.type.name()
-        )
+        ))
         self.put("(", node.lhs, ",", node.rhs, ")")
 
     def cmp_op_name(self, op: ast.CmpOp) -> str:
@@ -702,13 +932,13 @@ class GenerateC:
             if i:
                 self.put("&&")
 
-            self.put(
+            self.put(self.use(
                 self.cmp_op_name(op)
                 + "__"
                 + lhs.evaluated.type.name()
                 + "__"
                 + rhs.evaluated.type.name()
-            )
+            ))
             self.put("(", lhs, ",", rhs, ")")
 
             lhs = rhs
@@ -737,4 +967,5 @@ class GenerateC:
         self.put("while (!(", node.test, ")) {\n")
         for it in node.body:
             self.put(it, ";;")
+        self.put("SLABES_LOOP_TICK(", CONTEXT_ARG, ");;")
         self.put("}\n")
@@ -65,6 +65,10 @@ def report_collected(separator: str = "\n" + "="*80 + "\n"):
     exit(1)
 
 
+def clear_reported():
+    _reported.clear()
+
+
 def report_fatal_at(
     loc: Location,
     error_name: str,
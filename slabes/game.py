@@ -0,0 +1,463 @@
+from __future__ import annotations
+
+import time
+
+from enum import IntFlag
+from collections import deque
+from dataclasses import dataclass, field
+
+
+# Python port of libslabes/slabes.c, used by the python backend.
+# Keep the behaviour in sync with the c version.
+
+
+class Cell:
+    WALL = "#"
+    PLAYER = "o"
+    FINISH = "F"
+    EMPTY = " "
+
+
+class Direction(IntFlag):
+    DOWN_LEFT = 1 << 0
+    DOWN = 1 << 1
+    DOWN_RIGHT = 1 << 2
+    UP_RIGHT = 1 << 3
+    UP = 1 << 4
+    UP_LEFT = 1 << 5
+
+
+DIRECTION_COUNT = 6
+
+ALL_DIRECTIONS = 0xFF  # walls on every side, as memset does it
+
+FIELD_DEFAULT_SIDE = 10
+FIELD_MAX_CELLS = 2**32 - 1
+
+MAZE_GENERATORS = ("backtracker", "kruskal", "wilson", "eller")  # same order as MazeGenerator
+
+# every edge is visited once, from its lower cell
+UPWARD_DIRECTIONS = (Direction.UP_LEFT, Direction.UP, Direction.UP_RIGHT)
+
+
+LEFT_ROTATED = {
+    Direction.UP_LEFT: Direction.UP,
+    Direction.UP: Direction.UP_RIGHT,
+    Direction.UP_RIGHT: Direction.DOWN_RIGHT,
+    Direction.DOWN_RIGHT: Direction.DOWN,
+    Direction.DOWN: Direction.DOWN_LEFT,
+    Direction.DOWN_LEFT: Direction.UP_LEFT,
+}
+
+RIGHT_ROTATED = {value: key for key, value in LEFT_ROTATED.items()}
+
+REVERSED = {
+    Direction.DOWN_LEFT: Direction.UP_RIGHT,
+    Direction.DOWN: Direction.UP,
+    Direction.DOWN_RIGHT: Direction.UP_LEFT,
+    Direction.UP_RIGHT: Direction.DOWN_LEFT,
+    Direction.UP: Direction.DOWN,
+    Direction.UP_LEFT: Direction.DOWN_RIGHT,
+}
+
+
+def direction_to_index(direction: Direction) -> int:
+    return direction.bit_length() - 1
+
+
+Position = tuple[int, int]
+
+
+@dataclass
+class Field:
+    width: int
+    height: int
+    cells: list[str] = field(init=False)
+    walls: list[int] = field(init=False)  # bit set of directions, same order as in c
+
+    def __post_init__(self) -> None:
+        self.cells = [Cell.EMPTY] * (self.width * self.height)
+        self.walls = [0] * (self.width * self.height)
+
+    @classmethod
+    def square(cls, side: int) -> Field:
+        return cls(side, side * 2 + 1)
+
+    @staticmethod
+    def size_is_valid(width: int, height: int) -> bool:
+        return width > 0 and height > 0 and width * height <= FIELD_MAX_CELLS
+
+    @staticmethod
+    def parse_size(spec: str) -> tuple[int, int]:
+        """'N' for the square field of side N or 'WxH', same as slabes_parse_field_size"""
+
+        try:
+            width, sep, height = spec.partition("x")
+            size = (int(width), int(height)) if sep else (int(width), int(width) * 2 + 1)
+        except ValueError:
+            size = (0, 0)
+        if not Field.size_is_valid(*size):
+            raise ValueError(f"invalid field size '{spec}', expected a side like 10 or WIDTHxHEIGHT like 30x61")
+        return size
+
+    def index(self, x: int, y: int) -> int:
+        return y * self.width + x
+
+    def contains(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def checked_get_walls(self, x: int, y: int) -> int:
+        if not self.contains(x, y):
+            return ALL_DIRECTIONS
+        return self.walls[self.index(x, y)]
+
+    def checked_get_cell(self, x: int, y: int, default: str) -> str:
+        if not self.contains(x, y):
+            return default
+        return self.cells[self.index(x, y)]
+
+    def checked_set_cell(self, x: int, y: int, value: str) -> None:
+        if self.contains(x, y):
+            self.cells[self.index(x, y)] = value
+
+    def fill_cells(self, value: str) -> None:
+        self.cells = [value] * (self.width * self.height)
+
+    def fill_walls(self, value: int) -> None:
+        self.walls = [value] * (self.width * self.height)
+
+    def move_position_in_direction(self, pos: Position, direction: Direction) -> Position | None:
+        """Neighbour of the hex cell, see the picture in slabes.c"""
+
+        x, y = pos
+        if y % 2 == 0:
+            if direction in (Direction.UP_LEFT, Direction.DOWN_LEFT):
+                x -= 1
+        else:
+            if direction in (Direction.UP_RIGHT, Direction.DOWN_RIGHT):
+                x += 1
+
+        if direction == Direction.UP:
+            y += 2
+        elif direction == Direction.DOWN:
+            y -= 2
+        elif direction in (Direction.UP_LEFT, Direction.UP_RIGHT):
+            y += 1
+        elif direction in (Direction.DOWN_LEFT, Direction.DOWN_RIGHT):
+            y -= 1
+
+        if not self.contains(x, y):
+            return None
+        return x, y
+
+
+class Rng:
+    """pcg32, the same numbers as Rng in slabes.h for the same seed"""
+
+    MULTIPLIER = 6364136223846793005
+    STREAM = 0xDA3E39CB94B95BDB
+    MASK = 2**64 - 1
+
+    def __init__(self, seed: int | None = None) -> None:
+        if seed is None:
+            seed = time.time_ns()  # rng_time_seed
+        self.state = 0
+        self.increment = ((self.STREAM << 1) | 1) & self.MASK
+        self.next()
+        self.state = (self.state + seed) & self.MASK
+        self.next()
+
+    @classmethod
+    def parse_seed(cls, spec: str) -> int:
+        """Same as slabes_parse_seed: a decimal integer in [0, 2^64)"""
+
+        if not (spec.isascii() and spec.isdigit() and int(spec) <= cls.MASK):
+            raise ValueError(f"invalid seed '{spec}', expected a non-negative integer")
+        return int(spec)
+
+    def next(self) -> int:
+        old = self.state
+        self.state = (old * self.MULTIPLIER + self.increment) & self.MASK
+        xorshifted = (((old >> 18) ^ old) >> 27) & 0xFFFFFFFF
+        rotation = old >> 59
+        return ((xorshifted >> rotation) | (xorshifted << (-rotation & 31))) & 0xFFFFFFFF
+
+    def below(self, bound: int) -> int:
+        if bound <= 2**32:
+            return (self.next() * bound) >> 32
+        high = self.next()
+        return ((high << 32) | self.next()) % bound
+
+    def shuffle(self, items: list) -> None:
+        """Same order of draws as shuffle_u64"""
+
+        for i in range(len(items), 1, -1):
+            j = self.below(i)
+            items[i - 1], items[j] = items[j], items[i - 1]
+
+
+class UnionFind:
+    """Disjoint sets of hashable items, every item starts in a set of its own"""
+
+    def __init__(self) -> None:
+        self.parent: dict = {}
+
+    def root(self, item):
+        parent = self.parent
+        parent.setdefault(item, item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def merge(self, a, b) -> bool:
+        """False when a and b are already in the same set"""
+
+        a, b = self.root(a), self.root(b)
+        if a == b:
+            return False
+        self.parent[a] = b
+        return True
+
+
+@dataclass
+class Game:
+    field: Field
+    player_position: Position = (0, 0)
+    player_direction: Direction = Direction.UP
+    finish_position: Position = (0, 0)
+
+    maze_generator: str = MAZE_GENERATORS[0]
+    maze_loaded: bool = False  # from a maze file, generating a maze keeps it
+    rng: Rng = field(default_factory=Rng, repr=False)
+
+    @classmethod
+    def setup(cls, width: int, height: int, seed: int | None = None, maze_generator: str = MAZE_GENERATORS[0]) -> Game:
+        if maze_generator not in MAZE_GENERATORS:
+            raise ValueError(f"unknown maze generator '{maze_generator}', expected one of: {' '.join(MAZE_GENERATORS)}")
+        game = cls(Field(width, height), maze_generator=maze_generator, rng=Rng(seed))
+        game.reset()
+        game.set_player_position((0, 0))
+        return game
+
+    def reset(self) -> None:
+        self.player_position = (0, 0)
+        self.player_direction = Direction.UP
+        self.field.fill_cells(Cell.EMPTY)
+        self.field.fill_walls(0)
+
+    def set_player_position(self, pos: Position) -> None:
+        if not self.field.contains(*pos):
+            return
+        self.field.cells[self.field.index(*self.player_position)] = Cell.EMPTY
+        self.player_position = pos
+        self.field.cells[self.field.index(*pos)] = Cell.PLAYER
+
+    def set_finish(self, x: int, y: int) -> None:
+        self.field.checked_set_cell(x, y, Cell.FINISH)
+        self.finish_position = (x, y)
+
+    def make_player_take_one_step(self) -> bool:
+        pos = self.field.move_position_in_direction(self.player_position, self.player_direction)
+        if pos is None:
+            return False
+        if self.field.cells[self.field.index(*pos)] == Cell.WALL:
+            return False
+        if self.field.checked_get_walls(*self.player_position) & self.player_direction:
+            return False
+        self.set_player_position(pos)
+        return True
+
+    def sonar(self) -> int:
+        """Open directions relative to the player, see slabes_func___robot_command_sonar"""
+
+        direction = self.player_direction
+        reverse = REVERSED[direction]
+        walls = self.field.checked_get_walls(*self.player_position)
+        offset = direction_to_index(direction) + DIRECTION_COUNT - 2
+        result = 0
+        for i in range(DIRECTION_COUNT):
+            current = 1 << ((i + offset) % DIRECTION_COUNT)
+            if current == reverse:
+                continue
+            if not (walls & current):
+                result |= 1 << i
+        return result
+
+    def generate_maze(self) -> None:
+        if self.maze_loaded:
+            return
+        getattr(self, f"generate_{self.maze_generator}")()
+
+    def carve(self, pos: Position, neighbour: Position, direction: Direction) -> None:
+        self.field.walls[self.field.index(*pos)] &= ~int(direction) & ALL_DIRECTIONS
+        self.field.walls[self.field.index(*neighbour)] &= ~int(REVERSED[direction]) & ALL_DIRECTIONS
+
+    def set_finish_farthest(self) -> None:
+        """Breadth first search from the player, the finish is put at the last reached cell"""
+
+        field = self.field
+        current = self.player_position
+        visited = {current}
+        queue = deque([current])
+        while queue:
+            current = queue.popleft()
+            for i in range(DIRECTION_COUNT):
+                direction = Direction(1 << i)
+                if field.walls[field.index(*current)] & direction:
+                    continue
+                neighbour = field.move_position_in_direction(current, direction)
+                if neighbour is None or neighbour in visited:
+                    continue
+                visited.add(neighbour)
+                queue.append(neighbour)
+        self.set_finish(*current)
+
+    def generate_kruskal(self) -> None:
+        """Every edge in random order, kept if it joins two different trees"""
+
+        field = self.field
+        field.fill_walls(ALL_DIRECTIONS)
+
+        edges = []
+        for y in range(field.height):
+            for x in range(field.width):
+                for direction in UPWARD_DIRECTIONS:
+                    neighbour = field.move_position_in_direction((x, y), direction)
+                    if neighbour is not None:
+                        edges.append(((x, y), neighbour, direction))
+        self.rng.shuffle(edges)
+
+        sets = UnionFind()
+        for pos, neighbour, direction in edges:
+            if sets.merge(field.index(*pos), field.index(*neighbour)):
+                self.carve(pos, neighbour, direction)
+
+        self.set_finish_farthest()
+
+    def generate_wilson(self) -> None:
+        """Loop erased random walks from every cell until they hit the tree"""
+
+        field = self.field
+        field.fill_walls(ALL_DIRECTIONS)
+
+        in_tree = {self.player_position}
+        walk: dict[Position, Direction] = {}  # revisiting a cell overwrites it and so erases the loop
+        directions = [Direction(1 << i) for i in range(DIRECTION_COUNT)]
+
+        for y in range(field.height):
+            for x in range(field.width):
+                start = (x, y)
+                if start in in_tree:
+                    continue
+                # a field of one row has no edges at all, don't walk forever
+                if all(field.move_position_in_direction(start, direction) is None for direction in directions):
+                    continue
+
+                current = start
+                while current not in in_tree:
+                    while (neighbour := field.move_position_in_direction(current, direction := Direction(1 << self.rng.below(DIRECTION_COUNT)))) is None:
+                        pass
+                    walk[current] = direction
+                    current = neighbour
+
+                current = start
+                while current not in in_tree:
+                    neighbour = field.move_position_in_direction(current, walk[current])
+                    self.carve(current, neighbour, walk[current])
+                    in_tree.add(current)
+                    current = neighbour
+
+        self.set_finish_farthest()
+
+    def generate_eller(self) -> None:
+        """Strips of two rows joined like the rows of eller's algorithm, see game_generate_eller"""
+
+        field = self.field
+        field.fill_walls(ALL_DIRECTIONS)
+
+        offset = field.height % 2
+        strip_count = (field.height + offset) // 2
+        sets = UnionFind()  # only the cells of the current and the next strip
+
+        for strip in range(strip_count):
+            low = 0 if strip == 0 else 2 * strip - offset
+            next_low = 2 * (strip + 1) - offset
+            last = strip + 1 == strip_count
+
+            down = []
+            for y in range(low, next_low):
+                for x in range(field.width):
+                    for direction in UPWARD_DIRECTIONS:
+                        neighbour = field.move_position_in_direction((x, y), direction)
+                        if neighbour is None:
+                            continue
+                        if neighbour[1] >= next_low:
+                            down.append(((x, y), neighbour, direction))
+                        elif (last or self.rng.below(2)) and sets.merge((x, y), neighbour):
+                            self.carve((x, y), neighbour, direction)
+            if last:
+                break
+
+            set_of = {pos: sets.root(pos) for pos, _, _ in down}
+            has_down = set()
+            self.rng.shuffle(down)
+            for second_pass in (False, True):
+                for pos, neighbour, direction in down:
+                    if not second_pass and self.rng.below(3):
+                        continue
+                    if second_pass and set_of[pos] in has_down:
+                        continue
+                    if sets.merge(pos, neighbour):
+                        self.carve(pos, neighbour, direction)
+                        has_down.add(set_of[pos])
+
+            # the next strip keeps its sets, each named after one of its own cells
+            next_cells = [(x, y) for y in range(next_low, min(next_low + 2, field.height)) for x in range(field.width)]
+            representative: dict[Position, Position] = {}
+            sets.parent = {pos: representative.setdefault(sets.root(pos), pos) for pos in next_cells}
+
+        self.set_finish(self.rng.below(field.width), field.height - 1)
+
+    def generate_backtracker(self) -> None:
+        """Randomized depth first search, the finish is put at the deepest cell"""
+
+        field = self.field
+        field.fill_walls(ALL_DIRECTIONS)
+
+        visited = [False] * (field.width * field.height)
+        current = self.player_position
+        visited[field.index(*current)] = True
+        stack = [current]
+
+        max_distance = 0
+        farthest = current
+
+        while stack:
+            if len(stack) > max_distance:
+                max_distance = len(stack)
+                farthest = stack[-1]
+
+            current = stack.pop()
+
+            shift = self.rng.below(DIRECTION_COUNT)
+            for i in range(DIRECTION_COUNT):
+                direction = Direction(1 << ((shift + i) % DIRECTION_COUNT))
+
+                neighbour = field.move_position_in_direction(current, direction)
+                if neighbour is None:
+                    continue
+                if visited[field.index(*neighbour)]:
+                    continue
+
+                # remove the wall between current and neighbour
+                field.walls[field.index(*current)] &= ~int(direction) & ALL_DIRECTIONS
+                field.walls[field.index(*neighbour)] &= ~int(REVERSED[direction]) & ALL_DIRECTIONS
+
+                visited[field.index(*neighbour)] = True
+
+                stack.append(current)
+                stack.append(neighbour)
+                break
+
+        self.set_finish(*farthest)
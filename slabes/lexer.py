@@ -1,13 +1,19 @@
 import re
+import ast
 import token
+import types
+import tempfile
+from pathlib import Path
 from tokenize import TokenInfo
 from itertools import accumulate
+from functools import lru_cache
 from enum import Enum, auto
 
 from . import errors
 from .ply import lex as _ply_lex
 from .errors import report_fatal_at, report_at
 from .location import Location
+from .cache import compiler_sources_hash, load_table_bytes, make_key, save_table_bytes, tables_dir
 
 
 class Keywords(Enum):
@@ -37,9 +43,81 @@ INITIAL_STATE = "INITIAL"
 INVALID_STATE = "INVALID"
 
 
+@lru_cache(maxsize=None)
+def abbreviated_keywords() -> dict[str, str]:
+    keywords = {
+        k.lower(): k
+        for k, v in Keywords.__members__.items()
+        if v is not Keywords.N_TOKENS
+    }
+
+    # keywords can be shortened while those shortenings are unique
+    # small = smal = sma = sm, but not s, because of sonar
+    reserved_names = tuple(keywords.keys())
+    for name in reserved_names:
+        for partial in accumulate(name):
+            if partial == name:
+                continue
+
+            if partial in keywords:
+                keywords[partial] = ""
+            else:
+                keywords[partial] = keywords[name]
+    return {k: v for k, v in keywords.items() if v}
+
+
+def lextab_literals(source: bytes) -> dict[str, object]:
+    """The assignments of a lextab that ply has written, all of them literals but for a set(...) of one"""
+
+    table = {}
+    for statement in ast.parse(source).body:
+        if not isinstance(statement, ast.Assign) or not isinstance(statement.targets[0], ast.Name):
+            continue
+        value = statement.value
+        if isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id == "set" and len(value.args) == 1:
+            table[statement.targets[0].id] = set(ast.literal_eval(value.args[0]))
+        else:
+            table[statement.targets[0].id] = ast.literal_eval(value)
+    return table
+
+
+def make_ply_lexer(module: object) -> _ply_lex.Lexer:
+    """
+    Ply validates and compiles the token rules on every start,
+    unless it's given the tables it has written before.
+    Tables are kept in the cache, named after the compiler sources they are made from,
+    as the literals of the lextab that ply writes, they are read with ast.literal_eval and never run.
+    """
+
+    key = make_key("lextab", _ply_lex.__version__, compiler_sources_hash())
+    name = "lextab_" + key[:16]
+
+    data = load_table_bytes("lextab", key)
+    if data is not None:
+        try:
+            table = ast.literal_eval(data.decode("utf-8"))
+            if isinstance(table, dict) and table.get("_tabversion") == _ply_lex.__tabversion__:
+                lextab = types.ModuleType(name)
+                lextab.__dict__.update(table)
+                return _ply_lex.lex(module=module, optimize=True, lextab=lextab)
+        except Exception:
+            pass  # written by another ply, rebuild it
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            lexer = _ply_lex.lex(module=module, optimize=True, lextab=name, outputdir=directory, errorlog=_ply_lex.NullLogger())
+            source = (Path(directory) / (name + ".py")).read_bytes()
+    except OSError:
+        return _ply_lex.lex(module=module, optimize=True)
+    if tables_dir() is not None:
+        save_table_bytes("lextab", key, repr(lextab_literals(source)).encode("utf-8"))
+    return lexer
+
+
 class Lexer:
     def __init__(self) -> None:
-        self.ply_lexer: _ply_lex.Lexer = _ply_lex.lex(module=self, optimize=True)
+        self.keywords = abbreviated_keywords()
+        self.ply_lexer: _ply_lex.Lexer = make_ply_lexer(self)
         self.reset("", "")
 
     def reset(self, text: str, filename: str):
@@ -76,26 +154,6 @@ class Lexer:
 
     states = ((INVALID_STATE, "exclusive"),)
 
-    keywords = {
-        k.lower(): k
-        for k, v in Keywords.__members__.items()
-        if v is not Keywords.N_TOKENS
-    }
-
-    # keywords can be shortened while those shortenings are unique
-    # small = smal = sma = sm, but not s, because of sonar
-    reserved_names = tuple(keywords.keys())
-    for name in reserved_names:
-        for partial in accumulate(name):
-            if partial == name:
-                continue
-
-            if partial in keywords:
-                keywords[partial] = ""
-            else:
-                keywords[partial] = keywords[name]
-    keywords = {k: v for k, v in keywords.items() if v}
-
     multichar_literals = [
         # statment delimeters
         ",", ".",
@@ -187,16 +245,19 @@ class Lexer:
         )
 
 
-_lexer = Lexer()
+@lru_cache(maxsize=None)
+def get_lexer() -> Lexer:
+    return Lexer()
 
 
 def lex(text: str, filename: str = "<unknown>"):
     text = text.replace("\r\n", "\n").replace("\r", "\n")
 
-    _lexer.reset(text, filename)
+    lexer = get_lexer()
+    lexer.reset(text, filename)
 
-    for tok in _lexer.ply_lexer:
-        yield _lexer.ply_token_to_py(tok)
+    for tok in lexer.ply_lexer:
+        yield lexer.ply_token_to_py(tok)
     yield TokenInfo(
-        token.ENDMARKER, "", (len(_lexer.lines) + 1, 0), (len(_lexer.lines) + 1, 0), ""
+        token.ENDMARKER, "", (len(lexer.lines) + 1, 0), (len(lexer.lines) + 1, 0), ""
     )
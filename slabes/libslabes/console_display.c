@@ -1,6 +1,17 @@
 #include "slabes.h"
 
 #include <stdio.h>
+#include <stdarg.h>
+#include <string.h>
+
+#ifndef _WIN32
+#include <unistd.h>
+#include <sys/ioctl.h>
+#endif
+
+#ifndef min
+#define min(a, b) (((a) < (b))? (a) : (b))
+#endif
 
 /*
  _   _   _  
@@ -46,75 +57,106 @@ char player_lower_char(Game *game) {
 }
 
 
-void game_print_small_upper_row(Game *game, ssize_t y, bool wide) {
-    char c0 = y? '/' : ' ';
-    for (ssize_t x = 0; x < game->field.width; x++) {
-        char c1 = field_checked_get_cell(&game->field, x, y - 1, ' ');
-        if (c1 == Player) { c1 = player_upper_char(game); }
-        char c2 = field_checked_get_cell(&game->field, x, y, ' ');
-        if (c2 == Empty) { c2 = '_'; }
-        if (c2 == Player) { c2 = player_lower_char(game); }
-        if (wide) {
-            printf("%c%c%c\\%c%c", c0, c1, c1, c2, c2);
-        } else {
-            printf("%c%c\\%c", c0, c1, c2);
+// The text of the field has a line on top and then a line per row of the field from the last one,
+// a line shows the lower half of its row and the upper half of the row below (upper rows are the odd ones)
+// and every cell takes a chunk of SMALL_CHUNK columns. game_small_char gives any character of it,
+// so a part of a huge field can be drawn without going through the rest
+
+#define SMALL_CHUNK(wide) ((wide)? 6 : 4)
+
+size_t game_small_line_count(Game *game) {
+    return game->field.height + 2;
+}
+
+size_t game_small_line_length(Game *game, bool wide) {
+    return SMALL_CHUNK(wide) * game->field.width + 1;
+}
+
+// the character at the column of the line, '\0' past the end of the line
+char game_small_char(Game *game, size_t line, size_t column, bool wide) {
+    size_t width = game->field.width, height = game->field.height;
+    size_t chunk = SMALL_CHUNK(wide);
+    if (line == 0) {
+        const char *pattern = wide? " __   " : " _  ";
+        if (height % 2 == 0) {
+            if (column == 0) { return ' '; }
+            pattern = wide? "   __ " : "  _ ";
+            --column;
         }
-        c0 = '/';
-    }
-    if (y != (game->field.height)) { printf("/"); }
-    printf("\n");
-}
-
-void game_print_small_lower_row(Game *game, ssize_t y, bool wide) {
-    char c0 = (y < game->field.height)? '\\' : ' ';
-    for (ssize_t x = 0; x < game->field.width; x++) {
-        char c1 = field_checked_get_cell(&game->field, x, y , ' ');
-        if (c1 == Empty) { c1 = '_'; }
-        if (c1 == Player) { c1 = player_lower_char(game); }
-        char c2 = field_checked_get_cell(&game->field, x, y - 1, ' ');
-        if (c2 == Player) { c2 = player_upper_char(game); }
-        if (wide) {
-            printf("%c%c%c/%c%c", c0, c1, c1, c2, c2);
-        } else {
-            printf("%c%c/%c", c0, c1, c2);
+        return (column < chunk * width)? pattern[column % chunk] : '\0';
+    }
+    if (line > height + 1) {
+        return '\0';
+    }
+
+    ssize_t y = height - (line - 1);
+    ssize_t x = column / chunk;
+    size_t i = column % chunk;
+    bool upper = y % 2;
+    if (x >= width) {
+        if (x > width || i > 0) { return '\0'; }
+        if (upper) { return (y != height)? '/' : '\0'; }
+        return y? '\\' : '\0';
+    }
+
+    size_t half = wide? 2 : 1;
+    if (i == 0) {
+        if (x > 0) { return upper? '/' : '\\'; }
+        if (upper) { return y? '/' : ' '; }
+        return (y < height)? '\\' : ' ';
+    }
+    if (i == half + 1) {
+        return upper? '\\' : '/';
+    }
+    // the lower half of the row of the line is on the left of a lower row and on the right of an upper one
+    bool lower_half = (i <= half) != upper;
+    char c = field_checked_get_cell(&game->field, x, lower_half? y : y - 1, ' ');
+    if (c == Player) { return lower_half? player_lower_char(game) : player_upper_char(game); }
+    if (c == Empty && lower_half) { return '_'; }
+    return c;
+}
+
+typedef struct {
+    char *data;
+    size_t size, capacity;
+} TextBuffer;
+
+void text_append(TextBuffer *text, const char *data, size_t size) {
+    if (text->size + size > text->capacity) {
+        text->capacity = (text->size + size) * 2;
+        text->data = realloc(text->data, text->capacity);
+        if (!text->data) {
+            printf("Out of memory.\n");
+            exit(EXIT_FAILURE);
         }
-        c0 = '\\';
     }
-    if (y) { printf("\\"); }
-    printf("\n");
+    memcpy(text->data + text->size, data, size);
+    text->size += size;
 }
 
+// the whole field in one write
 void game_print_small(Game *game, bool wide) {
     if (game->field.height == 0 || game->field.width == 0) {
         printf("<empty game field>\n");
         return;
     }
 
-    char *first = wide? " __   " : " _  ";
-    if (game->field.height % 2 == 0) {
-        first = wide? "   __ " : "  _ ";
-        printf(" ");
+    size_t lines = game_small_line_count(game);
+    size_t length = game_small_line_length(game, wide);
+    char *text = malloc(lines * (length + 1));
+    if (!text) {
+        printf("Out of memory.\n");
+        exit(EXIT_FAILURE);
     }
-
-    for (ssize_t x = 0; x < game->field.width; x++) { printf("%s", first); }
-    printf("\n");
-
-    ssize_t y = game->field.height;
-    if (game->field.height % 2 == 0) {
-        for (;;) {
-            game_print_small_lower_row(game, y, wide);
-            if (--y < 0) break;
-            game_print_small_upper_row(game, y, wide);
-            if (--y < 0) break;
-        }
-    } else {
-        for (;;) {
-            game_print_small_upper_row(game, y, wide);
-            if (--y < 0) break;
-            game_print_small_lower_row(game, y, wide);
-            if (--y < 0) break;
+    char *end = text;
+    for (size_t line = 0; line < lines; ++line) {
+        for (size_t column = 0; (*end = game_small_char(game, line, column, wide)); ++column) {
+            ++end;
         }
+        *end++ = '\n';
     }
+    fwrite(text, 1, end - text, stdout);
+    free(text);
 }
 
 /*
@@ -147,14 +189,193 @@ void game_print_small(Game *game, bool wide) {
 
 */
 
+// On a terminal only the part of the field around the player that fits is drawn, and only the characters
+// that changed since the previous frame are written, with the cursor moved to them. The last lines of the terminal
+// are left to the output of the program, they scroll on their own. Anywhere else every frame is printed whole
+
+// the lines at the bottom for the output of the program, a scrolling region has at least two
+#define CONSOLE_OUTPUT_LINES 2
+// unchanged characters written over rather than moving the cursor past them
+#define CONSOLE_MAX_GAP 8
+
+typedef struct {
+    bool terminal;
+    size_t rows, columns;  // of the viewport
+    size_t top, left;  // the line and the column of the text at the top left corner of the viewport
+    char *shown;  // rows * columns, what the viewport shows, NULL before the first frame
+    char *line;  // columns
+    // the cells cell_x to cell_x + cell_span of the two rows each line of the viewport was drawn from,
+    // the lines with the same cells (and without the player who may have turned) are not drawn again
+    Cell *cells;
+    size_t cell_x, cell_span;
+    TextBuffer out;
+} ConsoleRenderer;
+
+static ConsoleRenderer renderer;
+
+static void console_terminal_size(size_t *rows, size_t *columns) {
+    *rows = 24;
+    *columns = 80;
+#ifdef TIOCGWINSZ
+    struct winsize size;
+    if (ioctl(STDOUT_FILENO, TIOCGWINSZ, &size) == 0 && size.ws_row && size.ws_col) {
+        *rows = size.ws_row;
+        *columns = size.ws_col;
+    }
+#endif
+}
+
+static void console_printf(const char *format, ...) {
+    char text[64];
+    va_list args;
+    va_start(args, format);
+    int size = vsnprintf(text, sizeof(text), format, args);
+    va_end(args);
+    text_append(&renderer.out, text, size);
+}
+
+// the origin of the visible part of a total long axis, moved only when the position gets close to an edge
+static size_t console_follow(size_t origin, size_t position, size_t visible, size_t total) {
+    if (total <= visible) {
+        return 0;
+    }
+    size_t margin = visible / 4;
+    if (position < origin + margin || position >= origin + visible - margin) {
+        origin = (position > visible / 2)? position - visible / 2 : 0;
+    }
+    return min(origin, total - visible);
+}
+
+static void *console_realloc(void *data, size_t size) {
+    data = realloc(data, size? size : 1);
+    if (!data) {
+        printf("Out of memory.\n");
+        exit(EXIT_FAILURE);
+    }
+    return data;
+}
+
+static void console_resize(size_t rows, size_t columns) {
+    renderer.rows = rows;
+    renderer.columns = columns;
+    renderer.shown = console_realloc(renderer.shown, rows * columns);
+    renderer.line = console_realloc(renderer.line, columns);
+    // nothing is known to be on the screen, every character is written
+    memset(renderer.shown, '\0', rows * columns);
+    console_printf("\x1b[2J\x1b[%zu;%zur", rows + 1, rows + CONSOLE_OUTPUT_LINES);
+}
+
+// copies the cells the line shows, false if they are not the ones it was drawn from
+static bool console_update_cells(Game *game, size_t line, Cell *cells) {
+    bool same = true;
+    ssize_t y = (ssize_t)game->field.height - (ssize_t)line + 1;
+    for (int half = 0; half < 2; ++half, --y, cells += renderer.cell_span) {
+        if (line == 0 || y < 0 || y >= game->field.height) {
+            continue;
+        }
+        Cell *row = &FIELD_AT(&game->field, renderer.cell_x, y);
+        if (memcmp(cells, row, sizeof(Cell) * renderer.cell_span) != 0) {
+            memcpy(cells, row, sizeof(Cell) * renderer.cell_span);
+            same = false;
+        }
+    }
+    return same;
+}
+
+static void console_draw_line(Game *game, size_t row) {
+    size_t columns = renderer.columns;
+    char *line = renderer.line;
+    size_t column = 0;
+    for (char c; column < columns && (c = game_small_char(game, renderer.top + row, renderer.left + column, true)); ++column) {
+        line[column] = c;
+    }
+    memset(line + column, ' ', columns - column);
+
+    char *shown = renderer.shown + row * columns;
+    for (column = 0; column < columns; ++column) {
+        if (line[column] == shown[column]) { continue; }
+        size_t last = column;
+        for (size_t i = column + 1; i < columns && i - last <= CONSOLE_MAX_GAP; ++i) {
+            if (line[i] != shown[i]) { last = i; }
+        }
+        console_printf("\x1b[%zu;%zuH", row + 1, column + 1);
+        text_append(&renderer.out, line + column, last + 1 - column);
+        column = last;
+    }
+    memcpy(shown, line, columns);
+}
+
+static void console_render(Game *game) {
+    size_t rows, columns;
+    console_terminal_size(&rows, &columns);
+    rows = (rows > CONSOLE_OUTPUT_LINES)? rows - CONSOLE_OUTPUT_LINES : 1;
+    bool redraw = false;
+    if (!renderer.shown || rows != renderer.rows || columns != renderer.columns) {
+        console_resize(rows, columns);
+        redraw = true;
+    }
+
+    size_t chunk = SMALL_CHUNK(true);
+    size_t player_line = game->field.height - game->player_position.y + 1;
+    size_t player_column = chunk * game->player_position.x + 1;
+    size_t top = console_follow(renderer.top, player_line, rows, game_small_line_count(game));
+    size_t left = console_follow(renderer.left, player_column, columns, game_small_line_length(game, true));
+    size_t cell_x = left / chunk;
+    size_t cell_end = min(game->field.width, (left + columns - 1) / chunk + 1);
+    size_t cell_span = (cell_end > cell_x)? cell_end - cell_x : 0;
+    if (redraw || top != renderer.top || left != renderer.left || cell_span != renderer.cell_span) {
+        renderer.top = top;
+        renderer.left = left;
+        renderer.cell_x = cell_x;
+        renderer.cell_span = cell_span;
+        renderer.cells = console_realloc(renderer.cells, sizeof(Cell) * rows * 2 * cell_span);
+        redraw = true;
+    }
+
+    for (size_t row = 0; row < rows; ++row) {
+        size_t line = top + row;
+        bool same = console_update_cells(game, line, renderer.cells + row * 2 * cell_span);
+        // the row of the player is on the line above too
+        if (redraw || !same || line == player_line || line + 1 == player_line) {
+            console_draw_line(game, row);
+        }
+    }
+
+    if (renderer.out.size) {
+        // back to the output of the program
+        console_printf("\x1b[%zu;1H", rows + CONSOLE_OUTPUT_LINES);
+        fwrite(renderer.out.data, 1, renderer.out.size, stdout);
+        renderer.out.size = 0;
+    }
+    fflush(stdout);
+}
+
 bool setup_display(Game *game) {
+#ifdef TIOCGWINSZ
+    renderer.terminal = isatty(STDOUT_FILENO);
+    if (renderer.terminal) {
+        printf("\x1b[?25l");  // no cursor jumping around
+    }
+#endif
     return true;
 }
 
 void update_display(Game *game) {
-    game_print_small(game, true);
+    if (renderer.terminal) {
+        console_render(game);
+    } else {
+        game_print_small(game, true);
+    }
 }
 
-void cleanup_display(Game *game) {}
-
-
+void cleanup_display(Game *game) {
+    if (renderer.terminal) {
+        printf("\x1b[r\x1b[?25h\x1b[%zu;1H", renderer.rows + CONSOLE_OUTPUT_LINES);
+        fflush(stdout);
+    }
+    free(renderer.shown);
+    free(renderer.line);
+    free(renderer.cells);
+    free(renderer.out.data);
+    renderer = (ConsoleRenderer){0};
+}
@@ -3,6 +3,7 @@
 #include "raymath.h"
 #include <math.h>
 #include <stdio.h>
+#include <string.h>
 
 #if RAYLIB_VERSION_MAJOR >= 5
 const double hex_start_ange = 0.0;
@@ -89,29 +90,115 @@ void draw_cell_walls(Walls walls, double hex_side, Vector2 center) {
     }
 }
 
-void draw_hexagon_grid(Game *game, double hex_side) {
+Vector2 cell_center(Game *game, ssize_t xi, ssize_t yi, double hex_side) {
     double x_delta = 3 * hex_side;  // distance between hexagons in the same row
     double y_delta = sqrt(3) / 2 * hex_side;  // distance between rows
     double total_y = (game->field.height - 1) * y_delta;
     double offset_x = 2*hex_side;
     double offset_y = 2*hex_side;
 
+    double y = total_y - (yi * y_delta);
+    double x = xi * x_delta + (yi % 2) * (x_delta / 2);
+    return (Vector2){x + offset_x, y + offset_y};
+}
+
+void draw_cell(Game *game, ssize_t xi, ssize_t yi, Cell cell, double hex_side) {
+    Vector2 center = cell_center(game, xi, yi, hex_side);
+    if (cell != Empty) {
+        DrawPoly(center, 6, hex_side, hex_start_ange, cell_color(cell));
+    }
+    if (cell == Player) {
+        draw_player_direction(game, hex_side, center);
+    }
+    Walls walls = field_checked_get_walls(&game->field, xi, yi);
+    walls = game_walls_with_map_end(game, walls, xi, yi);
+    draw_cell_walls(walls, hex_side, center);
+}
+
+// everything but the player and the finish, which are drawn over it every frame
+void draw_hexagon_grid(Game *game, double hex_side) {
     for (ssize_t yi = 0; yi < game->field.height; yi++) {
         for (ssize_t xi = 0; xi < game->field.width; xi++) {
-            double y = total_y - (yi * y_delta);
-            double x = xi * x_delta + (yi % 2) * (x_delta / 2);
-            Vector2 center = {x + offset_x, y + offset_y};
-
             Cell cell = FIELD_AT(&game->field, xi, yi);
-            DrawPoly(center, 6, hex_side, hex_start_ange, cell_color(cell));
-            if (cell == Player) {
-                draw_player_direction(game, hex_side, center);
+            if (cell == Player || cell == Finish) {
+                cell = Empty;
             }
-            Walls walls = field_checked_get_walls(&game->field, xi, yi);
-            walls = game_walls_with_map_end(game, walls, xi, yi);
-            draw_cell_walls(walls, hex_side, center);
+            draw_cell(game, xi, yi, cell, hex_side);
+        }
+    }
+}
+
+// The maze only changes when a new one is made, so it is drawn once into a texture of the size of the window
+// and every frame is that texture with the cells of the player and the finish drawn over it.
+// The walls of the texture are kept to notice a new maze, comparing them is much cheaper than drawing them
+static RenderTexture2D maze_texture;
+static bool maze_texture_loaded = false;
+static bool maze_texture_stale = true;  // the window was resized
+static Walls *maze_walls = NULL;
+static size_t maze_cell_count = 0;
+static Position maze_finish;
+
+void unload_maze_texture() {
+    if (maze_texture_loaded) {
+        UnloadRenderTexture(maze_texture);
+        maze_texture_loaded = false;
+    }
+    free(maze_walls);
+    maze_walls = NULL;
+    maze_cell_count = 0;
+    maze_texture_stale = true;
+}
+
+static bool maze_changed(Game *game) {
+    size_t cell_count = game->field.width * game->field.height;
+    if (cell_count != maze_cell_count || !maze_walls) {
+        free(maze_walls);
+        maze_walls = malloc(sizeof(Walls) * cell_count);
+        maze_cell_count = maze_walls? cell_count : 0;  // without the copy the texture is drawn every frame
+        return true;
+    }
+    if (game->finish_position.x != maze_finish.x || game->finish_position.y != maze_finish.y) {
+        return true;
+    }
+    return memcmp(maze_walls, game->field.walls, sizeof(Walls) * cell_count) != 0;
+}
+
+void update_maze_texture(Game *game) {
+    if (!maze_changed(game) && !maze_texture_stale) {
+        return;
+    }
+    if (maze_walls) {
+        memcpy(maze_walls, game->field.walls, sizeof(Walls) * maze_cell_count);
+    }
+    maze_finish = game->finish_position;
+
+    if (maze_texture_stale) {
+        if (maze_texture_loaded) {
+            UnloadRenderTexture(maze_texture);
         }
+        maze_texture = LoadRenderTexture(screen_width, screen_height);
+        maze_texture_loaded = true;
+        maze_texture_stale = false;
     }
+
+    BeginTextureMode(maze_texture);
+    ClearBackground(BLANK);
+    draw_hexagon_grid(game, hex_side);
+    EndTextureMode();
+}
+
+// the texture over the background, then the cells that change while the robot moves
+void draw_maze(Game *game) {
+    // render textures are upside down
+    Rectangle source = {0, 0, (float)maze_texture.texture.width, -(float)maze_texture.texture.height};
+    DrawTextureRec(maze_texture.texture, source, (Vector2){0, 0}, WHITE);
+
+    Position finish = game->finish_position;
+    Position player = game->player_position;
+    if (finish.x < game->field.width && finish.y < game->field.height) {
+        draw_cell(game, finish.x, finish.y, FIELD_AT(&game->field, finish.x, finish.y), hex_side);
+    }
+    draw_cell(game, player.x, player.y, FIELD_AT(&game->field, player.x, player.y), hex_side);
 }
 
 void recalculate_sizes(Game *game) {
@@ -126,6 +213,7 @@ void recalculate_sizes(Game *game) {
     hex_side = fmin(hex_height, hex_width) / 2.0;
 
     calculate_hexagon_points();
+    maze_texture_stale = true;
 }
 
 bool setup_display(Game *game) {
@@ -147,6 +235,7 @@ void update_display(Game *game) {
 
     if (WindowShouldClose()) {
         windows_closed = true;
+        unload_maze_texture();
         CloseWindow();
         return;
     }
@@ -167,11 +256,13 @@ void update_display(Game *game) {
             return;
     }
 
+    update_maze_texture(game);
+
     BeginDrawing();
 
     ClearBackground(background_color);
 
-    draw_hexagon_grid(game, hex_side);
+    draw_maze(game);
 
     EndDrawing();
 }
@@ -189,5 +280,6 @@ void cleanup_display(Game *game) {
         EndDrawing();
     }
 
+    unload_maze_texture();
     CloseWindow();
 }
@@ -4,6 +4,27 @@
 #include <stdio.h>
 #include <string.h>
 #include <time.h>
+#include <errno.h>
+#include <ctype.h>
+#include <pthread.h>
+#include <stdatomic.h>
+
+#ifdef _WIN32
+// slabes_raylib.c includes raylib before this file, it has its own versions of these
+#define Rectangle WinRectangle
+#define CloseWindow WinCloseWindow
+#define ShowCursor WinShowCursor
+#include <windows.h>
+#undef Rectangle
+#undef CloseWindow
+#undef ShowCursor
+#else
+#include <fcntl.h>
+#include <signal.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#endif
 
 
 #ifndef SLABES_MALLOC
@@ -23,9 +44,51 @@ void *slabes_malloc_(size_t size) {
 #endif // SLABES_FREE
 
 
-Game *get_game() {
-    static Game game;
-    return &game;
+void slabes_sleep_us(uint64_t microseconds) {
+#ifdef _WIN32
+    Sleep(microseconds / 1000);
+#elif __unix__
+    // some systems reject a second or more
+    for (; microseconds >= 1000000; microseconds -= 500000) {
+        usleep(500000);
+    }
+    usleep(microseconds);
+#endif
+}
+
+// pcg32 (pcg-random.org), the same numbers for the same seed everywhere, unlike rand()
+#define RNG_MULTIPLIER 6364136223846793005ULL
+#define RNG_STREAM 0xda3e39cb94b95bdbULL
+
+void rng_seed(Rng *rng, uint64_t seed) {
+    rng->state = 0;
+    rng->increment = (RNG_STREAM << 1) | 1;
+    rng_next(rng);
+    rng->state += seed;
+    rng_next(rng);
+}
+
+uint32_t rng_next(Rng *rng) {
+    uint64_t old = rng->state;
+    rng->state = old * RNG_MULTIPLIER + rng->increment;
+    uint32_t xorshifted = ((old >> 18) ^ old) >> 27;
+    uint32_t rotation = old >> 59;
+    return (xorshifted >> rotation) | (xorshifted << ((-rotation) & 31));
+}
+
+// multiply and shift below 2^32 (no division), two draws and a modulo above
+size_t rng_below(Rng *rng, size_t bound) {
+    if (bound <= (uint64_t)UINT32_MAX + 1) {
+        return ((uint64_t)rng_next(rng) * bound) >> 32;
+    }
+    uint64_t high = rng_next(rng);
+    return ((high << 32) | rng_next(rng)) % bound;
+}
+
+uint64_t rng_time_seed() {
+    struct timespec ts;
+    timespec_get(&ts, TIME_UTC);
+    return (uint64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
 }
 
 char *direction_to_string(Direction direction) {
@@ -210,11 +273,17 @@ void field_checked_set_cell(Field *field, ssize_t x, ssize_t y, Cell value) {
     FIELD_AT(field, x, y) = value;
 }
 
+bool field_size_is_valid(size_t width, size_t height) {
+    return width > 0 && height > 0 && width <= FIELD_MAX_CELLS / height;
+}
+
 void field_construct(Field *field, size_t width, size_t height) {
     field->width = width;
     field->height = height;
     field->cells = (Cell *)SLABES_MALLOC(sizeof(Cell) * width * height);
     field->walls = (Walls *)SLABES_MALLOC(sizeof(Walls) * width * height);
+    field->mapping = NULL;
+    field->mapping_size = 0;
 }
 
 // the goal is to make it so look most like a square
@@ -224,6 +293,15 @@ void field_construct_square(Field *field, size_t side) {
 }
 
 void field_destruct(Field *field) {
+    if (field->mapping) {
+#ifdef _WIN32
+        SLABES_FREE(field->mapping);
+#else
+        munmap(field->mapping, field->mapping_size);
+#endif
+        field->mapping = NULL;
+        return;
+    }
     SLABES_FREE(field->cells);
     SLABES_FREE(field->walls);
 }
@@ -280,28 +358,24 @@ depending whether we are at the inbetween row or on the base row
 
 */
 
-bool field_move_position_in_direction(Field *field, Position *pos, Direction direction) {
-    Position new_pos = *pos;
+// the neighbour in a direction is dx, dy away and dx depends on the parity of the row, as in the picture above.
+// The tables are indexed by the direction itself, anything but a single direction stays in place
+static const int8_t NEIGHBOUR_DX[2][AllDirections + 1] = {
+    {[UpLeft] = -1, [DownLeft] = -1},
+    {[UpRight] = 1, [DownRight] = 1},
+};
 
-    if (new_pos.y % 2 == 0) {
-        if (direction == UpLeft || direction == DownLeft) {
-            new_pos.x -= 1;
-        }
-    } else {
-        if (direction == UpRight || direction == DownRight) {
-            new_pos.x += 1;
-        }
-    }
+static const int8_t NEIGHBOUR_DY[AllDirections + 1] = {
+    [UpLeft] = 1, [Up] = 2, [UpRight] = 1,
+    [DownLeft] = -1, [Down] = -2, [DownRight] = -1,
+};
 
-    if (direction == Up) {
-        new_pos.y += 2;
-    } else if (direction == Down) {
-        new_pos.y -= 2;
-    } else if (direction == UpLeft || direction == UpRight) {
-        new_pos.y += 1;
-    } else if (direction == DownLeft || direction == DownRight) {
-        new_pos.y -= 1;
-    }
+bool field_move_position_in_direction(Field *field, Position *pos, Direction direction) {
+    direction &= AllDirections;
+    Position new_pos = {
+        pos->x + NEIGHBOUR_DX[pos->y % 2][direction],
+        pos->y + NEIGHBOUR_DY[direction],
+    };
 
     // unsigned underflow is a defined behavior,
     // so no problems relying on it here for check if 0 - <sometihng> happened
@@ -320,7 +394,32 @@ bool cell_is_obstacle(Cell cell) {
     }
 }
 
-bool game_make_player_take_one_step(Game *game) {
+static void telemetry_visit(Game *game) {
+    Telemetry *telemetry = &game->telemetry;
+    if (!telemetry->visits) {
+        return;
+    }
+    uint32_t *visits = &telemetry->visits[INDEX_OF(&game->field, game->player_position.x, game->player_position.y)];
+    if (*visits == 0) {
+        ++telemetry->distinct_cells;
+    }
+    if (*visits < UINT32_MAX) {
+        ++*visits;
+    }
+}
+
+// the visits belong to one maze, the robot commands are counted for the whole run
+static void telemetry_clear_visits(Game *game) {
+    Telemetry *telemetry = &game->telemetry;
+    if (!telemetry->visits) {
+        return;
+    }
+    memset(telemetry->visits, 0, sizeof(uint32_t) * game->field.width * game->field.height);
+    telemetry->distinct_cells = 0;
+    telemetry_visit(game);  // the player starts somewhere
+}
+
+static bool game_try_step(Game *game) {
     Position pos = game->player_position;
     if (!field_move_position_in_direction(&game->field, &pos, game->player_direction)) {
         // printf("cannot move in this direction (%s)\n", direction_to_string(game->player_direction));
@@ -333,102 +432,792 @@ bool game_make_player_take_one_step(Game *game) {
         return false;
     }
     game_set_player_position(game, pos);
+    telemetry_visit(game);
     return true;
 }
 
-void game_generate_a_maze(Game *game) {
-    field_fill_walls(&game->field, 0xFF);
+#define STATE_TRACKER_MIN_CAPACITY 1024
+
+static void state_tracker_clear(StateTracker *tracker) {
+    SLABES_FREE(tracker->slots);
+    tracker->slots = NULL;
+    tracker->capacity = tracker->count = 0;
+    tracker->tick = 0;
+    tracker->last_key = 0;
+    tracker->repeats_in_place = 0;
+    tracker->last_sonar = 0;
+    tracker->cycle_length = 0;
+}
 
-    bool *visited = (bool *)SLABES_MALLOC(sizeof(bool) * game->field.width * game->field.height);
-    memset(visited, 0, sizeof(bool) * game->field.width * game->field.height);
+// splitmix64 finalizer, the keys differ in a few low bits only
+static size_t state_hash(uint64_t key) {
+    key = (key ^ (key >> 30)) * 0xbf58476d1ce4e5b9ULL;
+    key = (key ^ (key >> 27)) * 0x94d049bb133111ebULL;
+    return key ^ (key >> 31);
+}
 
-    Position *stack_base = (Position *)SLABES_MALLOC(sizeof(Position) * game->field.width * game->field.height);
-    Position *stack_head = stack_base;
+static VisitedState *state_tracker_slot(VisitedState *slots, size_t capacity, uint64_t key) {
+    size_t i = state_hash(key) & (capacity - 1);
+    while (slots[i].key != 0 && slots[i].key != key) {
+        i = (i + 1) & (capacity - 1);
+    }
+    return &slots[i];
+}
 
-    Position current_pos = game->player_position;
-    visited[INDEX_OF(&game->field, current_pos.x, current_pos.y)] = true;
-    *stack_head++ = current_pos;
+static void state_tracker_grow(StateTracker *tracker) {
+    size_t capacity = tracker->capacity? tracker->capacity * 2 : STATE_TRACKER_MIN_CAPACITY;
+    VisitedState *slots = (VisitedState *)SLABES_MALLOC(sizeof(VisitedState) * capacity);
+    memset(slots, 0, sizeof(VisitedState) * capacity);
+    for (size_t i = 0; i < tracker->capacity; ++i) {
+        if (tracker->slots[i].key != 0) {
+            *state_tracker_slot(slots, capacity, tracker->slots[i].key) = tracker->slots[i];
+        }
+    }
+    SLABES_FREE(tracker->slots);
+    tracker->slots = slots;
+    tracker->capacity = capacity;
+}
+
+// records the current state of the player, true when it's a cycle (see StateTracker)
+bool game_track_state(Game *game) {
+    StateTracker *tracker = &game->states;
+    if (tracker->repeat_limit == 0) {
+        return false;
+    }
+    ++tracker->tick;
+
+    // the cell index + 1 (so the key is never 0), the direction and the sonar bits
+    uint64_t cell = INDEX_OF(&game->field, game->player_position.x, game->player_position.y);
+    uint64_t key = ((cell + 1) << 11) | ((uint64_t)direction_to_index(game->player_direction) << 8) | tracker->last_sonar;
+    uint64_t since = 1;
+    if (key == tracker->last_key) {
+        // not counted as a visit, or going back and forth with a bump in between
+        // would look like a cycle of length 1
+        if (++tracker->repeats_in_place + 1 < tracker->repeat_limit) {
+            return false;
+        }
+    } else {
+        tracker->last_key = key;
+        tracker->repeats_in_place = 0;
+
+        if (2 * (tracker->count + 1) > tracker->capacity) {
+            state_tracker_grow(tracker);
+        }
+        VisitedState *state = state_tracker_slot(tracker->slots, tracker->capacity, key);
+        if (state->key == 0) {
+            *state = (VisitedState){key, 0, 0};
+            ++tracker->count;
+        }
+        since = tracker->tick - state->last_seen;
+        state->last_seen = tracker->tick;
+        if (++state->count < tracker->repeat_limit) {
+            return false;
+        }
+    }
+    if (game->has_finish && game->player_position.x == game->finish_position.x && game->player_position.y == game->finish_position.y) {
+        return false;
+    }
+    tracker->cycle_length = since;
+    return true;
+}
+
+bool game_make_player_take_one_step(Game *game) {
+    bool moved = game_try_step(game);
+    if (!moved) {
+        ++game->telemetry.wall_bumps;
+    }
+    game_track_state(game);
+    return moved;
+}
+
+void game_turn_player(Game *game, Direction direction) {
+    game->player_direction = direction;
+    game_track_state(game);
+}
+
+// one bit per cell, so the visited set of a million cell maze takes 128KB
+#define BITSET_WORDS(count) (((count) + 63) / 64)
+#define BITSET_GET(bits, i) (((bits)[(i) / 64] >> ((i) % 64)) & 1)
+#define BITSET_SET(bits, i) ((bits)[(i) / 64] |= (uint64_t)1 << ((i) % 64))
+
+// randomized depth first search, the finish is put at the deepest cell
+void game_generate_backtracker(Game *game) {
+    Field *field = &game->field;
+    size_t cell_count = field->width * field->height;
+
+    field_fill_walls(field, 0xFF);
+
+    uint64_t *visited = (uint64_t *)SLABES_MALLOC(sizeof(uint64_t) * BITSET_WORDS(cell_count));
+    memset(visited, 0, sizeof(uint64_t) * BITSET_WORDS(cell_count));
+
+    // cell indices instead of positions, the field is never larger than FIELD_MAX_CELLS
+    uint32_t *stack_base = (uint32_t *)SLABES_MALLOC(sizeof(uint32_t) * cell_count);
+    uint32_t *stack_head = stack_base;
+
+    uint32_t current = INDEX_OF(field, game->player_position.x, game->player_position.y);
+    BITSET_SET(visited, current);
+    *stack_head++ = current;
 
     ssize_t max_distance = 0;
-    Position fartherst_pos = current_pos;
+    uint32_t fartherst = current;
 
     while (stack_head - stack_base) {
         if (stack_head - stack_base > max_distance) {
             max_distance = stack_head - stack_base;
-            fartherst_pos = *(stack_head - 1);
+            fartherst = *(stack_head - 1);
         }
 
-        current_pos = *--stack_head;
+        current = *--stack_head;
+        Position current_pos = {current % field->width, current / field->width};
 
-        size_t direction_shift = rand();
+        size_t direction_shift = rng_below(&game->rng, DirectionCount);
         for (size_t i = 0; i < DirectionCount; ++i) {
             Direction dir = 1 << ((direction_shift + i) % DirectionCount);
 
             Position neighbour_pos = current_pos;
-            if (!field_move_position_in_direction(&game->field, &neighbour_pos, dir)) { continue; }
-            if (visited[INDEX_OF(&game->field, neighbour_pos.x, neighbour_pos.y)]) { continue; }
+            if (!field_move_position_in_direction(field, &neighbour_pos, dir)) { continue; }
+            uint32_t neighbour = INDEX_OF(field, neighbour_pos.x, neighbour_pos.y);
+            if (BITSET_GET(visited, neighbour)) { continue; }
 
             // remove the wall between current and neighbour
-            WALLS_AT(&game->field, current_pos.x, current_pos.y) &= ~dir;
-            WALLS_AT(&game->field, neighbour_pos.x, neighbour_pos.y) &= ~reverse_direction(dir);
+            field->walls[current] &= ~dir;
+            field->walls[neighbour] &= ~reverse_direction(dir);
+
+            BITSET_SET(visited, neighbour);
 
-            visited[INDEX_OF(&game->field, neighbour_pos.x, neighbour_pos.y)] = true;
-            
-            *stack_head++ = current_pos;
-            *stack_head++ = neighbour_pos;
+            *stack_head++ = current;
+            *stack_head++ = neighbour;
             break;
         }
     }
 
-    game_set_finish(game, fartherst_pos.x, fartherst_pos.y);
+    game_set_finish(game, fartherst % field->width, fartherst / field->width);
 
     SLABES_FREE(stack_base);
     SLABES_FREE(visited);
 }
 
+// every edge is visited once, from its lower cell
+static const Direction UPWARD_DIRECTIONS[] = {UpLeft, Up, UpRight};
+
+#define UPWARD_DIRECTION_COUNT (sizeof(UPWARD_DIRECTIONS) / sizeof(*UPWARD_DIRECTIONS))
+
+static bool field_neighbour(Field *field, size_t cell, Direction direction, size_t *neighbour) {
+    Position pos = {cell % field->width, cell / field->width};
+    if (!field_move_position_in_direction(field, &pos, direction)) {
+        return false;
+    }
+    *neighbour = INDEX_OF(field, pos.x, pos.y);
+    return true;
+}
+
+static void field_carve(Field *field, size_t cell, size_t neighbour, Direction direction) {
+    field->walls[cell] &= ~direction;
+    field->walls[neighbour] &= ~reverse_direction(direction);
+}
+
+static size_t union_find_root(size_t *parent, size_t i) {
+    while (parent[i] != i) {
+        parent[i] = parent[parent[i]];
+        i = parent[i];
+    }
+    return i;
+}
+
+// false when a and b are already in the same set
+static bool union_find_merge(size_t *parent, size_t a, size_t b) {
+    a = union_find_root(parent, a);
+    b = union_find_root(parent, b);
+    if (a == b) {
+        return false;
+    }
+    parent[a] = b;
+    return true;
+}
+
+static void shuffle_u64(Rng *rng, uint64_t *items, size_t count) {
+    for (size_t i = count; i > 1; --i) {
+        size_t j = rng_below(rng, i);
+        uint64_t tmp = items[i - 1];
+        items[i - 1] = items[j];
+        items[j] = tmp;
+    }
+}
+
+// breadth first search from the player, the finish is put at the last reached cell
+static void game_set_finish_farthest(Game *game) {
+    Field *field = &game->field;
+    size_t cell_count = field->width * field->height;
+
+    uint64_t *visited = (uint64_t *)SLABES_MALLOC(sizeof(uint64_t) * BITSET_WORDS(cell_count));
+    memset(visited, 0, sizeof(uint64_t) * BITSET_WORDS(cell_count));
+    uint32_t *queue = (uint32_t *)SLABES_MALLOC(sizeof(uint32_t) * cell_count);
+    size_t head = 0, tail = 0;
+
+    uint32_t current = INDEX_OF(field, game->player_position.x, game->player_position.y);
+    BITSET_SET(visited, current);
+    queue[tail++] = current;
+
+    while (head < tail) {
+        current = queue[head++];
+        for (size_t i = 0; i < DirectionCount; ++i) {
+            Direction dir = 1 << i;
+            size_t neighbour;
+            if (field->walls[current] & dir) { continue; }
+            if (!field_neighbour(field, current, dir, &neighbour)) { continue; }
+            if (BITSET_GET(visited, neighbour)) { continue; }
+            BITSET_SET(visited, neighbour);
+            queue[tail++] = neighbour;
+        }
+    }
+
+    game_set_finish(game, current % field->width, current / field->width);
+
+    SLABES_FREE(queue);
+    SLABES_FREE(visited);
+}
+
+// randomized kruskal: every edge in random order, kept if it joins two different trees
+void game_generate_kruskal(Game *game) {
+    Field *field = &game->field;
+    size_t cell_count = field->width * field->height;
+
+    field_fill_walls(field, 0xFF);
+
+    // cell index << 2 | index in UPWARD_DIRECTIONS
+    uint64_t *edges = (uint64_t *)SLABES_MALLOC(sizeof(uint64_t) * cell_count * UPWARD_DIRECTION_COUNT);
+    size_t edge_count = 0;
+    for (size_t cell = 0; cell < cell_count; ++cell) {
+        for (size_t k = 0; k < UPWARD_DIRECTION_COUNT; ++k) {
+            size_t neighbour;
+            if (field_neighbour(field, cell, UPWARD_DIRECTIONS[k], &neighbour)) {
+                edges[edge_count++] = (uint64_t)cell << 2 | k;
+            }
+        }
+    }
+    shuffle_u64(&game->rng, edges, edge_count);
+
+    size_t *parent = (size_t *)SLABES_MALLOC(sizeof(size_t) * cell_count);
+    for (size_t cell = 0; cell < cell_count; ++cell) {
+        parent[cell] = cell;
+    }
+
+    for (size_t i = 0; i < edge_count; ++i) {
+        size_t cell = edges[i] >> 2, neighbour = 0;
+        Direction dir = UPWARD_DIRECTIONS[edges[i] & 3];
+        field_neighbour(field, cell, dir, &neighbour);
+        if (union_find_merge(parent, cell, neighbour)) {
+            field_carve(field, cell, neighbour, dir);
+        }
+    }
+
+    SLABES_FREE(parent);
+    SLABES_FREE(edges);
+
+    game_set_finish_farthest(game);
+}
+
+// wilson: loop erased random walks from every cell until they hit the tree,
+// which makes every spanning tree equally likely
+void game_generate_wilson(Game *game) {
+    Field *field = &game->field;
+    size_t cell_count = field->width * field->height;
+
+    field_fill_walls(field, 0xFF);
+
+    uint64_t *in_tree = (uint64_t *)SLABES_MALLOC(sizeof(uint64_t) * BITSET_WORDS(cell_count));
+    memset(in_tree, 0, sizeof(uint64_t) * BITSET_WORDS(cell_count));
+    // the direction the walk last left the cell in, revisiting a cell overwrites it and so erases the loop
+    uint8_t *walk = (uint8_t *)SLABES_MALLOC(sizeof(uint8_t) * cell_count);
+
+    BITSET_SET(in_tree, INDEX_OF(field, game->player_position.x, game->player_position.y));
+
+    for (size_t start = 0; start < cell_count; ++start) {
+        if (BITSET_GET(in_tree, start)) { continue; }
+
+        // a field of one row has no edges at all, don't walk forever
+        bool isolated = true;
+        for (size_t i = 0; i < DirectionCount && isolated; ++i) {
+            size_t neighbour;
+            isolated = !field_neighbour(field, start, 1 << i, &neighbour);
+        }
+        if (isolated) { continue; }
+
+        size_t cell = start;
+        while (!BITSET_GET(in_tree, cell)) {
+            Direction dir;
+            size_t next;
+            do {
+                dir = 1 << rng_below(&game->rng, DirectionCount);
+            } while (!field_neighbour(field, cell, dir, &next));
+            walk[cell] = dir;
+            cell = next;
+        }
+
+        cell = start;
+        while (!BITSET_GET(in_tree, cell)) {
+            size_t next = 0;
+            field_neighbour(field, cell, walk[cell], &next);
+            field_carve(field, cell, next, walk[cell]);
+            BITSET_SET(in_tree, cell);
+            cell = next;
+        }
+    }
+
+    SLABES_FREE(walk);
+    SLABES_FREE(in_tree);
+
+    game_set_finish_farthest(game);
+}
+
+/*
+Eller's algorithm over strips of two rows. The rows of the hex field don't
+touch themselves, but two neighbouring rows form a zigzag:
+
+  __    __
+ /1 \__/3 \__
+ \__/0 \__/2 \
+    \__/  \__/
+
+Every edge leaving a strip goes to the next one (Up skips one row, so it
+always lands in the next strip too), so the strips work like the rows of the
+classic algorithm. Only the sets of the current and the next strip are kept,
+O(width) memory for any height. With an odd height the first strip has a
+single row.
+*/
+
+// sets of the cells of the strip at slots [0, 2 * width), of the next strip at [2 * width, 4 * width)
+#define ELLER_SLOT(field, low, x, y) (((y) - (low)) * (field)->width + (x))
+
+void game_generate_eller(Game *game) {
+    Field *field = &game->field;
+    size_t width = field->width;
+    size_t offset = field->height % 2;
+    size_t strip_count = (field->height + offset) / 2;
+
+    field_fill_walls(field, 0xFF);
+
+    size_t *parent = (size_t *)SLABES_MALLOC(sizeof(size_t) * 4 * width);
+    size_t *set_of = (size_t *)SLABES_MALLOC(sizeof(size_t) * 4 * width);
+    size_t *next_set = (size_t *)SLABES_MALLOC(sizeof(size_t) * 2 * width);
+    bool *has_down = (bool *)SLABES_MALLOC(sizeof(bool) * 2 * width);
+    // slot << 2 | index in UPWARD_DIRECTIONS
+    uint64_t *edges = (uint64_t *)SLABES_MALLOC(sizeof(uint64_t) * 2 * width * UPWARD_DIRECTION_COUNT);
+
+    for (size_t i = 0; i < 2 * width; ++i) {
+        parent[i] = i;
+    }
+
+    for (size_t strip = 0; strip < strip_count; ++strip) {
+        size_t low = (strip == 0)? 0 : 2 * strip - offset;
+        size_t next_low = 2 * (strip + 1) - offset;
+        bool last = strip + 1 == strip_count;
+
+        // join the cells of the strip at random, on the last strip everything that isn't joined yet
+        size_t edge_count = 0;
+        for (size_t y = low; y < next_low; ++y) {
+            for (size_t x = 0; x < width; ++x) {
+                size_t cell = INDEX_OF(field, x, y);
+                for (size_t k = 0; k < UPWARD_DIRECTION_COUNT; ++k) {
+                    size_t neighbour;
+                    if (!field_neighbour(field, cell, UPWARD_DIRECTIONS[k], &neighbour)) { continue; }
+                    size_t nx = neighbour % width, ny = neighbour / width;
+                    if (ny >= next_low) {
+                        edges[edge_count++] = (uint64_t)ELLER_SLOT(field, low, x, y) << 2 | k;
+                        continue;
+                    }
+                    if ((last || rng_below(&game->rng, 2)) && union_find_merge(parent, ELLER_SLOT(field, low, x, y), ELLER_SLOT(field, low, nx, ny))) {
+                        field_carve(field, cell, neighbour, UPWARD_DIRECTIONS[k]);
+                    }
+                }
+            }
+        }
+        if (last) { break; }
+
+        // connect to the next strip at random, at least once from every set
+        for (size_t i = 0; i < 2 * width; ++i) {
+            set_of[i] = union_find_root(parent, i);
+            has_down[i] = false;
+            parent[2 * width + i] = 2 * width + i;
+        }
+        shuffle_u64(&game->rng, edges, edge_count);
+        for (int pass = 0; pass < 2; ++pass) {
+            for (size_t i = 0; i < edge_count; ++i) {
+                size_t slot = edges[i] >> 2;
+                if (pass == 0 && rng_below(&game->rng, 3)) { continue; }
+                if (pass == 1 && has_down[set_of[slot]]) { continue; }
+
+                Direction dir = UPWARD_DIRECTIONS[edges[i] & 3];
+                size_t cell = INDEX_OF(field, slot % width, low + slot / width), neighbour = 0;
+                field_neighbour(field, cell, dir, &neighbour);
+                size_t next_slot = 2 * width + ELLER_SLOT(field, next_low, neighbour % width, neighbour / width);
+                // a set without connections down can't reach the next strip yet, so the second pass always merges
+                if (union_find_merge(parent, slot, next_slot)) {
+                    field_carve(field, cell, neighbour, dir);
+                    has_down[set_of[slot]] = true;
+                }
+            }
+        }
+
+        // the next strip becomes the current one, its sets renumbered into [0, 2 * width)
+        for (size_t i = 0; i < 4 * width; ++i) {
+            set_of[i] = SIZE_MAX;
+        }
+        for (size_t i = 0; i < 2 * width; ++i) {
+            next_set[i] = union_find_root(parent, 2 * width + i);
+            if (set_of[next_set[i]] == SIZE_MAX) {
+                set_of[next_set[i]] = i;
+            }
+        }
+        for (size_t i = 0; i < 2 * width; ++i) {
+            parent[i] = set_of[next_set[i]];
+        }
+    }
+
+    SLABES_FREE(edges);
+    SLABES_FREE(has_down);
+    SLABES_FREE(next_set);
+    SLABES_FREE(set_of);
+    SLABES_FREE(parent);
+
+    // the top row is the farthest from the start without another pass over the field
+    game_set_finish(game, rng_below(&game->rng, width), field->height - 1);
+}
+
+static const char *MAZE_GENERATOR_NAMES[MazeGeneratorCount] = {
+    [MazeBacktracker] = "backtracker",
+    [MazeKruskal] = "kruskal",
+    [MazeWilson] = "wilson",
+    [MazeEller] = "eller",
+};
+
+const char *maze_generator_name(MazeGenerator generator) {
+    return (generator < MazeGeneratorCount)? MAZE_GENERATOR_NAMES[generator] : "unknown";
+}
+
+bool maze_generator_from_name(const char *name, MazeGenerator *generator) {
+    for (size_t i = 0; i < MazeGeneratorCount; ++i) {
+        if (strcmp(name, MAZE_GENERATOR_NAMES[i]) == 0) {
+            *generator = i;
+            return true;
+        }
+    }
+    return false;
+}
+
+static void display_thread_publish_maze(Game *game);
+
+void game_generate_a_maze(Game *game) {
+    if (game->maze_loaded) {
+        return;  // the maze from the file is the maze
+    }
+    // the states of the player on the previous maze mean nothing on the new one
+    state_tracker_clear(&game->states);
+    switch (game->maze_generator) {
+        case MazeKruskal: game_generate_kruskal(game); break;
+        case MazeWilson: game_generate_wilson(game); break;
+        case MazeEller: game_generate_eller(game); break;
+        default: game_generate_backtracker(game); break;
+    }
+    telemetry_clear_visits(game);
+    game_trace_maze(game);
+    game_share_maze(game);
+    display_thread_publish_maze(game);
+}
+
 void game_set_finish(Game *game, ssize_t x, ssize_t y) {
     field_checked_set_cell(&game->field, x, y, Finish);
     game->finish_position.x = x;
     game->finish_position.y = y;
+    game->has_finish = true;
 }
 
-typedef void (*void_game_function_t)(Game *game);
-typedef bool (*bool_game_function_t)(Game *game);
+_Static_assert(sizeof(Walls) == 1 && sizeof(Cell) == 1, "maze files store one byte per cell for the walls and for the cell");
+
+static bool host_is_little_endian() {
+    uint16_t probe = 1;
+    return *(uint8_t *)&probe == 1;
+}
 
-static lt_dlhandle library_handle = NULL;
+// the whole file, the field points into it
+static void *maze_file_map(const char *path, size_t *size) {
+#ifdef _WIN32
+    *size = 0;
+    FILE *file = fopen(path, "rb");
+    if (!file) { return NULL; }
+    fseek(file, 0, SEEK_END);
+    long length = ftell(file);
+    fseek(file, 0, SEEK_SET);
+    void *data = NULL;
+    if (length > 0) {
+        *size = length;
+        data = SLABES_MALLOC(length);
+        if (fread(data, 1, length, file) != (size_t)length) {
+            SLABES_FREE(data);
+            data = NULL;
+        }
+    }
+    fclose(file);
+    return data;
+#else
+    *size = 0;
+    int fd = open(path, O_RDONLY);
+    if (fd < 0) { return NULL; }
+    struct stat st;
+    void *data = NULL;
+    if (fstat(fd, &st) == 0 && st.st_size > 0) {
+        *size = st.st_size;
+        // private: moving the player writes to the cells, but never to the file
+        data = mmap(NULL, st.st_size, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+        if (data == MAP_FAILED) { data = NULL; }
+    }
+    close(fd);
+    return data;
+#endif
+}
 
-bool_game_function_t setup_display_function = NULL;
-void_game_function_t update_display_function = NULL;
-void_game_function_t cleanup_display_function = NULL;
+static void maze_file_unmap(void *data, size_t size) {
+#ifdef _WIN32
+    SLABES_FREE(data);
+#else
+    munmap(data, size);
+#endif
+}
+
+static const char *maze_file_check(MazeFileHeader *header, size_t size) {
+    if (size < sizeof(MazeFileHeader) || memcmp(header->magic, MAZE_FILE_MAGIC, sizeof(header->magic)) != 0) {
+        return "not a binary maze file (text mazes can be converted with 'slabes maze convert')";
+    }
+    if (header->version != MAZE_FILE_VERSION) {
+        return "unsupported maze file version";
+    }
+    if (header->header_size < sizeof(MazeFileHeader) || !field_size_is_valid(header->width, header->height)) {
+        return "corrupted header";
+    }
+    if (size != header->header_size + 2 * header->width * header->height) {
+        return "the file size doesn't match the field size";
+    }
+    if (header->player_x >= header->width || header->player_y >= header->height ||
+        header->finish_x >= header->width || header->finish_y >= header->height) {
+        return "the player or the finish is out of the field";
+    }
+    Direction direction = header->player_direction;
+    if (direction == 0 || direction > DirectionMax || (direction & (direction - 1))) {
+        return "invalid player direction";
+    }
+    return NULL;
+}
+
+// maps the file instead of reading it, so loading takes the same time for any size
+bool game_load_maze(Game *game, const char *path) {
+    if (!host_is_little_endian()) {
+        printf("Failed to load %s: maze files are little endian\n", path);
+        return false;
+    }
+
+    size_t size = 0;
+    errno = 0;
+    void *data = maze_file_map(path, &size);
+    if (!data) {
+        printf("Failed to load %s: %s\n", path, errno? strerror(errno) : "empty file");
+        return false;
+    }
+
+    MazeFileHeader *header = (MazeFileHeader *)data;
+    const char *error = maze_file_check(header, size);
+    if (error) {
+        printf("Failed to load %s: %s\n", path, error);
+        maze_file_unmap(data, size);
+        return false;
+    }
+
+    Field *field = &game->field;
+    field->width = header->width;
+    field->height = header->height;
+    field->walls = (Walls *)((char *)data + header->header_size);
+    field->cells = (Cell *)((char *)data + header->header_size + header->width * header->height);
+    field->mapping = data;
+    field->mapping_size = size;
+
+    game->player_position = (Position){header->player_x, header->player_y};
+    game->player_direction = header->player_direction;
+    game->finish_position = (Position){header->finish_x, header->finish_y};
+    game->has_finish = true;
+    game->maze_loaded = true;
+    return true;
+}
+
+static bool maze_file_write(Game *game, FILE *file) {
+    Field *field = &game->field;
+    MazeFileHeader header = {
+        .magic = MAZE_FILE_MAGIC,
+        .version = MAZE_FILE_VERSION,
+        .header_size = sizeof(MazeFileHeader),
+        .width = field->width,
+        .height = field->height,
+        .player_x = game->player_position.x,
+        .player_y = game->player_position.y,
+        .finish_x = game->finish_position.x,
+        .finish_y = game->finish_position.y,
+        .player_direction = game->player_direction,
+    };
+    size_t cell_count = field->width * field->height;
+    return fwrite(&header, sizeof(header), 1, file) == 1
+        && fwrite(field->walls, sizeof(Walls), cell_count, file) == cell_count
+        && fwrite(field->cells, sizeof(Cell), cell_count, file) == cell_count;
+}
+
+bool game_save_maze(Game *game, const char *path) {
+    FILE *file = fopen(path, "wb");
+    if (!file) {
+        printf("Failed to save %s: %s\n", path, strerror(errno));
+        return false;
+    }
+    bool ok = maze_file_write(game, file);
+    ok = (fclose(file) == 0) && ok;
+    if (!ok) {
+        printf("Failed to save %s\n", path);
+    }
+    return ok;
+}
+
+bool game_save_heatmap(Game *game, const char *path) {
+    Field *field = &game->field;
+    if (!game->telemetry.visits) {
+        printf("Failed to save %s: the visits are not counted\n", path);
+        return false;
+    }
+    if (!host_is_little_endian()) {
+        printf("Failed to save %s: heatmap files are little endian\n", path);
+        return false;
+    }
+    HeatmapFileHeader header = {
+        .magic = HEATMAP_FILE_MAGIC,
+        .version = HEATMAP_FILE_VERSION,
+        .header_size = sizeof(HeatmapFileHeader),
+        .width = field->width,
+        .height = field->height,
+    };
+    size_t cell_count = field->width * field->height;
+
+    FILE *file = fopen(path, "wb");
+    if (!file) {
+        printf("Failed to save %s: %s\n", path, strerror(errno));
+        return false;
+    }
+    bool ok = fwrite(&header, sizeof(header), 1, file) == 1
+        && fwrite(game->telemetry.visits, sizeof(uint32_t), cell_count, file) == cell_count;
+    ok = (fclose(file) == 0) && ok;
+    if (!ok) {
+        printf("Failed to save %s\n", path);
+    }
+    return ok;
+}
+
+#define TRACE_BUFFER_SIZE (64 * 1024)
+
+static void trace_flush(TraceWriter *trace) {
+    if (trace->used && fwrite(trace->buffer, 1, trace->used, trace->file) != trace->used) {
+        trace->failed = true;
+    }
+    trace->used = 0;
+}
+
+bool game_start_trace(Game *game, const char *path) {
+    if (!host_is_little_endian()) {
+        printf("Failed to record %s: trace files are little endian\n", path);
+        return false;
+    }
+    TraceWriter *trace = &game->trace;
+    FILE *file = fopen(path, "wb");
+    if (!file) {
+        printf("Failed to record %s: %s\n", path, strerror(errno));
+        return false;
+    }
+    TraceFileHeader header = {
+        .magic = TRACE_FILE_MAGIC,
+        .version = TRACE_FILE_VERSION,
+        .header_size = sizeof(TraceFileHeader),
+    };
+    *trace = (TraceWriter){
+        .path = path,
+        .file = file,
+        .buffer = (uint8_t *)SLABES_MALLOC(TRACE_BUFFER_SIZE),
+        .failed = fwrite(&header, sizeof(header), 1, file) != 1,
+    };
+    game_trace_maze(game);
+    return true;
+}
+
+void game_trace_op(Game *game, RobotOp op, uint8_t result) {
+    TraceWriter *trace = &game->trace;
+    if (!trace->file) {
+        return;
+    }
+    if (trace->used == TRACE_BUFFER_SIZE) {
+        trace_flush(trace);
+    }
+    trace->buffer[trace->used++] = op | (result << TRACE_OP_BITS);
+}
+
+void game_trace_maze(Game *game) {
+    TraceWriter *trace = &game->trace;
+    if (!trace->file) {
+        return;
+    }
+    trace_flush(trace);
+    if (fputc(TRACE_MAZE, trace->file) == EOF || !maze_file_write(game, trace->file)) {
+        trace->failed = true;
+    }
+}
+
+bool game_stop_trace(Game *game) {
+    TraceWriter *trace = &game->trace;
+    if (!trace->file) {
+        return true;
+    }
+    trace_flush(trace);
+    bool ok = (fclose(trace->file) == 0) && !trace->failed;
+    if (!ok) {
+        printf("Failed to record %s\n", trace->path);
+    }
+    SLABES_FREE(trace->buffer);
+    *trace = (TraceWriter){0};
+    return ok;
+}
+
+static bool game_load_display(Game *game, char *libname) {
+    Display *display = &game->display;
 
-bool load_library(char *libname) {
     if (lt_dlinit()) {
         printf("Failed to initialize libltdl\n");
         printf("Continuing without displaying game state\n");
         return true;
     }
 
-    library_handle = lt_dlopen(libname);
-    if (!library_handle) {
+    lt_dlhandle handle = lt_dlopen(libname);
+    if (!handle) {
         printf("Failed to load %s: %s\n", libname, lt_dlerror());
         printf("Continuing without displaying game state\n");
+        lt_dlexit();
         return true;
     }
+    display->handle = handle;
 
-    setup_display_function = (bool_game_function_t)lt_dlsym(library_handle, "setup_display");
-    if (!setup_display_function) {
+    display->setup = (bool_game_function_t)lt_dlsym(handle, "setup_display");
+    if (!display->setup) {
         fprintf(stderr, "Failed to find setup_display function: %s\n", lt_dlerror());
         return false;
     }
 
-    update_display_function = (void_game_function_t)lt_dlsym(library_handle, "update_display");
-    if (!update_display_function) {
+    display->update = (void_game_function_t)lt_dlsym(handle, "update_display");
+    if (!display->update) {
         fprintf(stderr, "Failed to find update_display function: %s\n", lt_dlerror());
         return false;
     }
 
-    cleanup_display_function = (void_game_function_t)lt_dlsym(library_handle, "cleanup_display");
-    if (!cleanup_display_function) {
+    display->cleanup = (void_game_function_t)lt_dlsym(handle, "cleanup_display");
+    if (!display->cleanup) {
         fprintf(stderr, "Failed to find cleanup_display function: %s\n", lt_dlerror());
         return false;
     }
@@ -436,43 +1225,513 @@ bool load_library(char *libname) {
     return true;
 }
 
-bool setup_game(char *libname, size_t field_side) {
-    Game *game = get_game();
+// names of the games are short and safe in a path, the segments are prefixed to not clash with anything else
+#define SHARED_GAME_NAME_MAX 64
+
+static char *shared_game_segment_name(const char *name) {
+    size_t length = strlen(name);
+    if (length == 0 || length > SHARED_GAME_NAME_MAX) {
+        return NULL;
+    }
+    for (const char *c = name; *c; ++c) {
+        if (!isalnum((unsigned char)*c) && *c != '-' && *c != '_' && *c != '.') {
+            return NULL;
+        }
+    }
+#ifdef _WIN32
+    const char *prefix = "Local\\slabes-";
+#else
+    const char *prefix = "/slabes-";
+#endif
+    char *segment = (char *)SLABES_MALLOC(strlen(prefix) + length + 1);
+    strcpy(segment, prefix);
+    strcat(segment, name);
+    return segment;
+}
+
+#ifndef _WIN32
+// a segment left by a game that crashed: its owner is gone, or it died before the header was written.
+// One of another version can't be told apart from a running game, so it's left alone
+static bool shared_game_is_stale(const char *segment) {
+    int fd = shm_open(segment, O_RDONLY, 0);
+    if (fd < 0) {
+        return errno == ENOENT;  // removed in the meantime
+    }
+    bool stale = false;
+    struct stat st;
+    if (fstat(fd, &st) == 0) {
+        if ((size_t)st.st_size < sizeof(SharedGameHeader)) {
+            stale = true;
+        } else {
+            SharedGameHeader *header = (SharedGameHeader *)mmap(NULL, sizeof(SharedGameHeader), PROT_READ, MAP_SHARED, fd, 0);
+            if (header != MAP_FAILED) {
+                if (memcmp(header->magic, SHARED_GAME_MAGIC, sizeof(header->magic)) != 0) {
+                    stale = true;
+                } else if (header->version == SHARED_GAME_VERSION) {
+                    stale = kill((pid_t)header->owner_pid, 0) != 0 && errno == ESRCH;
+                }
+                munmap(header, sizeof(SharedGameHeader));
+            }
+        }
+    }
+    close(fd);
+    return stale;
+}
+#endif
+
+// creates the segment of the size or opens an existing one read only, its size is returned in mapped_size.
+// Creating fails with EEXIST while another game uses the name
+static void *shared_game_map(const char *segment, size_t size, bool create, size_t *mapped_size) {
+    *mapped_size = 0;
+#ifdef _WIN32
+    HANDLE mapping = create?
+        CreateFileMappingA(INVALID_HANDLE_VALUE, NULL, PAGE_READWRITE, (DWORD)((uint64_t)size >> 32), (DWORD)size, segment)
+        : OpenFileMappingA(FILE_MAP_READ, FALSE, segment);
+    if (!mapping) { return NULL; }
+    // a mapping lives as long as a handle or a view of it, so an existing one belongs to a running game
+    if (create && GetLastError() == ERROR_ALREADY_EXISTS) {
+        CloseHandle(mapping);
+        errno = EEXIST;
+        return NULL;
+    }
+    // the view keeps the mapping alive
+    void *data = MapViewOfFile(mapping, create? FILE_MAP_WRITE : FILE_MAP_READ, 0, 0, size);
+    CloseHandle(mapping);
+    if (data && !create) {
+        MEMORY_BASIC_INFORMATION info;
+        VirtualQuery(data, &info, sizeof(info));
+        size = info.RegionSize;
+    }
+#else
+    int fd = shm_open(segment, create? O_RDWR | O_CREAT | O_EXCL : O_RDONLY, 0600);
+    if (fd < 0 && create && errno == EEXIST) {
+        if (!shared_game_is_stale(segment)) {
+            errno = EEXIST;
+            return NULL;
+        }
+        shm_unlink(segment);
+        fd = shm_open(segment, O_RDWR | O_CREAT | O_EXCL, 0600);
+    }
+    if (fd < 0) { return NULL; }
+    void *data = NULL;
+    if (create) {
+        if (ftruncate(fd, size) == 0) {
+            data = mmap(NULL, size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+        }
+    } else {
+        struct stat st;
+        if (fstat(fd, &st) == 0 && st.st_size > 0) {
+            size = st.st_size;
+            data = mmap(NULL, size, PROT_READ, MAP_SHARED, fd, 0);
+        }
+    }
+    int error = errno;
+    close(fd);
+    if (data == MAP_FAILED) { data = NULL; }
+    if (!data && create) { shm_unlink(segment); }
+    errno = error;
+#endif
+    if (data) { *mapped_size = size; }
+    return data;
+}
+
+static void shared_game_unmap(void *data, size_t size) {
+#ifdef _WIN32
+    UnmapViewOfFile(data);
+#else
+    munmap(data, size);
+#endif
+}
+
+// the writer of a seqlock, the readers see an odd sequence until the write ends
+static void shared_game_begin_write(_Atomic uint64_t *sequence) {
+    uint64_t value = atomic_load_explicit(sequence, memory_order_relaxed);
+    atomic_store_explicit(sequence, value + 1, memory_order_relaxed);
+    atomic_thread_fence(memory_order_release);
+}
 
-    srand(time(NULL));
+static void shared_game_end_write(_Atomic uint64_t *sequence) {
+    uint64_t value = atomic_load_explicit(sequence, memory_order_relaxed);
+    atomic_store_explicit(sequence, value + 1, memory_order_release);
+}
 
-    field_construct_square(&game->field, field_side);
-    game_reset(game);
-    game_set_player_position(game, (Position){0, 0});
+bool shared_game_begin_read(_Atomic uint64_t *sequence, uint64_t *version) {
+    *version = atomic_load_explicit(sequence, memory_order_acquire);
+    return !(*version & 1);
+}
 
-    if (libname && !load_library(libname)) {
+bool shared_game_end_read(_Atomic uint64_t *sequence, uint64_t version) {
+    atomic_thread_fence(memory_order_acquire);
+    return atomic_load_explicit(sequence, memory_order_relaxed) == version;
+}
+
+static Walls *shared_game_walls(SharedGameHeader *header) {
+    return (Walls *)((uint8_t *)header + header->header_size);
+}
+
+static Cell *shared_game_cells(SharedGameHeader *header) {
+    return (Cell *)(shared_game_walls(header) + header->width * header->height);
+}
+
+bool game_start_share(Game *game, const char *name) {
+    char *segment = shared_game_segment_name(name);
+    if (!segment) {
+        printf("Invalid share name '%s', expected up to %d letters, digits, '-', '_' and '.'\n", name, SHARED_GAME_NAME_MAX);
+        return false;
+    }
+    size_t cell_count = game->field.width * game->field.height;
+    size_t size = sizeof(SharedGameHeader) + (sizeof(Walls) + sizeof(Cell)) * cell_count;
+    SharedGameHeader *header = (SharedGameHeader *)shared_game_map(segment, size, true, &size);
+    if (!header) {
+        printf("Failed to share the game as %s: %s\n", name, (errno == EEXIST)? "another running game shares under that name" : strerror(errno));
+        SLABES_FREE(segment);
         return false;
     }
 
-    if (setup_display_function) {
-        if (!setup_display_function(game)) {
-            return false;
+    // the segment starts zeroed, the magic comes last so a viewer never takes a half written header
+    header->version = SHARED_GAME_VERSION;
+    header->header_size = sizeof(SharedGameHeader);
+    header->width = game->field.width;
+    header->height = game->field.height;
+#ifdef _WIN32
+    header->owner_pid = GetCurrentProcessId();
+#else
+    header->owner_pid = getpid();
+#endif
+    atomic_thread_fence(memory_order_release);
+    memcpy(header->magic, SHARED_GAME_MAGIC, sizeof(header->magic));
+
+    game->share = (SharedGame){header, size, segment};
+    game_share_maze(game);
+    game_share_state(game);
+    return true;
+}
+
+void game_share_state(Game *game) {
+    SharedGameHeader *header = game->share.header;
+    if (!header) {
+        return;
+    }
+    shared_game_begin_write(&header->sequence);
+    header->state.player_x = game->player_position.x;
+    header->state.player_y = game->player_position.y;
+    header->state.finish_x = game->finish_position.x;
+    header->state.finish_y = game->finish_position.y;
+    header->state.player_direction = game->player_direction;
+    shared_game_end_write(&header->sequence);
+}
+
+void game_share_maze(Game *game) {
+    SharedGameHeader *header = game->share.header;
+    if (!header) {
+        return;
+    }
+    size_t cell_count = game->field.width * game->field.height;
+    Cell *cells = shared_game_cells(header);
+    shared_game_begin_write(&header->maze_sequence);
+    memcpy(shared_game_walls(header), game->field.walls, sizeof(Walls) * cell_count);
+    memcpy(cells, game->field.cells, sizeof(Cell) * cell_count);
+    // the viewers put the player where the state says
+    cells[INDEX_OF(&game->field, game->player_position.x, game->player_position.y)] = Empty;
+    shared_game_end_write(&header->maze_sequence);
+}
+
+void game_stop_share(Game *game) {
+    SharedGame *share = &game->share;
+    if (!share->header) {
+        return;
+    }
+    shared_game_begin_write(&share->header->sequence);
+    share->header->state.finished = 1;
+    shared_game_end_write(&share->header->sequence);
+#ifndef _WIN32
+    shm_unlink(share->name);  // the viewers keep their mappings
+#endif
+    shared_game_unmap(share->header, share->size);
+    SLABES_FREE(share->name);
+    *share = (SharedGame){0};
+}
+
+SharedGameHeader *shared_game_attach(const char *name, size_t *size) {
+    *size = 0;
+    char *segment = shared_game_segment_name(name);
+    if (!segment) {
+        return NULL;
+    }
+    SharedGameHeader *header = (SharedGameHeader *)shared_game_map(segment, 0, false, size);
+    SLABES_FREE(segment);
+    return header;
+}
+
+void shared_game_detach(SharedGameHeader *header, size_t size) {
+    shared_game_unmap(header, size);
+}
+
+// The display thread draws a copy of the game, the view, so the game never waits for a frame.
+// The position and the direction of the player are passed through a triple buffer: the game fills
+// the back state and swaps it with the middle one, the thread swaps the middle one with the front one
+// when it is fresh and draws it, the states swapped in between are never drawn and nobody ever waits.
+// The field is copied only when there is a new maze, under a lock the game takes once per maze.
+
+typedef struct {
+    Position player_position;
+    Direction player_direction;
+    uint64_t maze;  // DisplayThread.maze_version of the maze the player is on
+} DisplayState;
+
+#define DISPLAY_STATE_FRESH 4u  // set in DisplayThread.middle until the thread takes it
+
+struct DisplayThread {
+    pthread_t thread;
+    bool_game_function_t setup;
+    void_game_function_t update;
+    void_game_function_t cleanup;
+    uint64_t frame_us;
+    atomic_bool stop;  // the game is over, the thread draws the last state and cleans up
+
+    DisplayState states[3];
+    unsigned back;  // of the game
+    unsigned front;  // of the thread
+    atomic_uint middle;  // the index of the middle state | DISPLAY_STATE_FRESH
+
+    pthread_mutex_t lock;
+    pthread_cond_t ready;
+    int setup_result;  // -1 until setup_display returns
+    Field maze;  // the cells and the walls of the latest maze
+    Position maze_finish;
+    DisplayState maze_state;  // of the player when the maze was made
+    uint64_t maze_version;  // written only by the game
+
+    Game view;  // what the display shows, only the thread touches it
+    uint64_t shown_maze;  // maze_version of the view
+};
+
+static void display_thread_publish_maze(Game *game) {
+    DisplayThread *thread = game->display.thread;
+    if (!thread) {
+        return;
+    }
+    size_t cell_count = game->field.width * game->field.height;
+    pthread_mutex_lock(&thread->lock);
+    memcpy(thread->maze.cells, game->field.cells, sizeof(Cell) * cell_count);
+    memcpy(thread->maze.walls, game->field.walls, sizeof(Walls) * cell_count);
+    thread->maze_finish = game->finish_position;
+    thread->maze_state = (DisplayState){game->player_position, game->player_direction, ++thread->maze_version};
+    pthread_mutex_unlock(&thread->lock);
+}
+
+// the view shows the latest maze as it was made, the lock must be held
+static void display_thread_copy_maze(DisplayThread *thread) {
+    Game *view = &thread->view;
+    size_t cell_count = view->field.width * view->field.height;
+    memcpy(view->field.cells, thread->maze.cells, sizeof(Cell) * cell_count);
+    memcpy(view->field.walls, thread->maze.walls, sizeof(Walls) * cell_count);
+    view->finish_position = thread->maze_finish;
+    view->player_position = thread->maze_state.player_position;
+    view->player_direction = thread->maze_state.player_direction;
+    thread->shown_maze = thread->maze_version;
+}
+
+// takes the latest state, false if there is nothing new to draw
+static bool display_thread_refresh(DisplayThread *thread) {
+    if (!(atomic_load(&thread->middle) & DISPLAY_STATE_FRESH)) {
+        return false;
+    }
+    thread->front = atomic_exchange(&thread->middle, thread->front) & ~DISPLAY_STATE_FRESH;
+    DisplayState state = thread->states[thread->front];
+
+    if (state.maze != thread->shown_maze) {
+        pthread_mutex_lock(&thread->lock);
+        display_thread_copy_maze(thread);
+        pthread_mutex_unlock(&thread->lock);
+        if (state.maze != thread->shown_maze) {
+            return true;  // the maze is newer than the state, its own state comes next
+        }
+    }
+    game_set_player_position(&thread->view, state.player_position);
+    thread->view.player_direction = state.player_direction;
+    return true;
+}
+
+static uint64_t display_thread_now_us() {
+    struct timespec ts;
+    timespec_get(&ts, TIME_UTC);
+    return (uint64_t)ts.tv_sec * 1000000 + ts.tv_nsec / 1000;
+}
+
+static void *display_thread_main(void *arg) {
+    DisplayThread *thread = (DisplayThread *)arg;
+
+    bool ok = thread->setup(&thread->view);
+    pthread_mutex_lock(&thread->lock);
+    thread->setup_result = ok;
+    pthread_cond_signal(&thread->ready);
+    pthread_mutex_unlock(&thread->lock);
+    if (!ok) {
+        return NULL;
+    }
+
+    for (;;) {
+        // the game publishes its last state before it stops the thread, so it is always drawn
+        bool stop = atomic_load(&thread->stop);
+        uint64_t start = display_thread_now_us();
+        if (display_thread_refresh(thread)) {
+            thread->update(&thread->view);
+        }
+        if (stop) {
+            break;
+        }
+        uint64_t elapsed_us = display_thread_now_us() - start;
+        if (elapsed_us < thread->frame_us) {
+            slabes_sleep_us(thread->frame_us - elapsed_us);
         }
     }
 
+    thread->cleanup(&thread->view);
+    return NULL;
+}
+
+static void display_thread_destroy(DisplayThread *thread) {
+    field_destruct(&thread->view.field);
+    field_destruct(&thread->maze);
+    pthread_cond_destroy(&thread->ready);
+    pthread_mutex_destroy(&thread->lock);
+    SLABES_FREE(thread);
+}
+
+// runs setup_display on the new thread and waits for it, the window of some libraries belongs to the thread
+static bool game_start_display_thread(Game *game, uint32_t fps) {
+    Display *display = &game->display;
+    DisplayThread *thread = (DisplayThread *)SLABES_MALLOC(sizeof(DisplayThread));
+    memset(thread, 0, sizeof(DisplayThread));
+    thread->setup = display->setup;
+    thread->update = display->update;
+    thread->cleanup = display->cleanup;
+    thread->frame_us = 1000000 / fps;
+    atomic_init(&thread->stop, false);
+    thread->back = 0;
+    thread->front = 2;
+    atomic_init(&thread->middle, 1);
+    pthread_mutex_init(&thread->lock, NULL);
+    pthread_cond_init(&thread->ready, NULL);
+    thread->setup_result = -1;
+    field_construct(&thread->maze, game->field.width, game->field.height);
+    field_construct(&thread->view.field, game->field.width, game->field.height);
+
+    display->thread = thread;
+    display_thread_publish_maze(game);
+    display_thread_copy_maze(thread);
+
+    if (pthread_create(&thread->thread, NULL, display_thread_main, thread) != 0) {
+        printf("Failed to start the display thread\n");
+        display->thread = NULL;
+        display_thread_destroy(thread);
+        return false;
+    }
+
+    pthread_mutex_lock(&thread->lock);
+    while (thread->setup_result < 0) {
+        pthread_cond_wait(&thread->ready, &thread->lock);
+    }
+    pthread_mutex_unlock(&thread->lock);
+    if (!thread->setup_result) {
+        pthread_join(thread->thread, NULL);
+        display->thread = NULL;
+        display_thread_destroy(thread);
+        return false;
+    }
     return true;
 }
 
-void update_game_display() {
-    if (update_display_function) {
-        update_display_function(get_game());
+static void game_stop_display_thread(Game *game) {
+    DisplayThread *thread = game->display.thread;
+    atomic_store(&thread->stop, true);
+    pthread_join(thread->thread, NULL);
+    game->display.thread = NULL;
+    display_thread_destroy(thread);
+}
+
+bool game_setup(Game *game, char *libname, GameOptions *options) {
+    *game = (Game){0};
+
+    if (!options->maze_file && !field_size_is_valid(options->field_width, options->field_height)) {
+        printf("Invalid field size %zux%zu, at most %lu cells are supported\n", options->field_width, options->field_height, (unsigned long)FIELD_MAX_CELLS);
+        return false;
+    }
+
+    rng_seed(&game->rng, options->seeded? options->seed : rng_time_seed());
+    game->maze_generator = options->maze_generator;
+    game->states.repeat_limit = options->cycle_limit;
+
+    if (options->maze_file) {
+        if (!game_load_maze(game, options->maze_file)) {
+            return false;
+        }
+    } else {
+        field_construct(&game->field, options->field_width, options->field_height);
+        game_reset(game);
+        game_set_player_position(game, (Position){0, 0});
+    }
+
+    if (options->count_visits) {
+        game->telemetry.visits = (uint32_t *)SLABES_MALLOC(sizeof(uint32_t) * game->field.width * game->field.height);
+        telemetry_clear_visits(game);
+    }
+
+    if (options->trace_file && !game_start_trace(game, options->trace_file)) {
+        return false;
+    }
+
+    if (options->share_name && !game_start_share(game, options->share_name)) {
+        return false;
+    }
+
+    if (libname && !game_load_display(game, libname)) {
+        return false;
+    }
+
+    if (game->display.setup && options->display_fps) {
+        return game_start_display_thread(game, options->display_fps);
+    }
+    if (game->display.setup) {
+        if (!game->display.setup(game)) {
+            return false;
+        }
     }
+
+    return true;
 }
 
-void cleanup_game() {
-    Game *game = get_game();
+void game_update_display(Game *game) {
+    game_share_state(game);
+    DisplayThread *thread = game->display.thread;
+    if (thread) {
+        thread->states[thread->back] = (DisplayState){game->player_position, game->player_direction, thread->maze_version};
+        thread->back = atomic_exchange(&thread->middle, thread->back | DISPLAY_STATE_FRESH) & ~DISPLAY_STATE_FRESH;
+        return;
+    }
+    if (game->display.update) {
+        game->display.update(game);
+    }
+}
 
-    if (cleanup_display_function) {
-        cleanup_display_function(game);
+void game_cleanup(Game *game) {
+    if (game->display.thread) {
+        game_stop_display_thread(game);
+    } else if (game->display.cleanup) {
+        game->display.cleanup(game);
     }
 
-    lt_dlclose(library_handle);
-    lt_dlexit();
+    if (game->display.handle) {
+        lt_dlclose(game->display.handle);
+        lt_dlexit();
+    }
+    game->display = (Display){0};
 
+    game_stop_trace(game);
+    game_stop_share(game);
+    state_tracker_clear(&game->states);
+    SLABES_FREE(game->telemetry.visits);
+    game->telemetry = (Telemetry){0};
     field_destruct(&game->field);
 }
@@ -6,6 +6,8 @@
 #include <stdbool.h>
 #include <stdlib.h>
 #include <stdint.h>
+#include <stdio.h>
+#include <stdatomic.h>
 
 /*
  _   _   _  
@@ -39,22 +41,251 @@ typedef enum : uint8_t {
 
 typedef Direction Walls;
 
+// the maze generator keeps cell indices in 32 bits
+#define FIELD_MAX_CELLS UINT32_MAX
+
+// the field of side N is N cells wide and 2N + 1 rows high, see field_construct_square
+#define FIELD_DEFAULT_SIDE 10
+
 typedef struct {
     size_t width, height;
     Cell *cells;
     Walls *walls;  // Wall order is: DownLeft, Down, DownRight, UpRight, Up and UpLeft
+    void *mapping;  // the loaded maze file the cells and the walls point into, NULL if they are allocated
+    size_t mapping_size;
 } Field;
 
 typedef struct {
     size_t x, y;
 } Position;
 
+typedef enum {
+    MazeBacktracker,  // randomized depth first search, long corridors
+    MazeKruskal,
+    MazeWilson,  // uniform spanning tree
+    MazeEller,  // strip by strip, O(width) memory
+    MazeGeneratorCount,
+} MazeGenerator;
+
+// pcg32, see rng_next
+typedef struct {
+    uint64_t state, increment;
+} Rng;
+
+void rng_seed(Rng *rng, uint64_t seed);
+
+uint32_t rng_next(Rng *rng);
+
+size_t rng_below(Rng *rng, size_t bound);
+
+uint64_t rng_time_seed();
+
+// how many times the robot has been in each (position, direction, last sonar value) state,
+// a state seen repeat_limit times away from the finish means the robot goes around in circles
+typedef struct {
+    uint64_t key;  // 0 for an empty slot
+    uint32_t count;
+    uint64_t last_seen;  // tick of the last visit
+} VisitedState;
+
+typedef struct {
+    uint32_t repeat_limit;  // 0 disables the tracking
+    VisitedState *slots;  // open addressing, the capacity is a power of two
+    size_t capacity, count;
+    uint64_t tick;  // moves and turns tracked so far
+    uint64_t last_key;  // the state after the previous move or turn
+    uint32_t repeats_in_place;  // moves into walls and the like since the state changed
+    uint8_t last_sonar;
+    uint64_t cycle_length;  // in moves and turns between the last two visits, 0 until a cycle is found
+} StateTracker;
+
+typedef enum {
+    RobotGo,
+    RobotRl,
+    RobotRr,
+    RobotSonar,
+    RobotCompass,
+    RobotOpCount,
+} RobotOp;
+
+// what the robot did, to compare solvers with each other
+typedef struct {
+    uint64_t ops[RobotOpCount];  // counted by the robot commands
+    uint64_t wall_bumps;  // go commands that didn't move the player
+    uint32_t *visits;  // how many times the player entered each cell (saturating), NULL if not counted
+    uint64_t distinct_cells;  // with a visit
+} Telemetry;
+
+#define TRACE_FILE_MAGIC "SLBTRAC"
+#define TRACE_FILE_VERSION 1
+
+// binary trace of a run, little endian: the header and then a byte per robot command,
+// the RobotOp in the low TRACE_OP_BITS and its result above them (moved for go, the sonar bits,
+// at the finish for compass). A TRACE_MAZE byte is followed by the field at that point as a maze file
+// (MazeFileHeader, walls and cells), the first record is one
 typedef struct {
+    char magic[8];
+    uint32_t version;
+    uint32_t header_size;  // offset of the first record
+} TraceFileHeader;
+
+#define TRACE_OP_BITS 3
+#define TRACE_MAZE ((1 << TRACE_OP_BITS) - 1)
+
+// the records are buffered, the trace ends with the last one written before game_stop_trace
+typedef struct {
+    const char *path;
+    FILE *file;  // NULL when not recording
+    uint8_t *buffer;
+    size_t used;
+    bool failed;
+} TraceWriter;
+
+#define SHARED_GAME_MAGIC "SLBSHAR"
+#define SHARED_GAME_VERSION 2
+
+// what a viewer needs besides the maze, it changes with every move and turn
+typedef struct {
+    uint64_t player_x, player_y;
+    uint64_t finish_x, finish_y;
+    uint32_t player_direction;
+    uint32_t finished;  // the game is over, the segment is gone for new viewers
+} SharedGameState;
+
+// a running game in shared memory (--share=NAME) for libslabes/slabes_view to attach to: the header and then
+// the walls and the cells of the field as in a maze file, the cells without the player. Both parts are seqlocks,
+// the game makes the sequence odd while it writes and never waits, a viewer reads again when the sequence changed
+typedef struct {
+    char magic[8];
+    uint32_t version;
+    uint32_t header_size;  // offset of the walls
+    uint64_t width, height;
+    uint64_t owner_pid;  // the process of the game, a new game takes the name only when it's gone
+    _Atomic uint64_t maze_sequence;  // of the walls and the cells, only a new maze changes them
+    _Atomic uint64_t sequence;  // of the state
+    SharedGameState state;
+} SharedGameHeader;
+
+typedef struct {
+    SharedGameHeader *header;  // NULL when not shared
+    size_t size;
+    char *name;  // of the segment
+} SharedGame;
+
+typedef struct Game Game;
+
+typedef void (*void_game_function_t)(Game *game);
+typedef bool (*bool_game_function_t)(Game *game);
+
+// draws the game on a thread of its own, see GameOptions.display_fps
+typedef struct DisplayThread DisplayThread;
+
+// a display library loaded with libltdl, the functions are NULL without one
+typedef struct {
+    void *handle;
+    bool_game_function_t setup;
+    void_game_function_t update;
+    void_game_function_t cleanup;
+    DisplayThread *thread;  // NULL when the game calls the functions itself
+} Display;
+
+// all the state of one simulation, nothing is shared between games
+// so they can run concurrently, each one on its own thread
+struct Game {
     Position player_position;
     Direction player_direction;
     Position finish_position;
+    bool has_finish;  // a maze or a maze file put the finish there, there's none before
     Field field;
-} Game;
+    MazeGenerator maze_generator;
+    Rng rng;  // the maze generators draw from it
+    bool maze_loaded;  // from a maze file, generating a maze keeps it
+    Display display;
+    StateTracker states;
+    Telemetry telemetry;
+    TraceWriter trace;
+    SharedGame share;
+};
+
+typedef struct {
+    size_t field_width, field_height;
+    MazeGenerator maze_generator;
+    bool seeded;  // otherwise the seed comes from the clock
+    uint64_t seed;
+    const char *maze_file;  // load the maze instead of the empty field of the size above
+    uint32_t cycle_limit;  // see StateTracker, 0 to not look for cycles
+    bool count_visits;  // keep Telemetry.visits
+    const char *trace_file;  // record the run there, see TraceFileHeader
+    // 0 to draw every update on the thread of the game, otherwise the display runs on a thread of its own
+    // and draws the latest state at most this many times a second, the game never waits for it
+    uint32_t display_fps;
+    const char *share_name;  // export the game to shared memory under this name, see SharedGameHeader
+} GameOptions;
+
+#define MAZE_FILE_MAGIC "SLBMAZE"
+#define MAZE_FILE_VERSION 1
+
+// binary maze file, little endian: the header and then the walls and the cells
+// of the field exactly as they are in memory, so it can be mapped as is
+typedef struct {
+    char magic[8];
+    uint32_t version;
+    uint32_t header_size;  // offset of the walls
+    uint64_t width, height;
+    uint64_t player_x, player_y;
+    uint64_t finish_x, finish_y;
+    uint32_t player_direction;
+    uint32_t reserved;
+} MazeFileHeader;
+
+#define HEATMAP_FILE_MAGIC "SLBHEAT"
+#define HEATMAP_FILE_VERSION 1
+
+// Telemetry.visits, little endian: the header and a uint32 per cell in the order of the field
+typedef struct {
+    char magic[8];
+    uint32_t version;
+    uint32_t header_size;  // offset of the counts
+    uint64_t width, height;
+} HeatmapFileHeader;
+
+void slabes_sleep_us(uint64_t microseconds);
+
+bool game_load_maze(Game *game, const char *path);
+
+bool game_save_maze(Game *game, const char *path);
+
+bool game_save_heatmap(Game *game, const char *path);
+
+bool game_start_trace(Game *game, const char *path);
+
+void game_trace_op(Game *game, RobotOp op, uint8_t result);
+
+// records the current field, game_generate_a_maze does it for every new maze
+void game_trace_maze(Game *game);
+
+bool game_stop_trace(Game *game);
+
+bool game_start_share(Game *game, const char *name);
+
+// publishes the player, game_update_display does it
+void game_share_state(Game *game);
+
+// publishes the field, game_generate_a_maze does it for every new maze
+void game_share_maze(Game *game);
+
+void game_stop_share(Game *game);
+
+// the segment of a running game, read only, NULL if there's no game of that name
+SharedGameHeader *shared_game_attach(const char *name, size_t *size);
+
+void shared_game_detach(SharedGameHeader *header, size_t size);
+
+// a reader copies what a sequence of the header protects between these two, false if the game was writing it,
+// then the copy may be torn and is made again
+bool shared_game_begin_read(_Atomic uint64_t *sequence, uint64_t *version);
+
+bool shared_game_end_read(_Atomic uint64_t *sequence, uint64_t version);
 
 #define INDEX_OF(field, x, y) ((y) * (field)->width + (x))
 
@@ -86,4 +317,25 @@ Walls game_walls_with_map_end(Game *game, Walls walls, ssize_t x, ssize_t y);
 
 void game_set_finish(Game *game, ssize_t x, ssize_t y);
 
+bool field_size_is_valid(size_t width, size_t height);
+
+const char *maze_generator_name(MazeGenerator generator);
+
+bool maze_generator_from_name(const char *name, MazeGenerator *generator);
+
+void game_generate_a_maze(Game *game);
+
+bool game_make_player_take_one_step(Game *game);
+
+void game_turn_player(Game *game, Direction direction);
+
+bool game_track_state(Game *game);
+
+// libname is the display library or NULL, loading libraries is not thread safe
+bool game_setup(Game *game, char *libname, GameOptions *options);
+
+void game_update_display(Game *game);
+
+void game_cleanup(Game *game);
+
 #endif // SLABES_H
@@ -2,10 +2,16 @@
 
 #include "slabes.c"
 
-int main() {
-    Game *game = get_game();
+// ./demo [seed], a random maze every run without it
+uint64_t demo_seed(int argc, char *argv[]) {
+    return (argc > 1)? strtoull(argv[1], NULL, 10) : rng_time_seed();
+}
+
+int main(int argc, char *argv[]) {
+    Game state = {0};
+    Game *game = &state;
 
-    srand(time(NULL));
+    rng_seed(&game->rng, demo_seed(argc, argv));
 
     field_construct_square(&game->field, 10);
 
@@ -0,0 +1,51 @@
+#include "slabes.c"
+
+// generates a maze like the programs do and saves it for --maze-file,
+// much faster than 'slabes maze generate' for large fields
+
+void usage(char *program) {
+    printf("usage: %s output.maze SIDE|WIDTHxHEIGHT [GENERATOR [SEED]]\n", program);
+    printf("generators:");
+    for (size_t i = 0; i < MazeGeneratorCount; ++i) {
+        printf(" %s", maze_generator_name(i));
+    }
+    printf("\n");
+}
+
+int main(int argc, char *argv[]) {
+    if (argc < 3 || argc > 5) {
+        usage(argv[0]);
+        return EXIT_FAILURE;
+    }
+
+    Game state = {0};
+    Game *game = &state;
+
+    size_t width = 0, height = 0;
+    char end;
+    if (sscanf(argv[2], "%zux%zu%c", &width, &height, &end) == 1) {
+        height = width * 2 + 1;
+    } else if (sscanf(argv[2], "%zux%zu%c", &width, &height, &end) != 2) {
+        width = 0;
+    }
+    if (!field_size_is_valid(width, height)) {
+        printf("Invalid field size '%s'\n", argv[2]);
+        return EXIT_FAILURE;
+    }
+
+    if (argc > 3 && !maze_generator_from_name(argv[3], &game->maze_generator)) {
+        usage(argv[0]);
+        return EXIT_FAILURE;
+    }
+
+    rng_seed(&game->rng, (argc > 4)? strtoull(argv[4], NULL, 10) : rng_time_seed());
+
+    field_construct(&game->field, width, height);
+    game_reset(game);
+    game_set_player_position(game, (Position){0, 0});
+    game_generate_a_maze(game);
+
+    bool saved = game_save_maze(game, argv[1]);
+    field_destruct(&game->field);
+    return saved? EXIT_SUCCESS : EXIT_FAILURE;
+}
@@ -42,9 +42,10 @@ void game_generate_a_maze_animated(Game *game) {
 
     while (stack_head - stack_base) {
         sleep_ms(50);
+        update_maze_texture(game);
         BeginDrawing();
             ClearBackground(background_color);
-            draw_hexagon_grid(game, hex_side);
+            draw_maze(game);
         EndDrawing();
 
         if (stack_head - stack_base > max_distance) {
@@ -54,7 +55,7 @@ void game_generate_a_maze_animated(Game *game) {
 
         current_pos = *--stack_head;
 
-        size_t direction_shift = rand();
+        size_t direction_shift = rng_below(&game->rng, DirectionCount);
         for (size_t i = 0; i < DirectionCount; ++i) {
             Direction dir = 1 << ((direction_shift + i) % DirectionCount);
 
@@ -81,10 +82,16 @@ void game_generate_a_maze_animated(Game *game) {
     SLABES_FREE(visited);
 }
 
-int main(void) {
-    Game *game = get_game();
+// ./demo [seed], a random maze every run without it
+uint64_t demo_seed(int argc, char *argv[]) {
+    return (argc > 1)? strtoull(argv[1], NULL, 10) : rng_time_seed();
+}
+
+int main(int argc, char *argv[]) {
+    Game state = {0};
+    Game *game = &state;
 
-    srand(time(NULL));
+    rng_seed(&game->rng, demo_seed(argc, argv));
 
     field_construct_square(&game->field, 10);
 
@@ -128,14 +135,16 @@ int main(void) {
             game_make_player_take_one_step(game);
         }
 
+        update_maze_texture(game);
         BeginDrawing();
 
             ClearBackground(background_color);
-            draw_hexagon_grid(game, hex_side);
+            draw_maze(game);
 
         EndDrawing();
     }
 
+    unload_maze_texture();
     CloseWindow();
 
     field_destruct(&game->field);
@@ -0,0 +1,219 @@
+#include "slabes.c"
+
+#include <inttypes.h>
+
+// plays a trace recorded with --trace on a display library, at any speed and from any step,
+// without running the program again
+
+// robot commands per second, the pace of the programs with the real clock
+#define REPLAY_DEFAULT_SPEED 10.0
+
+typedef struct {
+    uint8_t *data;
+    size_t size;
+    size_t offset;  // of the next record
+    uint64_t step;  // robot commands replayed so far
+} Replay;
+
+void usage(char *program) {
+    printf("usage: %s run.trace [--speed=COMMANDS_PER_SECOND] [--step=N] [display library]\n", program);
+    printf("--speed=0 replays as fast as the display goes, --step=N skips to the state after N robot commands\n");
+}
+
+static const char *replay_check(Replay *replay) {
+    TraceFileHeader header;
+    if (replay->size < sizeof(header)) {
+        return "not a trace file";
+    }
+    memcpy(&header, replay->data, sizeof(header));
+    if (memcmp(header.magic, TRACE_FILE_MAGIC, sizeof(header.magic)) != 0) {
+        return "not a trace file";
+    }
+    if (header.version != TRACE_FILE_VERSION) {
+        return "unsupported trace file version";
+    }
+    if (header.header_size < sizeof(header) || header.header_size >= replay->size) {
+        return "corrupted header";
+    }
+    if (replay->data[header.header_size] != TRACE_MAZE) {
+        return "the trace doesn't start with a maze";
+    }
+    replay->offset = header.header_size;
+    return NULL;
+}
+
+// the maze record at the offset, the records are not aligned so the header is copied out
+static const char *replay_maze_record(Replay *replay, MazeFileHeader *header, uint8_t **walls) {
+    size_t available = replay->size - replay->offset - 1;
+    uint8_t *record = replay->data + replay->offset + 1;
+    if (available < sizeof(MazeFileHeader)) {
+        return "truncated maze";
+    }
+    memcpy(header, record, sizeof(MazeFileHeader));
+    if (header->header_size < sizeof(MazeFileHeader) || !field_size_is_valid(header->width, header->height)) {
+        return "corrupted maze";
+    }
+    size_t size = header->header_size + 2 * header->width * header->height;
+    if (size > available) {
+        return "truncated maze";
+    }
+    const char *error = maze_file_check(header, size);
+    if (error) {
+        return error;
+    }
+    *walls = record + header->header_size;
+    replay->offset += 1 + size;
+    return NULL;
+}
+
+// applies the next record to the game, changed tells if there is something new to show
+static const char *replay_next(Replay *replay, Game *game, bool *changed) {
+    uint8_t record = replay->data[replay->offset];
+    *changed = true;
+
+    if (record == TRACE_MAZE) {
+        MazeFileHeader header;
+        uint8_t *walls = NULL;
+        const char *error = replay_maze_record(replay, &header, &walls);
+        if (error) {
+            return error;
+        }
+        Field *field = &game->field;
+        if (header.width != field->width || header.height != field->height) {
+            return "the field changes its size";
+        }
+        size_t cell_count = field->width * field->height;
+        memcpy(field->walls, walls, sizeof(Walls) * cell_count);
+        memcpy(field->cells, walls + cell_count, sizeof(Cell) * cell_count);
+        game->player_position = (Position){header.player_x, header.player_y};
+        game->player_direction = header.player_direction;
+        game->finish_position = (Position){header.finish_x, header.finish_y};
+        return NULL;
+    }
+
+    ++replay->offset;
+    ++replay->step;
+    uint8_t result = record >> TRACE_OP_BITS;
+    switch ((RobotOp)(record & TRACE_MAZE)) {
+        case RobotGo:
+            *changed = game_make_player_take_one_step(game);
+            if (*changed != result) {
+                return "the trace doesn't match its maze";
+            }
+            return NULL;
+        case RobotRl:
+            game_turn_player(game, left_rotated_direction(game->player_direction));
+            return NULL;
+        case RobotRr:
+            game_turn_player(game, right_rotated_direction(game->player_direction));
+            return NULL;
+        case RobotSonar:
+        case RobotCompass:
+            *changed = false;
+            return NULL;
+        default:
+            return "unknown record";
+    }
+}
+
+int main(int argc, char *argv[]) {
+    if (argc < 2) {
+        usage(argv[0]);
+        return EXIT_FAILURE;
+    }
+
+    double speed = REPLAY_DEFAULT_SPEED;
+    uint64_t start = 0;
+    char *libname = NULL;
+    for (int i = 2; i < argc; ++i) {
+        char *end = NULL;
+        if (strncmp(argv[i], "--speed=", 8) == 0) {
+            speed = strtod(argv[i] + 8, &end);
+            if (end == argv[i] + 8 || *end != '\0' || !(speed >= 0)) {
+                printf("Invalid speed '%s', expected robot commands per second\n", argv[i] + 8);
+                return EXIT_FAILURE;
+            }
+        } else if (strncmp(argv[i], "--step=", 7) == 0) {
+            start = strtoull(argv[i] + 7, &end, 10);
+            if (end == argv[i] + 7 || *end != '\0') {
+                printf("Invalid step '%s', expected a non-negative integer\n", argv[i] + 7);
+                return EXIT_FAILURE;
+            }
+        } else if (libname == NULL) {
+            libname = argv[i];
+        } else {
+            usage(argv[0]);
+            return EXIT_FAILURE;
+        }
+    }
+
+    if (!host_is_little_endian()) {
+        printf("Failed to load %s: trace files are little endian\n", argv[1]);
+        return EXIT_FAILURE;
+    }
+    Replay replay = {0};
+    errno = 0;
+    replay.data = maze_file_map(argv[1], &replay.size);
+    if (!replay.data) {
+        printf("Failed to load %s: %s\n", argv[1], errno? strerror(errno) : "empty file");
+        return EXIT_FAILURE;
+    }
+    const char *error = replay_check(&replay);
+    MazeFileHeader first;
+    uint8_t *walls = NULL;
+    if (!error) {
+        // only to know the size of the field, replay_next applies it
+        size_t offset = replay.offset;
+        error = replay_maze_record(&replay, &first, &walls);
+        replay.offset = offset;
+    }
+    if (error) {
+        printf("Failed to load %s: %s\n", argv[1], error);
+        maze_file_unmap(replay.data, replay.size);
+        return EXIT_FAILURE;
+    }
+
+    Game state = {0};
+    Game *game = &state;
+    GameOptions options = {.field_width = first.width, .field_height = first.height, .seeded = true};
+    if (!game_setup(game, libname, &options)) {
+        maze_file_unmap(replay.data, replay.size);
+        return EXIT_FAILURE;
+    }
+
+    // seeking is replaying without showing anything, it takes a few nanoseconds per command
+    bool seeking = start > 0;
+    while (replay.offset < replay.size) {
+        bool is_op = replay.data[replay.offset] != TRACE_MAZE;
+        bool changed = false;
+        error = replay_next(&replay, game, &changed);
+        if (error) {
+            break;
+        }
+        if (seeking) {
+            if (replay.step < start) {
+                continue;
+            }
+            seeking = false;
+            changed = true;
+        }
+        if (changed) {
+            game_update_display(game);
+        }
+        if (is_op && speed > 0) {
+            slabes_sleep_us(1000000 / speed);
+        }
+    }
+    if (seeking) {
+        game_update_display(game);
+    }
+
+    if (error) {
+        printf("Failed to replay %s after %" PRIu64 " robot commands: %s\n", argv[1], replay.step, error);
+    } else {
+        printf("Replayed %" PRIu64 " robot commands\n", replay.step);
+    }
+    game_cleanup(game);
+    maze_file_unmap(replay.data, replay.size);
+    return error? EXIT_FAILURE : EXIT_SUCCESS;
+}
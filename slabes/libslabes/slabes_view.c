@@ -0,0 +1,141 @@
+#include "slabes.c"
+
+#include <signal.h>
+
+// shows a program running with --share=NAME on a display library while it runs,
+// the program doesn't wait for the viewer and doesn't notice it attach or detach
+
+#define VIEW_DEFAULT_FPS 30
+#define VIEW_MAX_FPS 1000
+
+static volatile sig_atomic_t view_interrupted = 0;
+
+static void view_interrupt(int signum) {
+    view_interrupted = 1;
+}
+
+void usage(char *program) {
+    printf("usage: %s NAME [--fps=N] [display library]\n", program);
+    printf("attaches to the program running with --share=NAME and draws it at most N times a second (%d by default), Ctrl-C detaches\n", VIEW_DEFAULT_FPS);
+}
+
+static const char *view_check(SharedGameHeader *header, size_t size) {
+    if (size < sizeof(SharedGameHeader) || memcmp(header->magic, SHARED_GAME_MAGIC, sizeof(header->magic)) != 0) {
+        return "not a shared game";
+    }
+    if (header->version != SHARED_GAME_VERSION) {
+        return "unsupported version";
+    }
+    if (header->header_size < sizeof(SharedGameHeader) || !field_size_is_valid(header->width, header->height)) {
+        return "corrupted header";
+    }
+    if (header->header_size + (sizeof(Walls) + sizeof(Cell)) * header->width * header->height > size) {
+        return "truncated";
+    }
+    return NULL;
+}
+
+// copies the latest maze into the field and puts the player back on it, false if the program was writing it
+static bool view_read_maze(SharedGameHeader *header, Game *game, uint64_t *version) {
+    size_t cell_count = game->field.width * game->field.height;
+    if (!shared_game_begin_read(&header->maze_sequence, version)) {
+        return false;
+    }
+    memcpy(game->field.walls, shared_game_walls(header), sizeof(Walls) * cell_count);
+    memcpy(game->field.cells, shared_game_cells(header), sizeof(Cell) * cell_count);
+    if (!shared_game_end_read(&header->maze_sequence, *version)) {
+        return false;
+    }
+    FIELD_AT(&game->field, game->player_position.x, game->player_position.y) = Player;
+    return true;
+}
+
+static bool view_read_state(SharedGameHeader *header, SharedGameState *state, uint64_t *version) {
+    if (!shared_game_begin_read(&header->sequence, version)) {
+        return false;
+    }
+    memcpy(state, &header->state, sizeof(SharedGameState));
+    return shared_game_end_read(&header->sequence, *version);
+}
+
+int main(int argc, char *argv[]) {
+    if (argc < 2) {
+        usage(argv[0]);
+        return EXIT_FAILURE;
+    }
+
+    unsigned long fps = VIEW_DEFAULT_FPS;
+    char *libname = NULL;
+    for (int i = 2; i < argc; ++i) {
+        char *end = NULL;
+        if (strncmp(argv[i], "--fps=", 6) == 0) {
+            fps = strtoul(argv[i] + 6, &end, 10);
+            if (end == argv[i] + 6 || *end != '\0' || fps == 0 || fps > VIEW_MAX_FPS) {
+                printf("Invalid frame rate '%s', expected frames per second from 1 to %d\n", argv[i] + 6, VIEW_MAX_FPS);
+                return EXIT_FAILURE;
+            }
+        } else if (libname == NULL) {
+            libname = argv[i];
+        } else {
+            usage(argv[0]);
+            return EXIT_FAILURE;
+        }
+    }
+
+    size_t size = 0;
+    SharedGameHeader *header = shared_game_attach(argv[1], &size);
+    if (!header) {
+        printf("No program is sharing its game as %s\n", argv[1]);
+        return EXIT_FAILURE;
+    }
+    const char *error = view_check(header, size);
+    if (error) {
+        printf("Failed to attach to %s: %s\n", argv[1], error);
+        shared_game_detach(header, size);
+        return EXIT_FAILURE;
+    }
+
+    Game state = {0};
+    Game *game = &state;
+    GameOptions options = {.field_width = header->width, .field_height = header->height, .seeded = true};
+    if (!game_setup(game, libname, &options)) {
+        shared_game_detach(header, size);
+        return EXIT_FAILURE;
+    }
+    signal(SIGINT, view_interrupt);
+
+    uint64_t maze_version = 0;
+    uint64_t state_version = 0;
+    SharedGameState shared = {0};
+    while (!view_interrupted && !shared.finished) {
+        bool changed = false;
+        uint64_t version = 0;
+        if (atomic_load(&header->maze_sequence) != maze_version && view_read_maze(header, game, &version)) {
+            maze_version = version;
+            changed = true;
+        }
+        if (view_read_state(header, &shared, &version) && version != state_version) {
+            state_version = version;
+            game_set_player_position(game, (Position){shared.player_x, shared.player_y});
+            game->player_direction = (Direction)shared.player_direction;
+            game->finish_position = (Position){shared.finish_x, shared.finish_y};
+            changed = true;
+        }
+        // nothing to show before the first maze
+        if (changed && maze_version) {
+            game_update_display(game);
+        }
+        if (!shared.finished) {
+            slabes_sleep_us(1000000 / fps);
+        }
+    }
+
+    game_cleanup(game);
+    shared_game_detach(header, size);
+    if (shared.finished) {
+        printf("The program sharing %s has finished\n", argv[1]);
+    } else {
+        printf("Detached from %s\n", argv[1]);
+    }
+    return EXIT_SUCCESS;
+}
@@ -0,0 +1,679 @@
+// Interpreter of the bytecode produced by slabes/bytecode.py
+// usage: slabes_vm program.sbc [--clock=real|virtual|xN] [--size=N|WxH] [--maze=NAME] [--seed=N] [--maze-file=PATH]
+//                  [--max-robot-ops=N] [--max-iterations=N] [--time-limit=SECONDS] [--cycle-limit=N] [--report]
+//                  [--telemetry=PATH] [--heatmap=PATH] [--trace=PATH] [--display-fps=N] [--share=NAME] [display library]
+//
+// The robot commands, the game and the display plugins are the same
+// as in the compiled programs, the prelude is included for them.
+
+#include <stdint.h>
+#include <inttypes.h>
+#include <stdio.h>
+#include <string.h>
+#include <sys/types.h>
+
+typedef uint8_t slabes_type_unsigned_tiny;
+typedef uint8_t slabes_type_unsigned_small;
+
+#include "../slabes_prelude.h"
+#include "../slabes_prelude.c"
+
+#define VM_MAGIC "SLBC"
+#define VM_VERSION 1
+
+#define VM_TYPE_SHIFT 8
+#define VM_NO_FUNCTION -1
+
+#define VM_MAX_CALL_DEPTH (1 << 20)
+
+// Keep in sync with Op in bytecode.py
+typedef enum {
+    OP_CONST,
+    OP_MOVE,
+    OP_GET_GLOBAL,
+    OP_SET_GLOBAL,
+    OP_CLAMP,
+    OP_WRAP,
+    OP_ADD,
+    OP_SUB,
+    OP_MUL,
+    OP_DIV,
+    OP_EQ,
+    OP_NE,
+    OP_LE,
+    OP_GE,
+    OP_JUMP,
+    OP_JUMP_IF,
+    OP_JUMP_IF_NOT,
+    OP_CALL,
+    OP_RET,
+    OP_MATRIX_INIT,
+    OP_MATRIX_INDEX,
+    OP_MATRIX_GET,
+    OP_MATRIX_SET,
+    OP_MATRIX_FREE,
+    OP_PRINT,
+    OP_PRINT_MATRIX,
+    OP_PRINT_END,
+    OP_ASSERT,
+    OP_ROBOT,
+    OP_COUNT,
+} Opcode;
+
+// Keep in sync with Robot in bytecode.py
+typedef enum {
+    ROBOT_GO,
+    ROBOT_RL,
+    ROBOT_RR,
+    ROBOT_SONAR,
+    ROBOT_COMPASS,
+    ROBOT_GENERATE_MAZE,
+    ROBOT_COUNT,
+} RobotCommand;
+
+typedef enum {
+    ARG_NONE,
+    ARG_VALUE,
+    ARG_REG,
+    ARG_GLOBAL,
+    ARG_JUMP,
+    ARG_FUNCTION,
+    ARG_STRING,
+    ARG_ROBOT,
+} ArgKind;
+
+typedef struct {
+    ArgKind a, b, c;
+    bool typed;
+} OpInfo;
+
+static const OpInfo OP_INFO[OP_COUNT] = {
+    [OP_CONST] = {ARG_REG, ARG_VALUE, ARG_NONE, false},
+    [OP_MOVE] = {ARG_REG, ARG_REG, ARG_NONE, false},
+    [OP_GET_GLOBAL] = {ARG_REG, ARG_GLOBAL, ARG_NONE, false},
+    [OP_SET_GLOBAL] = {ARG_GLOBAL, ARG_REG, ARG_NONE, false},
+    [OP_CLAMP] = {ARG_REG, ARG_REG, ARG_NONE, true},
+    [OP_WRAP] = {ARG_REG, ARG_REG, ARG_NONE, true},
+    [OP_ADD] = {ARG_REG, ARG_REG, ARG_REG, true},
+    [OP_SUB] = {ARG_REG, ARG_REG, ARG_REG, true},
+    [OP_MUL] = {ARG_REG, ARG_REG, ARG_REG, true},
+    [OP_DIV] = {ARG_REG, ARG_REG, ARG_REG, true},
+    [OP_EQ] = {ARG_REG, ARG_REG, ARG_REG, false},
+    [OP_NE] = {ARG_REG, ARG_REG, ARG_REG, false},
+    [OP_LE] = {ARG_REG, ARG_REG, ARG_REG, false},
+    [OP_GE] = {ARG_REG, ARG_REG, ARG_REG, false},
+    [OP_JUMP] = {ARG_JUMP, ARG_NONE, ARG_NONE, false},
+    [OP_JUMP_IF] = {ARG_REG, ARG_JUMP, ARG_NONE, false},
+    [OP_JUMP_IF_NOT] = {ARG_REG, ARG_JUMP, ARG_NONE, false},
+    [OP_CALL] = {ARG_REG, ARG_FUNCTION, ARG_REG, false},
+    [OP_RET] = {ARG_REG, ARG_NONE, ARG_NONE, false},
+    [OP_MATRIX_INIT] = {ARG_REG, ARG_VALUE, ARG_VALUE, true},
+    [OP_MATRIX_INDEX] = {ARG_REG, ARG_REG, ARG_REG, true},
+    [OP_MATRIX_GET] = {ARG_REG, ARG_REG, ARG_REG, false},
+    [OP_MATRIX_SET] = {ARG_REG, ARG_REG, ARG_REG, false},
+    [OP_MATRIX_FREE] = {ARG_REG, ARG_NONE, ARG_NONE, false},
+    [OP_PRINT] = {ARG_REG, ARG_NONE, ARG_NONE, true},
+    [OP_PRINT_MATRIX] = {ARG_REG, ARG_NONE, ARG_NONE, false},
+    [OP_PRINT_END] = {ARG_NONE, ARG_NONE, ARG_NONE, false},
+    [OP_ASSERT] = {ARG_REG, ARG_STRING, ARG_NONE, false},
+    [OP_ROBOT] = {ARG_REG, ARG_ROBOT, ARG_NONE, false},
+};
+
+typedef struct {
+    uint16_t op;
+    uint16_t type;
+    int32_t a, b, c;
+} Instruction;
+
+typedef struct {
+    int32_t min, max;
+    int32_t bits;
+    int32_t is_signed;
+} IntRange;
+
+typedef struct {
+    uint32_t arg_count;
+    uint32_t register_count;
+    uint32_t start;
+    uint32_t length;
+} FunctionInfo;
+
+typedef struct {
+    uint32_t type_count;
+    IntRange *types;
+
+    uint32_t global_count;
+
+    uint32_t string_count;
+    char **strings;
+
+    uint32_t function_count;
+    FunctionInfo *functions;
+
+    int32_t init;
+    int32_t main;
+
+    uint32_t code_count;
+    Instruction *code;
+} Program;
+
+typedef struct {
+    const uint8_t *data;
+    size_t size;
+    size_t position;
+    bool failed;
+} Reader;
+
+static uint32_t read_u32(Reader *reader) {
+    if (reader->size - reader->position < 4) {
+        reader->failed = true;
+        return 0;
+    }
+    const uint8_t *p = reader->data + reader->position;
+    reader->position += 4;
+    return (uint32_t)p[0] | (uint32_t)p[1] << 8 | (uint32_t)p[2] << 16 | (uint32_t)p[3] << 24;
+}
+
+static int32_t read_i32(Reader *reader) {
+    return (int32_t)read_u32(reader);
+}
+
+// counts come from the file, check them before allocating
+static void *read_array(Reader *reader, uint32_t count, size_t item_size, size_t min_file_size) {
+    if (reader->failed || count > (reader->size - reader->position) / min_file_size) {
+        reader->failed = true;
+        return NULL;
+    }
+    void *p = SLABES_MALLOC(item_size * (count ? count : 1));
+    memset(p, 0, item_size * count);
+    return p;
+}
+
+static bool check_operand(Program *program, FunctionInfo *function, ArgKind kind, int32_t value) {
+    switch (kind) {
+        case ARG_NONE:
+        case ARG_VALUE: return true;
+        case ARG_REG: return value >= 0 && (uint32_t)value < function->register_count;
+        case ARG_GLOBAL: return value >= 0 && (uint32_t)value < program->global_count;
+        case ARG_JUMP: return value >= 0 && (uint32_t)value < function->length;
+        case ARG_FUNCTION: return value >= 0 && (uint32_t)value < program->function_count;
+        case ARG_STRING: return value >= 0 && (uint32_t)value < program->string_count;
+        case ARG_ROBOT: return value >= 0 && value < ROBOT_COUNT;
+    }
+    return false;
+}
+
+static bool check_function(Program *program, uint32_t index) {
+    FunctionInfo *function = &program->functions[index];
+    if (function->start > program->code_count || function->length > program->code_count - function->start) {
+        return false;
+    }
+    if (function->arg_count > function->register_count || function->length == 0) {
+        return false;
+    }
+
+    for (uint32_t i = 0; i < function->length; ++i) {
+        Instruction *it = &program->code[function->start + i];
+        if (it->op >= OP_COUNT) return false;
+
+        const OpInfo *info = &OP_INFO[it->op];
+        if (info->typed && it->type >= program->type_count) return false;
+        if (!check_operand(program, function, info->a, it->a)) return false;
+        if (!check_operand(program, function, info->b, it->b)) return false;
+        if (!check_operand(program, function, info->c, it->c)) return false;
+
+        if (it->op == OP_CALL) {
+            FunctionInfo *callee = &program->functions[it->b];
+            if (callee->arg_count > function->register_count - it->c) return false;
+        }
+        if (it->op == OP_MATRIX_INIT && (it->c <= 0 || it->c > INT16_MAX)) return false;
+    }
+
+    // the execution cannot run past the end of the function
+    Opcode last = program->code[function->start + function->length - 1].op;
+    return last == OP_RET || last == OP_JUMP;
+}
+
+static bool check_entry(Program *program, int32_t index) {
+    return index == VM_NO_FUNCTION || (index >= 0 && (uint32_t)index < program->function_count);
+}
+
+static bool parse_program(Program *program, Reader *reader) {
+    if (reader->size < 4 || memcmp(reader->data, VM_MAGIC, 4) != 0) {
+        return false;
+    }
+    reader->position = 4;
+    if (read_u32(reader) != VM_VERSION) {
+        return false;
+    }
+
+    program->type_count = read_u32(reader);
+    program->types = read_array(reader, program->type_count, sizeof(IntRange), 16);
+    if (reader->failed) return false;
+    for (uint32_t i = 0; i < program->type_count; ++i) {
+        IntRange *type = &program->types[i];
+        type->min = read_i32(reader);
+        type->max = read_i32(reader);
+        type->bits = read_i32(reader);
+        type->is_signed = read_i32(reader);
+        if (type->bits <= 0 || type->bits > 16 || type->min > type->max) return false;
+    }
+
+    program->global_count = read_u32(reader);
+
+    program->string_count = read_u32(reader);
+    program->strings = read_array(reader, program->string_count, sizeof(char *), 4);
+    if (reader->failed) return false;
+    for (uint32_t i = 0; i < program->string_count; ++i) {
+        uint32_t length = read_u32(reader);
+        if (reader->failed || length > reader->size - reader->position) return false;
+        program->strings[i] = SLABES_MALLOC(length + 1);
+        memcpy(program->strings[i], reader->data + reader->position, length);
+        program->strings[i][length] = '\0';
+        reader->position += length;
+    }
+
+    program->function_count = read_u32(reader);
+    program->functions = read_array(reader, program->function_count, sizeof(FunctionInfo), 16);
+    if (reader->failed) return false;
+    for (uint32_t i = 0; i < program->function_count; ++i) {
+        FunctionInfo *function = &program->functions[i];
+        function->arg_count = read_u32(reader);
+        function->register_count = read_u32(reader);
+        function->start = read_u32(reader);
+        function->length = read_u32(reader);
+    }
+
+    program->init = read_i32(reader);
+    program->main = read_i32(reader);
+
+    program->code_count = read_u32(reader);
+    program->code = read_array(reader, program->code_count, sizeof(Instruction), 16);
+    if (reader->failed) return false;
+    for (uint32_t i = 0; i < program->code_count; ++i) {
+        uint32_t word = read_u32(reader);
+        program->code[i].op = word & ((1 << VM_TYPE_SHIFT) - 1);
+        program->code[i].type = word >> VM_TYPE_SHIFT;
+        program->code[i].a = read_i32(reader);
+        program->code[i].b = read_i32(reader);
+        program->code[i].c = read_i32(reader);
+    }
+    if (reader->failed) return false;
+
+    if (!check_entry(program, program->init) || !check_entry(program, program->main)) {
+        return false;
+    }
+    for (uint32_t i = 0; i < program->function_count; ++i) {
+        if (!check_function(program, i)) return false;
+    }
+    return true;
+}
+
+bool load_program(Program *program, const char *path) {
+    memset(program, 0, sizeof(Program));
+
+    FILE *file = fopen(path, "rb");
+    if (!file) {
+        printf("Failed to open %s\n", path);
+        return false;
+    }
+    fseek(file, 0, SEEK_END);
+    long size = ftell(file);
+    fseek(file, 0, SEEK_SET);
+
+    uint8_t *data = SLABES_MALLOC(size > 0 ? size : 1);
+    bool read = size >= 0 && fread(data, 1, size, file) == (size_t)size;
+    fclose(file);
+
+    Reader reader = {data, read ? size : 0, 0, false};
+    bool ok = read && parse_program(program, &reader);
+    SLABES_FREE(data);
+
+    if (!ok) {
+        printf("%s is not a valid slabes bytecode file (version %d)\n", path, VM_VERSION);
+    }
+    return ok;
+}
+
+void free_program(Program *program) {
+    for (uint32_t i = 0; i < program->string_count; ++i) {
+        if (program->strings) SLABES_FREE(program->strings[i]);
+    }
+    SLABES_FREE(program->strings);
+    SLABES_FREE(program->types);
+    SLABES_FREE(program->functions);
+    SLABES_FREE(program->code);
+}
+
+typedef struct {
+    int32_t *items;  // NULL after it's freed
+    int32_t side;
+} Matrix;
+
+typedef struct {
+    uint32_t function;
+    uint32_t pc;
+    size_t base;
+    int32_t result;  // register of the caller
+} Frame;
+
+typedef struct {
+    Program *program;
+    SlabesContext *context;  // the game the robot commands act on
+
+    int32_t *globals;
+
+    int32_t *registers;
+    size_t register_capacity;
+
+    Frame *frames;
+    size_t frame_count;
+    size_t frame_capacity;
+
+    // matrix handles are indices into this table shifted by one, 0 is null
+    Matrix *matrices;
+    size_t matrix_count;
+    size_t matrix_capacity;
+    int32_t *free_handles;
+    size_t free_handle_count;
+    size_t free_handle_capacity;
+} Vm;
+
+static void *grow(void *array, size_t *capacity, size_t needed, size_t item_size) {
+    if (needed <= *capacity) return array;
+    size_t new_capacity = *capacity ? *capacity : 64;
+    while (new_capacity < needed) new_capacity *= 2;
+    void *p = realloc(array, new_capacity * item_size);
+    if (p == NULL) {
+        printf("Out of memory.\n");
+        exit(EXIT_FAILURE);
+    }
+    *capacity = new_capacity;
+    return p;
+}
+
+static void vm_fatal(Vm *vm, const char *message) {
+    printf("Runtime error: %s\n", message);
+    exit(EXIT_FAILURE);
+}
+
+void vm_construct(Vm *vm, Program *program, SlabesContext *context) {
+    memset(vm, 0, sizeof(Vm));
+    vm->program = program;
+    vm->context = context;
+    vm->globals = SLABES_MALLOC(sizeof(int32_t) * (program->global_count ? program->global_count : 1));
+    memset(vm->globals, 0, sizeof(int32_t) * program->global_count);
+}
+
+void vm_destruct(Vm *vm) {
+    for (size_t i = 0; i < vm->matrix_count; ++i) {
+        SLABES_FREE(vm->matrices[i].items);
+    }
+    SLABES_FREE(vm->matrices);
+    SLABES_FREE(vm->free_handles);
+    SLABES_FREE(vm->frames);
+    SLABES_FREE(vm->registers);
+    SLABES_FREE(vm->globals);
+}
+
+static Matrix *vm_matrix(Vm *vm, int32_t handle) {
+    if (handle <= 0 || (size_t)handle > vm->matrix_count || vm->matrices[handle - 1].items == NULL) {
+        vm_fatal(vm, "use of a matrix that is not initialized or already freed");
+    }
+    return &vm->matrices[handle - 1];
+}
+
+static int32_t vm_matrix_init(Vm *vm, int32_t handle, int32_t value, int32_t side) {
+    Matrix *matrix;
+    if (handle == 0) {
+        if (vm->free_handle_count) {
+            handle = vm->free_handles[--vm->free_handle_count];
+        } else {
+            vm->matrices = grow(vm->matrices, &vm->matrix_capacity, vm->matrix_count + 1, sizeof(Matrix));
+            handle = ++vm->matrix_count;
+        }
+        matrix = &vm->matrices[handle - 1];
+        matrix->items = SLABES_MALLOC(sizeof(int32_t) * side * side);
+        matrix->side = side;
+    } else {
+        // the memory is reused, so every alias of the matrix sees the new values
+        matrix = vm_matrix(vm, handle);
+        if (matrix->side != side) {
+            SLABES_FREE(matrix->items);
+            matrix->items = SLABES_MALLOC(sizeof(int32_t) * side * side);
+            matrix->side = side;
+        }
+    }
+    for (int32_t i = 0; i < side * side; ++i) {
+        matrix->items[i] = value;
+    }
+    return handle;
+}
+
+static void vm_matrix_free(Vm *vm, int32_t handle) {
+    if (handle == 0) return;
+    Matrix *matrix = vm_matrix(vm, handle);
+    SLABES_FREE(matrix->items);
+    matrix->items = NULL;
+    vm->free_handles = grow(vm->free_handles, &vm->free_handle_capacity, vm->free_handle_count + 1, sizeof(int32_t));
+    vm->free_handles[vm->free_handle_count++] = handle;
+}
+
+static int32_t *vm_element(Vm *vm, int32_t handle, int32_t index) {
+    Matrix *matrix = vm_matrix(vm, handle);
+    if (index < 0 || index >= matrix->side * matrix->side) {
+        vm_fatal(vm, "matrix index out of range");
+    }
+    return &matrix->items[index];
+}
+
+static inline int32_t clamp(IntRange *type, int64_t value) {
+    if (value < type->min) return type->min;
+    if (value > type->max) return type->max;
+    return (int32_t)value;
+}
+
+// implicit c conversion to the storage type
+static inline int32_t wrap(IntRange *type, int32_t value) {
+    uint32_t mask = ((uint32_t)1 << type->bits) - 1;
+    uint32_t bits = (uint32_t)value & mask;
+    if (type->is_signed && bits >= (uint32_t)1 << (type->bits - 1)) {
+        return (int32_t)bits - ((int32_t)1 << type->bits);
+    }
+    return (int32_t)bits;
+}
+
+static int32_t robot(SlabesContext *context, RobotCommand command) {
+    switch (command) {
+        case ROBOT_GO: return slabes_func___robot_command_go(context);
+        case ROBOT_RL: return slabes_func___robot_command_rl(context);
+        case ROBOT_RR: return slabes_func___robot_command_rr(context);
+        case ROBOT_SONAR: return slabes_func___robot_command_sonar(context);
+        case ROBOT_COMPASS: return slabes_func___robot_command_compass(context);
+        case ROBOT_GENERATE_MAZE: return slabes_func___generate_maze(context);
+        default: return 0;
+    }
+}
+
+// push the frame of the function, its registers start after the ones of the caller
+static void vm_enter(Vm *vm, uint32_t index, size_t base, int32_t result) {
+    FunctionInfo *function = &vm->program->functions[index];
+
+    if (vm->frame_count >= VM_MAX_CALL_DEPTH) {
+        vm_fatal(vm, "maximum recursion depth exceeded");
+    }
+    vm->frames = grow(vm->frames, &vm->frame_capacity, vm->frame_count + 1, sizeof(Frame));
+    vm->frames[vm->frame_count++] = (Frame){index, 0, base, result};
+
+    vm->registers = grow(vm->registers, &vm->register_capacity, base + function->register_count, sizeof(int32_t));
+    memset(vm->registers + base + function->arg_count, 0, sizeof(int32_t) * (function->register_count - function->arg_count));
+}
+
+int32_t vm_run(Vm *vm, uint32_t index) {
+    Program *program = vm->program;
+    size_t entry_depth = vm->frame_count;
+
+    size_t base = 0;
+    if (entry_depth) {
+        Frame *caller = &vm->frames[entry_depth - 1];
+        base = caller->base + program->functions[caller->function].register_count;
+    }
+    vm_enter(vm, index, base, 0);
+
+    Frame *frame = &vm->frames[vm->frame_count - 1];
+    Instruction *code = program->code + program->functions[frame->function].start;
+    int32_t *regs = vm->registers + frame->base;
+    uint32_t pc = 0;
+
+    for (;;) {
+        Instruction *it = &code[pc++];
+        IntRange *type = &program->types[it->type];
+
+        switch ((Opcode)it->op) {
+            case OP_CONST: regs[it->a] = it->b; break;
+            case OP_MOVE: regs[it->a] = regs[it->b]; break;
+            case OP_GET_GLOBAL: regs[it->a] = vm->globals[it->b]; break;
+            case OP_SET_GLOBAL: vm->globals[it->a] = regs[it->b]; break;
+            case OP_CLAMP: regs[it->a] = clamp(type, regs[it->b]); break;
+            case OP_WRAP: regs[it->a] = wrap(type, regs[it->b]); break;
+
+            case OP_ADD: regs[it->a] = clamp(type, (int64_t)regs[it->b] + regs[it->c]); break;
+            case OP_SUB: regs[it->a] = clamp(type, (int64_t)regs[it->b] - regs[it->c]); break;
+            case OP_MUL: regs[it->a] = clamp(type, (int64_t)regs[it->b] * regs[it->c]); break;
+            case OP_DIV: {
+                int32_t lhs = regs[it->b], rhs = regs[it->c];
+                if (rhs == 0) {
+                    regs[it->a] = lhs >= 0 ? type->max : type->min;
+                } else {
+                    regs[it->a] = wrap(type, lhs / rhs);
+                }
+                break;
+            }
+
+            case OP_EQ: regs[it->a] = regs[it->b] == regs[it->c]; break;
+            case OP_NE: regs[it->a] = regs[it->b] != regs[it->c]; break;
+            case OP_LE: regs[it->a] = regs[it->b] <= regs[it->c]; break;
+            case OP_GE: regs[it->a] = regs[it->b] >= regs[it->c]; break;
+
+            case OP_JUMP: SLABES_LOOP_TICK(vm->context); pc = it->a; break;  // only loops jump back unconditionally
+            case OP_JUMP_IF: if (regs[it->a]) pc = it->b; break;
+            case OP_JUMP_IF_NOT: if (!regs[it->a]) pc = it->b; break;
+
+            case OP_CALL: {
+                FunctionInfo *current = &program->functions[frame->function];
+                FunctionInfo *callee = &program->functions[it->b];
+                size_t args = frame->base + it->c;
+                size_t base = frame->base + current->register_count;
+                frame->pc = pc;
+
+                // both arrays may move
+                vm_enter(vm, it->b, base, it->a);
+                memcpy(vm->registers + base, vm->registers + args, sizeof(int32_t) * callee->arg_count);
+
+                frame = &vm->frames[vm->frame_count - 1];
+                code = program->code + callee->start;
+                regs = vm->registers + frame->base;
+                pc = 0;
+                break;
+            }
+            case OP_RET: {
+                int32_t value = regs[it->a];
+                int32_t result = frame->result;
+                if (--vm->frame_count == entry_depth) {
+                    return value;
+                }
+
+                frame = &vm->frames[vm->frame_count - 1];
+                code = program->code + program->functions[frame->function].start;
+                regs = vm->registers + frame->base;
+                pc = frame->pc;
+                regs[result] = value;
+                break;
+            }
+
+            case OP_MATRIX_INIT: regs[it->a] = vm_matrix_init(vm, regs[it->a], it->b, it->c); break;
+            case OP_MATRIX_INDEX: regs[it->a] = regs[it->b] + regs[it->c] * type->max; break;
+            case OP_MATRIX_GET: regs[it->a] = *vm_element(vm, regs[it->b], regs[it->c]); break;
+            case OP_MATRIX_SET: *vm_element(vm, regs[it->a], regs[it->b]) = regs[it->c]; break;
+            case OP_MATRIX_FREE: vm_matrix_free(vm, regs[it->a]); break;
+
+            case OP_PRINT: printf("%" PRId32 " ", wrap(type, regs[it->a])); break;
+            case OP_PRINT_MATRIX: {
+                int32_t handle = regs[it->a];
+                printf("%p ", handle ? (void *)vm_matrix(vm, handle)->items : NULL);
+                break;
+            }
+            case OP_PRINT_END: printf("\n"); break;
+
+            case OP_ASSERT: slabes_assert(regs[it->a] != 0, program->strings[it->b]); break;
+            case OP_ROBOT: regs[it->a] = robot(vm->context, it->b); break;
+
+            default: vm_fatal(vm, "unknown opcode");
+        }
+    }
+}
+
+static void vm_run_main(SlabesContext *context, void *data) {
+    Vm *vm = data;
+    vm_run(vm, vm->program->main);
+}
+
+int main(int argc, char *argv[]) {
+    SlabesArgs args;
+    if (argc < 2 || !slabes_parse_args(argc - 2, argv + 2, &args)) {
+        printf("usage: %s program.sbc [--clock=real|virtual|xN] [--size=N|WxH] [--maze=NAME] [--seed=N] [--maze-file=PATH] [--max-robot-ops=N] [--max-iterations=N] [--time-limit=SECONDS] [--cycle-limit=N] [--report] [--telemetry=PATH] [--heatmap=PATH] [--trace=PATH] [--display-fps=N] [--share=NAME] [display library]\n", argv[0]);
+        return EXIT_FAILURE;
+    }
+
+    if (args.games) {
+        printf("The vm runs one game, compile the program to run many with --games\n");
+        return EXIT_FAILURE;
+    }
+
+    Program program;
+    if (!load_program(&program, argv[1])) {
+        free_program(&program);
+        return EXIT_FAILURE;
+    }
+    if (program.main == VM_NO_FUNCTION) {
+        printf("%s: no 'main' function to run\n", argv[1]);
+        free_program(&program);
+        return EXIT_FAILURE;
+    }
+
+    SlabesContext context = {.clock = args.clock, .budget = args.budget};
+    if (!game_setup(&context.game, args.libname, &args.game)) {
+        free_program(&program);
+        return EXIT_FAILURE;
+    }
+
+    Vm vm;
+    vm_construct(&vm, &program, &context);
+    if (program.init != VM_NO_FUNCTION) {
+        // the initializers of the globals run outside of slabes_run, without the budget
+        context.robot_op_check = context.iteration_check = UINT64_MAX;
+        vm_run(&vm, program.init);
+    }
+
+    printf("Starting...\n");
+
+    game_update_display(&context.game);
+    ROBOT_OP_DELAY(&context);
+    SlabesStopReason reason = slabes_run(&context, vm_run_main, &vm);
+    game_update_display(&context.game);
+
+    printf("Finishing...\n");
+    slabes_report_clock(&context.clock);
+    if (args.report || reason != SlabesCompleted) {
+        slabes_report_result(&context);
+    }
+    bool saved = slabes_save_telemetry(&context, &args);
+
+    vm_destruct(&vm);
+    free_program(&program);
+    game_cleanup(&context.game);
+    if (!saved) {
+        return EXIT_FAILURE;
+    }
+    return (reason == SlabesCompleted)? 0 : SLABES_EXIT_BUDGET;
+}
@@ -1,18 +1,24 @@
+from __future__ import annotations
+
 import sys
 import argparse
+import importlib
 import subprocess
 import platform
 
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from .slabes_parser import parse
+from .slabes_parser import SlabesParser
+from .parser_base import parse_cls_with_parser
 from .name_table import NameTable, fill_name_table_from_ast
 from .eval import Ast2Eval
 from . import eval as ev
-from .codegen import GenerateC
+from .codegen import GenerateC, get_prelude
 from . import ast_nodes as ast
 from . import errors
+from .cache import BuildCache, DEFAULT_CACHE_SIZE, default_cache_dir, compiler_version, compiler_sources_hash, make_key, use_tables_cache
+from .timing import TimeReport, count_nodes, write_chrome_trace
 
 
 IS_ANDROID = "android" in platform.platform().lower()
@@ -34,6 +40,50 @@ class Config:
 
     max_cc_errors: int = 3
     cc: str = "clang"
+    defines: tuple[str, ...] = ()  # passed as -D to the c compiler
+
+    cache_dir: Path | None = None  # None disables the build cache
+    cache_size: int = DEFAULT_CACHE_SIZE
+
+    precompiled_prelude: bool = False  # requires the build cache
+    prelude_object: Path | None = None
+
+    stats: bool = False
+
+    timing: TimeReport = field(default_factory=TimeReport)
+    trace_path: Path | None = None  # chrome trace of the timing
+
+
+def add_build_arguments(argparser: argparse.ArgumentParser) -> None:
+    argparser.add_argument("--no-cache", action="store_true", help="Do not use the build cache")
+    argparser.add_argument("--cache-dir", default=None, help=f"Build cache directory (default: {default_cache_dir()})")
+    argparser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024), help="Maximum size of the build cache in megabytes")
+    argparser.add_argument("--stats", action="store_true", help="Print the size of the generated c code with and without unused prelude parts")
+    argparser.add_argument("--prelude", choices=["precompiled", "inline"], default="precompiled", help="Link against the runtime prelude compiled once (requires the build cache) or compile it with every program")
+    argparser.add_argument("--time-report", action="store_true", help="Print the time of every phase and the sizes of the intermediate results")
+    argparser.add_argument("--trace-memory", action="store_true", help="Also measure the peak memory of every phase for --time-report and --trace, which makes the phases slower")
+    argparser.add_argument("--trace", default=None, help="Write the time report as a chrome trace (chrome://tracing, ui.perfetto.dev) to this file")
+    argparser.add_argument("-D", dest="defines", action="append", default=[], metavar="NAME[=VALUE]", help="Define a macro for the c compiler, e.g. -D NO_DELAY_ON_ROBOT_OP")
+
+
+def make_config(args: argparse.Namespace, input_file: str, text: str, c_file: Path, bin_file: Path) -> Config:
+    if args.no_cache:
+        cache_dir = None
+    elif args.cache_dir is not None:
+        cache_dir = Path(args.cache_dir)
+    else:
+        cache_dir = default_cache_dir()
+    use_tables_cache(cache_dir)  # the prelude and the lexer are made once per process, before the program
+
+    return Config(
+        input_file, bin_file, c_file, text,
+        cache_dir=cache_dir, cache_size=args.cache_size * 1024 * 1024,
+        precompiled_prelude=cache_dir is not None and args.prelude == "precompiled",
+        stats=args.stats,
+        defines=tuple(args.defines),
+        timing=TimeReport(enabled=args.time_report or args.trace is not None, trace_memory=args.trace_memory),
+        trace_path=None if args.trace is None else Path(args.trace),
+    )
 
 
 def parse_args(argv: list[str] = sys.argv) -> Config:
@@ -41,6 +91,7 @@ def parse_args(argv: list[str] = sys.argv) -> Config:
     argparser.add_argument("filename", help="Input file ('-' to use stdin)")
     argparser.add_argument("-c", nargs="?", default=None, help="Output c file")
     argparser.add_argument("-o", "--output", nargs="?", default=None, help="Output binary file")
+    add_build_arguments(argparser)
 
     args = argparser.parse_args(argv[1:])
 
@@ -61,17 +112,62 @@ def parse_args(argv: list[str] = sys.argv) -> Config:
     else:
         bin_file = Path(input_file).with_suffix(".out")
 
-    return Config(
-        input_file, bin_file, c_file, text, 
+    return make_config(args, input_file, text, c_file, bin_file)
+
+
+def build_key(conf: Config) -> str:
+    return make_key(
+        conf.in_path,
+        conf.source,
+        conf.cc,
+        compiler_version(conf.cc),
+        conf.optimize,
+        conf.debug,
+        conf.memcheck,
+        conf.defines,
+        conf.precompiled_prelude,
+        IS_ANDROID,
+        platform.system(),
+        compiler_sources_hash(),
     )
 
 
-def run_cc(c_code: str, conf: Config) -> int:
-    args = [conf.cc, "-x", "c", "-"]
-    args += ["-o", str(conf.bin_path), "-std=c11"]
+def prelude_key(conf: Config) -> str:
+    return make_key(
+        "prelude",
+        get_prelude().header,
+        get_prelude().source,
+        conf.cc,
+        compiler_version(conf.cc),
+        conf.optimize,
+        conf.debug,
+        conf.memcheck,
+        conf.defines,
+        IS_ANDROID,
+        platform.system(),
+        compiler_sources_hash(),
+    )
+
+
+def vm_key(conf: Config) -> str:
+    return make_key(
+        "vm",
+        conf.cc,
+        compiler_version(conf.cc),
+        conf.optimize,
+        conf.debug,
+        conf.memcheck,
+        conf.defines,
+        IS_ANDROID,
+        platform.system(),
+        compiler_sources_hash(),
+    )
+
+
+def cc_flags(conf: Config) -> list[str]:
+    args = ["-std=c11"]
     args += [f"-O{conf.optimize}"]
     args += ["-I", str(DIR)]
-    args += ["-l", "ltdl"]
     # args += ["-Wall", "-Wextra", "-Werror", "-pedantic"]
 
     if conf.cc.startswith("clang"):
@@ -79,6 +175,9 @@ def run_cc(c_code: str, conf: Config) -> int:
     else:
         args.append(f"-fmax-errors={conf.max_cc_errors}")
 
+    for define in conf.defines:
+        args.append("-D" + define)
+
     if conf.debug:
         args.append("-g")
     if conf.memcheck:
@@ -89,6 +188,55 @@ def run_cc(c_code: str, conf: Config) -> int:
                 sanitize += ",vptr"
         args.append(sanitize)
 
+    return args
+
+
+def build_prelude(conf: Config, cache: BuildCache) -> Path | None:
+    def compile(path: Path) -> bool:
+        args = [conf.cc, "-c", "-x", "c", "-", "-o", str(path)]
+        args += cc_flags(conf)
+
+        print(" ".join(args))
+        prelude = get_prelude()
+        result = subprocess.run(args, input=prelude.header + "\n" + prelude.source, capture_output=True, encoding="utf-8")
+        if result.returncode:
+            print(result.stderr)
+        return result.returncode == 0
+
+    return cache.produce(prelude_key(conf), ".o", compile)
+
+
+def compile_vm(conf: Config, path: Path) -> bool:
+    args = [conf.cc, str(DIR / "libslabes" / "slabes_vm.c"), "-o", str(path)]
+    args += cc_flags(conf)
+    args += ["-l", "ltdl", "-pthread"]
+
+    print(" ".join(args))
+    result = subprocess.run(args, capture_output=True, encoding="utf-8")
+    if result.returncode:
+        print(result.stderr)
+    return result.returncode == 0
+
+
+def build_vm(conf: Config, cache: BuildCache) -> Path | None:
+    """The bytecode interpreter, compiled once per compiler and flags"""
+
+    return cache.produce(vm_key(conf), ".out", lambda path: compile_vm(conf, path))
+
+
+def cc_command(conf: Config) -> list[str]:
+    args = [conf.cc, "-x", "c", "-"]
+    if conf.prelude_object is not None:
+        args += ["-x", "none", str(conf.prelude_object)]
+    args += ["-o", str(conf.bin_path)]
+    args += cc_flags(conf)
+    args += ["-l", "ltdl", "-pthread"]
+    return args
+
+
+def run_cc(c_code: str, conf: Config) -> int:
+    args = cc_command(conf)
+
     print(" ".join(args))
     result = subprocess.run(args, input=c_code, capture_output=True, encoding="utf-8")
     if result.returncode:
@@ -96,23 +244,123 @@ def run_cc(c_code: str, conf: Config) -> int:
     return result.returncode
 
 
-def main(argv: list[str] = sys.argv) -> None:
-    conf = parse_args(argv)
+def front_end(conf: Config) -> ev.Module:
+    timing = conf.timing
 
-    tree = parse(conf.source, conf.in_path)
+    with timing.phase("parse"):
+        parser, tree = parse_cls_with_parser(SlabesParser, conf.source, conf.in_path)
 
-    evalue = Ast2Eval().transform(conf.source, tree, conf.in_path)
-    assert isinstance(evalue, ev.Module), "got non-module evalue after ast transformation"
+    with timing.phase("transform"):
+        evalue = Ast2Eval().transform(conf.source, tree, conf.in_path)
+        assert isinstance(evalue, ev.Module), "got non-module evalue after ast transformation"
 
-    errors.report_collected()
+        errors.report_collected()
 
-    evalue.evaluate(ev.BUILTIN_CONTEXT)
+    with timing.phase("evaluate"):
+        evalue.evaluate(ev.BUILTIN_CONTEXT)
 
-    c_code = GenerateC().generate(conf.source, evalue, conf.in_path)
+    if timing.enabled:
+        timing.count("source bytes", len(conf.source.encode("utf-8")))
+        timing.count("tokens", len(parser._tokenizer._tokens))
+        timing.count("pegen memo entries", len(parser._cache))
+        timing.count("ast nodes", count_nodes(tree, ast.AST))
+        timing.count("eval nodes", count_nodes(evalue, ev.Eval))
 
     # print(ast.dump(tree, indent=4))
     # print(evalue)
 
+    return evalue
+
+
+def generate_c(conf: Config) -> str:
+    evalue = front_end(conf)
+
+    with conf.timing.phase("codegen"):
+        gen = GenerateC(precompiled_prelude=conf.precompiled_prelude)
+        c_code = gen.generate(conf.source, evalue, conf.in_path)
+    conf.timing.count("c bytes", len(c_code.encode("utf-8")))
+
+    if conf.stats:
+        print_size_stats(gen.render(), c_code)
+
+    return c_code
+
+
+def print_size_stats(full: str, used: str) -> None:
+    def size(code: str) -> str:
+        lines = code.count("\n")
+        return f"{len(code.encode('utf-8'))} bytes, {lines} lines"
+
+    print(f"c code with the full prelude: {size(full)}")
+    print(f"c code with the used prelude: {size(used)}", end="")
+    if full:
+        print(f" ({len(used) / len(full):.1%})")
+    else:
+        print()
+
+
+def compile_program(conf: Config) -> int:
+    timing = conf.timing
+
+    cache = None
+    if conf.cache_dir is not None:
+        cache = BuildCache(conf.cache_dir, conf.cache_size)
+        with timing.phase("cache lookup"):
+            key = build_key(conf)
+            hit = cache.load(key, {".c": conf.c_path, ".out": conf.bin_path})
+        if hit:
+            print(f"cached {conf.bin_path}")
+            if conf.stats:
+                generate_c(conf)  # prints them, the cached binary is kept
+            return 0
+
+        if conf.precompiled_prelude:
+            with timing.phase("prelude"):
+                conf.prelude_object = build_prelude(conf, cache)
+            if conf.prelude_object is None:
+                return 1
+
+    c_code = generate_c(conf)
     conf.c_path.write_text(c_code, "utf-8")
 
-    exit(run_cc(c_code, conf))
+    with timing.phase("cc"):
+        returncode = run_cc(c_code, conf)
+    if returncode == 0 and cache is not None:
+        cache.save(key, {".c": conf.c_path, ".out": conf.bin_path})
+
+    return returncode
+
+
+def report_timing(conf: Config) -> None:
+    if not conf.timing.enabled:
+        return
+
+    conf.timing.print()
+    if conf.trace_path is not None:
+        write_chrome_trace(conf.trace_path, {conf.in_path: conf.timing})
+        print(f"trace written to {conf.trace_path}")
+
+
+# slabes <command> ... -> module with main(argv)
+COMMANDS = {
+    "build": "build",
+    "serve": "server",
+    "client": "client",
+    "run": "run",
+    "maze": "maze",
+    "bench-run": "bench_run",
+}
+
+
+def main(argv: list[str] = sys.argv) -> None:
+    if len(argv) > 1 and argv[1] in COMMANDS:
+        module = importlib.import_module("." + COMMANDS[argv[1]], __package__)
+        module.main(argv[1:])
+        return
+
+    conf = parse_args(argv)
+    try:
+        returncode = compile_program(conf)
+    finally:
+        report_timing(conf)
+    exit(returncode)
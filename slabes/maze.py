@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import sys
+import struct
+import argparse
+
+from pathlib import Path
+
+from .game import FIELD_DEFAULT_SIDE, MAZE_GENERATORS, Cell, Direction, Field, Game, Rng
+
+
+# Maze files, see MazeFileHeader in libslabes/slabes.h.
+#
+# The binary format is the header followed by the walls and the cells of the
+# field, one byte per cell each, so the runtime maps it instead of parsing it.
+# The text format is for people, 'slabes maze convert' translates between them:
+#
+#   slabes maze
+#   size 3 7
+#   player 0 0 Up
+#   finish 2 6
+#   walls
+#   ff f3 ff
+#   ...            one line of hex wall bits per row, the first row is y = 0
+#   cells
+#   o..
+#   ...            '.' for empty cells, the rest as in Cell
+
+
+MAGIC = b"SLBMAZE\0"
+VERSION = 1
+HEADER = struct.Struct("<8sII6QII")
+
+TEXT_MAGIC = "slabes maze"
+TEXT_SUFFIX = ".txt"
+
+EMPTY_TEXT_CELL = "."
+
+DIRECTION_NAMES = {
+    Direction.UP_LEFT: "UpLeft",
+    Direction.UP: "Up",
+    Direction.UP_RIGHT: "UpRight",
+    Direction.DOWN_RIGHT: "DownRight",
+    Direction.DOWN: "Down",
+    Direction.DOWN_LEFT: "DownLeft",
+}  # direction_to_string
+
+DIRECTIONS_BY_NAME = {name: direction for direction, name in DIRECTION_NAMES.items()}
+
+
+class MazeFileError(Exception):
+    pass
+
+
+def to_binary(game: Game) -> bytes:
+    field = game.field
+    header = HEADER.pack(
+        MAGIC, VERSION, HEADER.size,
+        field.width, field.height,
+        *game.player_position, *game.finish_position,
+        int(game.player_direction), 0,
+    )
+    return header + bytes(field.walls) + "".join(field.cells).encode("ascii")
+
+
+def from_binary(data: bytes) -> Game:
+    """Same checks as maze_file_check"""
+
+    if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+        raise MazeFileError("not a binary maze file")
+    magic, version, header_size, width, height, player_x, player_y, finish_x, finish_y, direction, _ = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise MazeFileError("unsupported maze file version")
+    if header_size < HEADER.size or not Field.size_is_valid(width, height):
+        raise MazeFileError("corrupted header")
+    cell_count = width * height
+    if len(data) != header_size + 2 * cell_count:
+        raise MazeFileError("the file size doesn't match the field size")
+    if direction not in DIRECTION_NAMES:
+        raise MazeFileError("invalid player direction")
+
+    field = Field(width, height)
+    field.walls = list(data[header_size:header_size + cell_count])
+    field.cells = list(data[header_size + cell_count:].decode("ascii"))
+    return make_game(field, (player_x, player_y), Direction(direction), (finish_x, finish_y))
+
+
+def to_text(game: Game) -> str:
+    field = game.field
+    lines = [
+        TEXT_MAGIC,
+        f"size {field.width} {field.height}",
+        f"player {game.player_position[0]} {game.player_position[1]} {DIRECTION_NAMES[game.player_direction]}",
+        f"finish {game.finish_position[0]} {game.finish_position[1]}",
+        "walls",
+    ]
+    for y in range(field.height):
+        row = field.walls[field.index(0, y):field.index(0, y + 1)]
+        lines.append(" ".join(f"{walls:02x}" for walls in row))
+    lines.append("cells")
+    for y in range(field.height):
+        row = field.cells[field.index(0, y):field.index(0, y + 1)]
+        lines.append("".join(row).replace(Cell.EMPTY, EMPTY_TEXT_CELL))
+    return "\n".join(lines) + "\n"
+
+
+def from_text(text: str) -> Game:
+    lines = iter(enumerate(text.splitlines(), 1))
+
+    def next_line(expected: str) -> tuple[int, list[str]]:
+        for number, line in lines:
+            if line.strip() and not line.startswith("#"):
+                return number, line.split()
+        raise MazeFileError(f"unexpected end of file, expected {expected}")
+
+    def numbers(words: list[str], count: int, number: int) -> list[int]:
+        try:
+            values = [int(word) for word in words]
+        except ValueError:
+            values = []
+        if len(values) != count or min(values) < 0:
+            raise MazeFileError(f"line {number}: expected {count} non-negative integers")
+        return values
+
+    number, words = next_line("the header")
+    if " ".join(words) != TEXT_MAGIC:
+        raise MazeFileError("not a text maze file")
+
+    def keyword_line(keyword: str) -> tuple[int, list[str]]:
+        number, words = next_line(keyword)
+        if words[0] != keyword:
+            raise MazeFileError(f"line {number}: expected {keyword}")
+        return number, words[1:]
+
+    number, words = keyword_line("size")
+    width, height = numbers(words, 2, number)
+    if not Field.size_is_valid(width, height):
+        raise MazeFileError(f"line {number}: invalid field size")
+    number, words = keyword_line("player")
+    if len(words) != 3 or words[2] not in DIRECTIONS_BY_NAME:
+        raise MazeFileError(f"line {number}: expected 'player X Y DIRECTION'")
+    player = tuple(numbers(words[:2], 2, number))
+    direction = DIRECTIONS_BY_NAME[words[2]]
+    number, words = keyword_line("finish")
+    finish = tuple(numbers(words, 2, number))
+
+    field = Field(width, height)
+
+    if next_line("walls")[1] != ["walls"]:
+        raise MazeFileError("expected walls")
+    field.walls = []
+    for _ in range(height):
+        number, words = next_line("a row of walls")
+        try:
+            row = [int(word, 16) for word in words]
+        except ValueError:
+            row = []
+        if len(row) != width or max(row) > 0xFF:
+            raise MazeFileError(f"line {number}: expected {width} hex bytes")
+        field.walls.extend(row)
+
+    if next_line("cells")[1] != ["cells"]:
+        raise MazeFileError("expected cells")
+    field.cells = []
+    cells = {Cell.WALL, Cell.PLAYER, Cell.FINISH, EMPTY_TEXT_CELL}
+    for _ in range(height):
+        number, words = next_line("a row of cells")
+        row = "".join(words)
+        if len(row) != width or not set(row) <= cells:
+            raise MazeFileError(f"line {number}: expected {width} cells")
+        field.cells.extend(row.replace(EMPTY_TEXT_CELL, Cell.EMPTY))
+
+    return make_game(field, player, direction, finish)
+
+
+def make_game(field: Field, player: tuple[int, int], direction: Direction, finish: tuple[int, int]) -> Game:
+    if not (field.contains(*player) and field.contains(*finish)):
+        raise MazeFileError("the player or the finish is out of the field")
+    return Game(field, player, direction, finish, maze_loaded=True)
+
+
+def load(path: str | Path) -> Game:
+    """Either format, the binary one is recognized by the magic"""
+
+    data = Path(path).read_bytes()
+    if data.startswith(MAGIC):
+        return from_binary(data)
+    try:
+        return from_text(data.decode("utf-8"))
+    except UnicodeDecodeError:
+        raise MazeFileError("not a maze file") from None
+
+
+def save(game: Game, path: str | Path, text: bool | None = None) -> None:
+    """In the text format if text is set, or by default when the file name ends with .txt"""
+
+    path = Path(path)
+    if text is None:
+        text = path.suffix == TEXT_SUFFIX
+    if text:
+        path.write_text(to_text(game), "utf-8")
+    else:
+        path.write_bytes(to_binary(game))
+
+
+def main(argv: list[str] = sys.argv) -> None:
+    argparser = argparse.ArgumentParser(prog="slabes maze", description="Create and convert maze files for --maze-file")
+    subparsers = argparser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="Convert between the binary and the text formats")
+    convert.add_argument("input", help="Maze file in either format")
+    convert.add_argument("output", help=f"Maze file, in the text format if it ends with {TEXT_SUFFIX}")
+
+    generate = subparsers.add_parser("generate", help="Generate a maze like the runtime does and save it")
+    generate.add_argument("output", help=f"Maze file, in the text format if it ends with {TEXT_SUFFIX}")
+    generate.add_argument("--size", default=str(FIELD_DEFAULT_SIDE), metavar="N|WxH", help="Field size, as for the programs")
+    generate.add_argument("--maze", choices=MAZE_GENERATORS, default=MAZE_GENERATORS[0], help="Maze generator")
+    generate.add_argument("--seed", type=Rng.parse_seed, default=None, help="Seed of the maze generator, the same seed gives the same maze as --seed of the programs")
+
+    for subparser in (convert, generate):
+        subparser.add_argument("--text", action="store_true", default=None, help="Write the text format whatever the file name is")
+
+    args = argparser.parse_args(argv[1:])
+
+    try:
+        if args.command == "convert":
+            game = load(args.input)
+        else:
+            game = Game.setup(*Field.parse_size(args.size), args.seed, args.maze)
+            game.generate_maze()
+        save(game, args.output, args.text)
+    except (OSError, ValueError, MazeFileError) as e:
+        print(f"slabes maze: {e}", file=sys.stderr)
+        exit(1)
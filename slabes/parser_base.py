@@ -11,7 +11,7 @@ from . import errors
 from .pegen.parser import Parser, memoize
 from .pegen.tokenizer import Tokenizer
 from tokenize import TokenInfo
-from .lexer import lex, Keywords, _lexer
+from .lexer import lex, Keywords, get_lexer
 from .errors import report_fatal_at, report_at, report_collected
 from .location import Location
 
@@ -120,7 +120,7 @@ class ParserBase(Parser):
     ):
         loc = Location(self.filename, *start, *end)
         if line is None:
-            line = _lexer.lines[start[0] - 1]
+            line = get_lexer().lines[start[0] - 1]
         if fatal:
             report_fatal_at(loc, errors.SyntaxError, message, line)
         else:
@@ -506,6 +506,14 @@ class ParserBase(Parser):
 
 
 def parse_cls(cls: typing.Type[ParserBase], text: str, filename: str = "<unknown>") -> ast.Module:
+    return parse_cls_with_parser(cls, text, filename)[1]
+
+
+def parse_cls_with_parser(
+    cls: typing.Type[ParserBase], text: str, filename: str = "<unknown>"
+) -> tuple[ParserBase, ast.Module]:
+    """Same as parse_cls, but also returns the parser to inspect its caches"""
+
     parser, tree = cls.parse_text(text, filename)
 
     report_collected()
@@ -513,7 +521,7 @@ def parse_cls(cls: typing.Type[ParserBase], text: str, filename: str = "<unknown
         parser.report_syntax_error_at_last_token(filename, fatal=True)
         assert False, "unreachable"
 
-    return tree
+    return parser, tree
 
 
 def parser_main(parser_class: typing.Type[ParserBase]) -> None:
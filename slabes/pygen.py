@@ -0,0 +1,584 @@
+from __future__ import annotations
+
+import sys
+import time
+
+from enum import Enum
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+from typing import Callable
+
+from . import ast_nodes as ast
+from . import types as ts
+from . import errors
+from . import eval as ev
+from .errors import report_fatal_at
+from .game import Game, LEFT_ROTATED, RIGHT_ROTATED
+from .codegen import INT_TYPE_INFO, MAIN_FUNCTION, is_variable
+from .name_table import lookup_origin
+from .parser_base import DEFAULT_FILENAME
+
+
+# Python backend: the evaluated tree is turned into python source
+# that mirrors the generated c code name by name, and is run with exec.
+# Integers are plain python ints, they are kept in range exactly
+# where the c code clamps them (prelude functions) or truncates them
+# (implicit conversions to the c type), so both backends print the same.
+
+
+@dataclass(frozen=True)
+class IntRange:
+    min: int
+    max: int
+    bits: int  # of the c type the value is stored in
+    signed: bool
+
+    def clamp(self, value: int) -> int:
+        if value < self.min:
+            return self.min
+        if value > self.max:
+            return self.max
+        return value
+
+    @property
+    def storage_min(self) -> int:
+        return -(1 << (self.bits - 1)) if self.signed else 0
+
+    @property
+    def storage_max(self) -> int:
+        return (1 << (self.bits - 1)) - 1 if self.signed else (1 << self.bits) - 1
+
+    def wrap(self, value: int) -> int:
+        """Implicit c conversion to the storage type"""
+
+        value &= (1 << self.bits) - 1
+        if self.signed and value >= 1 << (self.bits - 1):
+            value -= 1 << self.bits
+        return value
+
+
+def int_range(name: str) -> IntRange:
+    unsigned = name.startswith("unsigned_")
+    info = INT_TYPE_INFO[name.removeprefix("unsigned_")]
+    if unsigned:
+        low, high = info.unsigned_range()
+    else:
+        low, high = info.signed_range()
+    bits = int(info.ctype.removeprefix("int").removesuffix("_t"))
+    return IntRange(low, high, bits, not unsigned)
+
+
+def convert(value: int, name1: str, name2: str) -> int:
+    """slabes_convert_<name1>_to_<name2>"""
+
+    if name1 == name2:
+        return value
+    return int_range(name2).clamp(value)
+
+
+def bin_op_type(name1: str, name2: str) -> str:
+    """Type both operands are converted to, the same choice as make_int_bin_ops does"""
+
+    kinds = list(INT_TYPE_INFO.keys())
+    kind1, kind2 = name1.removeprefix("unsigned_"), name2.removeprefix("unsigned_")
+    if kinds.index(kind1) > kinds.index(kind2):
+        return name1
+    return name2
+
+
+def c_div(lhs: int, rhs: int) -> int:
+    quotient = abs(lhs) // abs(rhs)
+    return quotient if (lhs < 0) == (rhs < 0) else -quotient
+
+
+def make_bin_op(op_name: str, name1: str, name2: str) -> Callable[[int, int], int]:
+    """slabes_op_<op_name>__<name1>__<name2>"""
+
+    name = bin_op_type(name1, name2)
+    result = int_range(name)
+    low, high = result.min, result.max
+
+    if op_name == "div":
+        def div(lhs: int, rhs: int) -> int:
+            lhs, rhs = convert(lhs, name1, name), convert(rhs, name2, name)
+            if rhs == 0:
+                return high if lhs >= 0 else low
+            return result.wrap(c_div(lhs, rhs))
+        return div
+
+    # add, sub and mul of the values in range cannot overflow the c type,
+    # so they are the same as the mathematical result clamped into the range
+    if op_name == "add":
+        def operation(lhs: int, rhs: int) -> int:
+            return lhs + rhs
+    elif op_name == "sub":
+        def operation(lhs: int, rhs: int) -> int:
+            return lhs - rhs
+    elif op_name == "mul":
+        def operation(lhs: int, rhs: int) -> int:
+            return lhs * rhs
+    else:
+        assert False, f"unknown binary operation {op_name}"
+
+    if name1 == name == name2:
+        def same_types(lhs: int, rhs: int) -> int:
+            value = operation(lhs, rhs)
+            return low if value < low else high if value > high else value
+        return same_types
+
+    def different_types(lhs: int, rhs: int) -> int:
+        value = operation(convert(lhs, name1, name), convert(rhs, name2, name))
+        return low if value < low else high if value > high else value
+    return different_types
+
+
+CMP_OPS = {
+    ast.CmpOp.EQ: "==",
+    ast.CmpOp.NE: "!=",
+    ast.CmpOp.LE: "<=",
+    ast.CmpOp.GE: ">=",
+}
+
+PRINT_FORMATS = {
+    "%hhi": IntRange(-128, 127, 8, True),
+    "%hhu": IntRange(0, 255, 8, False),
+    "%hi": IntRange(-32768, 32767, 16, True),
+    "%hu": IntRange(0, 65535, 16, False),
+}
+
+
+def format_value(value: object, name: str) -> str:
+    if name.startswith("matrix_"):
+        return "(nil)" if value is None else hex(id(value))
+    info = INT_TYPE_INFO[name.removeprefix("unsigned_")]
+    specifier = info.format + ("u" if name.startswith("unsigned_") else "i")
+    return str(PRINT_FORMATS[specifier].wrap(value))  # type: ignore[arg-type]
+
+
+class SlabesAssertionError(Exception):
+    pass
+
+
+ROBOT_OP_MS = 100  # same as in slabes_prelude.h
+
+
+class ClockMode(Enum):
+    REAL_TIME = "real"
+    SCALED = "scaled"
+    VIRTUAL = "virtual"
+
+
+@dataclass
+class Clock:
+    """Python port of SlabesClock from slabes_prelude.c"""
+
+    mode: ClockMode = ClockMode.VIRTUAL
+    speed: float = 1.0
+    now_ms: int = 0  # simulated time, every robot operation advances it
+
+    @classmethod
+    def parse(cls, spec: str) -> Clock:
+        """'real', 'virtual' or a speed multiplier like 'x10' or '10'"""
+
+        if spec == "real":
+            return cls(ClockMode.REAL_TIME)
+        if spec == "virtual":
+            return cls(ClockMode.VIRTUAL)
+        try:
+            speed = float(spec.removeprefix("x"))
+        except ValueError:
+            speed = 0.0
+        if not speed > 0:
+            raise ValueError(f"invalid clock '{spec}', expected real, virtual or a speed multiplier like x10")
+        return cls(ClockMode.SCALED, speed)
+
+    def advance(self, milliseconds: int) -> None:
+        self.now_ms += milliseconds
+        if self.mode is not ClockMode.VIRTUAL:
+            time.sleep(milliseconds / 1000 / self.speed)
+
+
+@dataclass
+class Runtime:
+    """Everything the generated code refers to besides its own functions"""
+
+    game: Game
+    output: Callable[[str], object] | None = None  # sys.stdout by default
+    clock: Clock = field(default_factory=Clock)
+
+    def write(self, text: str) -> None:
+        if self.output is None:
+            sys.stdout.write(text)
+        else:
+            self.output(text)
+
+    def namespace(self) -> dict[str, object]:
+        return {
+            "__name__": "__slabes__",
+            "make_bin_op": make_bin_op,
+            "slabes_init_matrix": self.init_matrix,
+            "slabes_print": self.print,
+            "slabes_assert": self.assert_,
+            "slabes_func___robot_command_go": self.go,
+            "slabes_func___robot_command_rl": self.rl,
+            "slabes_func___robot_command_rr": self.rr,
+            "slabes_func___robot_command_sonar": self.sonar,
+            "slabes_func___robot_command_compass": self.compass,
+            "slabes_func___generate_maze": self.generate_maze,
+        }
+
+    @staticmethod
+    def init_matrix(var: list[int] | None, value: int, size: int) -> list[int]:
+        # the memory is reused, so every alias of the matrix sees the new values
+        if var is None:
+            return [value] * (size * size)
+        var[:] = [value] * (size * size)
+        return var
+
+    def print(self, *values: tuple[object, str]) -> None:
+        self.write("".join(format_value(value, name) + " " for value, name in values) + "\n")
+
+    def assert_(self, value: int, message: str) -> int:
+        if not value:
+            raise SlabesAssertionError(message)
+        return value
+
+    def go(self) -> int:
+        self.clock.advance(ROBOT_OP_MS)
+        return 1 if self.game.make_player_take_one_step() else 0
+
+    def rl(self) -> int:
+        self.clock.advance(ROBOT_OP_MS)
+        self.game.player_direction = LEFT_ROTATED[self.game.player_direction]
+        return 1
+
+    def rr(self) -> int:
+        self.clock.advance(ROBOT_OP_MS)
+        self.game.player_direction = RIGHT_ROTATED[self.game.player_direction]
+        return 1
+
+    def sonar(self) -> int:
+        self.clock.advance(ROBOT_OP_MS)
+        return self.game.sonar()
+
+    def compass(self) -> int:
+        self.clock.advance(ROBOT_OP_MS)
+        return 1 if self.game.player_position == self.game.finish_position else 0
+
+    def generate_maze(self) -> int:
+        self.game.generate_maze()
+        return 1
+
+
+INDENT = "    "
+
+
+@dataclass
+class GeneratePython:
+    lines: list[str] = field(default_factory=list)
+    used_ops: dict[str, tuple[str, str, str]] = field(default_factory=dict)
+
+    level: int = 0
+
+    scope: ev.ScopeValue = field(init=False)
+
+    _filepath: str = field(default=DEFAULT_FILENAME)
+    _lines: list[str] = field(default_factory=list)
+
+    def visit(self, node):
+        method = "visit_" + node.__class__.__name__
+        visitor = getattr(self, method, None)
+        if visitor is None:
+            report_fatal_at(
+                node.loc,
+                errors.SyntaxError,
+                f"analysis node '{type(node).__name__}' is currently not supported for the python backend",
+                self._lines,
+            )
+        return visitor(node)
+
+    def generate(
+        self, code: str, eval: ev.Module, filepath: str = DEFAULT_FILENAME
+    ) -> str:
+        self._filepath = filepath
+        self._lines = code.splitlines()
+        self.visit(eval)
+
+        header = [f"# GENERATED FROM {filepath}", ""]
+        for name, args in self.used_ops.items():
+            header.append(f"{name} = make_bin_op{args!r}")
+        return "\n".join(header + [""] + self.lines) + "\n"
+
+    def emit(self, line: str) -> None:
+        self.lines.append(INDENT * self.level + line)
+
+    @contextmanager
+    def indented(self):
+        self.level += 1
+        start = len(self.lines)
+        try:
+            yield
+        finally:
+            if len(self.lines) == start:
+                self.emit("pass")
+            self.level -= 1
+
+    @contextmanager
+    def new_scope(self, new: ev.ScopeValue):
+        old = getattr(self, "scope", None)
+        self.scope = new
+        try:
+            yield self.scope
+        finally:
+            if old is not None:
+                self.scope = old
+
+    def function_name(self, name: str) -> str:
+        return "slabes_func_" + name
+
+    def var_name(self, name: str) -> str:
+        return "slabes_var_" + name
+
+    def type_range(self, node: ts.Type) -> IntRange:
+        return int_range(node.name())
+
+    def handle_scope(self, node: ev.ScopeValue):
+        for name, value in node.name_to_value.items():
+            if node.names[name].is_arg:
+                continue
+            if not is_variable(value.type):
+                continue
+            initial = "None" if isinstance(value.type, ts.MatrixType) else "0"
+            self.emit(f"{self.var_name(name)} = {initial}")
+
+        with self.new_scope(node):
+            for it in node.body:
+                self.visit(it)
+
+    def visit_Module(self, node: ev.Module):
+        self.scope = node
+        self.handle_scope(node)
+
+    def visit_Function(self, node: ev.Function):
+        name = "program_main" if node.name == MAIN_FUNCTION else self.function_name(node.name)
+        args = ", ".join(self.var_name(it) for it in (node.args or {}))
+        self.emit(f"def {name}({args}):")
+        with self.indented():
+            outer = self.outer_names(node)
+            if outer:
+                self.emit("global " + ", ".join(self.var_name(it) for it in sorted(outer)))
+            self.handle_scope(node)
+            # falling off the end of a function is undefined in c, be predictable here
+            self.emit("return 0")
+
+    def outer_names(self, node: ev.Function) -> set[str]:
+        """Names of the outer scopes that the function assigns to"""
+
+        result = set()
+        stack: list[ev.Eval] = list(node.body)
+        while stack:
+            it = stack.pop()
+            if isinstance(it, ev.Assign):
+                for target in it.targets:
+                    if isinstance(target, ev.Name):
+                        origin = lookup_origin(node, target.value)
+                        if origin is not None and origin is not node and isinstance(origin, ev.Module):
+                            result.add(target.value)
+            if isinstance(it, (ev.Condition, ev.Loop)):
+                stack.extend(it.body)
+        return result
+
+    def visit_Assign(self, node: ev.Assign):
+        for target in node.targets:
+            if isinstance(target, ev.SubscriptOperation):
+                item = self.type_range(target.value.evaluated.type.item_type)
+                value = self.wrap(self.expr(node.value), node.value.evaluated.type.name(), item)
+                self.emit(f"{self.expr(target)} = {value}")
+                continue
+
+            assert isinstance(target, ev.Name)
+            name = target.value
+            tp = self.scope.name_to_value[name].type
+            var = self.var_name(name)
+
+            if isinstance(node.value, ev.Matrix):
+                assert isinstance(tp, ts.MatrixType), "Matrix evaluated not to MatrixType"
+                item = self.type_range(tp.item_type)
+                size = self.type_range(node.value.type.index_type).max
+                self.emit(f"{var} = slabes_init_matrix({var}, {item.wrap(node.value.value)}, {size})")
+                continue
+
+            if not is_variable(tp):
+                self.visit(node.value)
+                continue
+
+            if isinstance(node.value, ev.Int):
+                assert isinstance(tp, ts.IntType), "Int evaluated not to IntType"
+                signed = "" if tp.signed else "unsigned_"
+                value = int_range(signed + "big").wrap(self.constant(node.value))
+                value = convert(value, signed + "big", tp.name())
+                self.emit(f"{var} = {value}")
+            elif isinstance(tp, ts.IntType) and isinstance(node.value.evaluated.type, ts.IntType):
+                value = self.expr(node.value)
+                self.emit(f"{var} = {self.convert(value, node.value.evaluated.type.name(), tp.name())}")
+            else:
+                self.emit(f"{var} = {self.expr(node.value)}")
+
+    def constant(self, node: ev.Int) -> int:
+        return self.type_range(node.type).clamp(node.value)
+
+    def convert(self, value: str, name1: str, name2: str) -> str:
+        if name1 == name2:
+            return value
+        result = int_range(name2)
+        return f"min(max({value}, {result.min}), {result.max})"
+
+    def wrap(self, value: str, name: str, result: IntRange) -> str:
+        """Implicit c conversion of the value of type name to the storage type of result"""
+
+        source = int_range(name)
+        if result.storage_min <= source.storage_min and source.storage_max <= result.storage_max:
+            return value
+
+        mask = (1 << result.bits) - 1
+        if result.signed:
+            half = 1 << (result.bits - 1)
+            return f"((({value}) + {half}) & {mask}) - {half}"
+        return f"({value}) & {mask}"
+
+    def visit_Call(self, node: ev.Call):
+        self.emit(self.expr(node))
+
+    def visit_Return(self, node: ev.Return):
+        if not isinstance(node.evaluated, ev.Int):
+            report_fatal_at(
+                node.loc,
+                errors.TypeError,
+                f"return type '{node.evaluated.type}' is not supported in the python backend"
+            )
+        value = self.wrap(self.expr(node.evalue), node.evalue.evaluated.type.name(), self.type_range(node.evaluated.type))
+        self.emit(f"return {value}")
+
+    def visit_Condition(self, node: ev.Condition):
+        self.emit(f"if {self.expr(node.test)}:")
+        with self.indented():
+            for it in node.body:
+                self.visit(it)
+
+    def visit_Loop(self, node: ev.Loop):
+        self.emit(f"while not {self.expr(node.test)}:")
+        with self.indented():
+            for it in node.body:
+                self.visit(it)
+
+    def visit_Int(self, node: ev.Int):
+        self.emit(self.expr(node))
+
+    def visit_BinaryOperation(self, node: ev.BinaryOperation):
+        self.emit(self.expr(node))
+
+    def visit_CompareOperation(self, node: ev.CompareOperation):
+        self.emit(self.expr(node))
+
+    def visit_Name(self, node: ev.Name):
+        self.emit(self.expr(node))
+
+    def visit_SubscriptOperation(self, node: ev.SubscriptOperation):
+        self.emit(self.expr(node))
+
+    def expr(self, node: ev.Eval) -> str:
+        """Python expression with the value of the node"""
+
+        if isinstance(node, ev.Int):
+            return str(self.constant(node))
+
+        if isinstance(node, ev.Name):
+            return self.var_name(node.value)
+
+        if isinstance(node, ev.BinaryOperation):
+            name1 = node.lhs.evaluated.type.name()
+            name2 = node.rhs.evaluated.type.name()
+            op_name = node.op.name.lower()
+            function = f"slabes_op_{op_name}__{name1}__{name2}"
+            self.used_ops[function] = (op_name, name1, name2)
+            return f"{function}({self.expr(node.lhs)}, {self.expr(node.rhs)})"
+
+        if isinstance(node, ev.CompareOperation):
+            # like in c, the middle operands are evaluated twice
+            parts = []
+            lhs = node.operand
+            for op, rhs in zip(node.ops, node.operands):
+                parts.append(f"{self.expr(lhs)} {CMP_OPS[op]} {self.expr(rhs)}")
+                lhs = rhs
+            return f"(1 if {' and '.join(parts)} else 0)"
+
+        if isinstance(node, ev.SubscriptOperation):
+            size = self.type_range(node.value.evaluated.type.index_type).max
+            return f"{self.expr(node.value)}[{self.expr(node.index1)} + {self.expr(node.index2)} * {size}]"
+
+        if isinstance(node, ev.Call):
+            return self.call(node)
+
+        report_fatal_at(
+            node.loc,
+            errors.SyntaxError,
+            f"'{type(node).__name__}' is currently not supported as an expression in the python backend",
+            self._lines,
+        )
+
+    def call(self, node: ev.Call) -> str:
+        function = node.operand.evaluated
+        if isinstance(function, ev.FuncPrint):
+            args = ", ".join(
+                f"({self.expr(arg)}, {arg.evaluated.type.name()!r})" for arg in node.args
+            )
+            return f"slabes_print({args})"
+
+        if isinstance(function, ev.FuncAssert):
+            calls = []
+            for arg in node.args:
+                exact_str = arg.loc.get_exact_str_from_lines(self._lines)
+                if exact_str is None:
+                    message = "expression"
+                else:
+                    message = "'" + exact_str + "'"
+                message += f" evaluated to false (at {arg.loc})"
+                value = self.convert(self.expr(arg), arg.evaluated.type.name(), "unsigned_tiny")
+                calls.append(f"slabes_assert({value}, {message!r})")
+            return ", ".join(calls) if calls else "None"
+
+        assert isinstance(function, ev.Function), report_fatal_at(
+            node.loc, errors.TypeError, "Not a function"
+        )
+        args = []
+        for arg, param in zip(node.args, (function.args or {}).values()):
+            args.append(self.wrap(self.expr(arg), arg.evaluated.type.name(), self.type_range(param.type)))
+        return f"{self.function_name(function.name)}({', '.join(args)})"
+
+
+def generate_python(code: str, module: ev.Module, filepath: str = DEFAULT_FILENAME) -> str:
+    return GeneratePython().generate(code, module, filepath)
+
+
+def run_python(source: str, filepath: str, runtime: Runtime) -> int:
+    """Execute the generated python code the way the c main() runs the program"""
+
+    namespace = runtime.namespace()
+    exec(compile(source, filepath + ".py", "exec"), namespace)
+
+    program_main = namespace.get("program_main")
+    if program_main is None:
+        runtime.write(f"{filepath}: no '{MAIN_FUNCTION}' function to run\n")
+        return 1
+
+    runtime.write("Starting...\n")
+    runtime.clock.advance(ROBOT_OP_MS)  # ROBOT_OP_DELAY in main()
+    try:
+        program_main()
+    except SlabesAssertionError as e:
+        runtime.write(f"Assertion failed: {e}\n")
+        return 1
+    runtime.write("Finishing...\n")
+    if runtime.clock.mode is ClockMode.VIRTUAL:
+        print(f"Simulated time: {runtime.clock.now_ms / 1000:.1f}s", file=sys.stderr)
+    return 0
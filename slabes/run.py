@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+
+from pathlib import Path
+
+from . import maze
+from .game import FIELD_DEFAULT_SIDE, MAZE_GENERATORS, Field, Game, Rng
+from .main import Config, add_build_arguments, make_config, front_end, compile_program, compile_vm, build_vm, report_timing
+from .pygen import Clock, Runtime, generate_python, run_python
+from .bytecode import generate_bytecode
+from .cache import BuildCache
+
+
+def run_with_python(conf: Config, args: argparse.Namespace) -> int:
+    evalue = front_end(conf)
+
+    with conf.timing.phase("python codegen"):
+        source = generate_python(conf.source, evalue, conf.in_path)
+
+    if args.emit_python == "-":
+        print(source)
+    elif args.emit_python is not None:
+        Path(args.emit_python).write_text(source, "utf-8")
+
+    # the same defaults as slabes_parse_args, except that the python backend doesn't wait
+    clock = args.clock or os.environ.get("SLABES_CLOCK") or "virtual"
+    size = args.size or os.environ.get("SLABES_SIZE") or str(FIELD_DEFAULT_SIDE)
+    generator = args.maze or os.environ.get("SLABES_MAZE") or MAZE_GENERATORS[0]
+    maze_file = args.maze_file or os.environ.get("SLABES_MAZE_FILE")
+    seed = args.seed
+    try:
+        if seed is None and os.environ.get("SLABES_SEED"):
+            seed = Rng.parse_seed(os.environ["SLABES_SEED"])
+        if maze_file:
+            game = maze.load(maze_file)
+        else:
+            game = Game.setup(*Field.parse_size(size), seed, generator)
+        runtime = Runtime(game, clock=Clock.parse(clock))
+    except (OSError, ValueError, maze.MazeFileError) as e:
+        print(f"slabes run: {e}", file=sys.stderr)
+        return 1
+
+    with conf.timing.phase("run"):
+        return run_python(source, conf.in_path, runtime)
+
+
+def run_with_vm(conf: Config, program_args: list[str], emit: str | None) -> int:
+    evalue = front_end(conf)
+
+    with conf.timing.phase("bytecode"):
+        program = generate_bytecode(conf.source, evalue, conf.in_path)
+        data = program.to_bytes()
+    conf.timing.count("bytecode bytes", len(data))
+
+    if emit == "-":
+        print(program.disassemble())
+    elif emit is not None:
+        Path(emit).write_text(program.disassemble(), "utf-8")
+
+    bytecode_path = conf.bin_path.with_suffix(".sbc")
+    bytecode_path.write_bytes(data)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with conf.timing.phase("vm"):
+            if conf.cache_dir is not None:
+                vm = build_vm(conf, BuildCache(conf.cache_dir, conf.cache_size))
+            else:
+                vm = Path(tmp) / "slabes_vm.out"
+                if not compile_vm(conf, vm):
+                    vm = None
+        if vm is None:
+            return 1
+
+        with conf.timing.phase("run"):
+            return subprocess.run([str(vm), str(bytecode_path), *program_args]).returncode
+
+
+def run_with_c(conf: Config, program_args: list[str]) -> int:
+    returncode = compile_program(conf)
+    if returncode:
+        return returncode
+
+    with conf.timing.phase("run"):
+        return subprocess.run([str(conf.bin_path.absolute()), *program_args]).returncode
+
+
+def main(argv: list[str] = sys.argv) -> None:
+    argparser = argparse.ArgumentParser(prog="slabes run", description="Run a program without keeping the build results around")
+    argparser.add_argument("filename", help="Input file ('-' to use stdin)")
+    argparser.add_argument("--backend", choices=["python", "vm", "c"], default="python", help="Execute in this process, interpret the bytecode with the vm (built once), or compile with the c compiler and run the binary")
+    argparser.add_argument("--seed", type=Rng.parse_seed, default=None, help="Seed of the maze generator, the same seed gives the same maze on every backend. Defaults to $SLABES_SEED, then to the current time")
+    argparser.add_argument("--clock", default=None, metavar="SPEC", help="Simulation clock: 'real', 'virtual' (robot commands don't wait, the simulated time is reported) or a speed multiplier like 'x10'. Defaults to $SLABES_CLOCK, then to real time for the c and vm backends and virtual time for the python backend")
+    argparser.add_argument("--size", default=None, metavar="N|WxH", help=f"Field size: the side of the square field (2N+1 rows of N cells) or the width and the number of rows. Defaults to $SLABES_SIZE, then to {FIELD_DEFAULT_SIDE}")
+    argparser.add_argument("--maze", choices=MAZE_GENERATORS, default=None, help=f"Maze generator. Defaults to $SLABES_MAZE, then to {MAZE_GENERATORS[0]}")
+    argparser.add_argument("--maze-file", default=None, metavar="PATH", help="Load the maze from this file instead of generating it, see 'slabes maze'. Defaults to $SLABES_MAZE_FILE")
+    argparser.add_argument("--emit-python", default=None, metavar="FILE", help="Also write the generated python code to this file ('-' for stdout)")
+    argparser.add_argument("--emit-bytecode", default=None, metavar="FILE", help="Also write the disassembled bytecode to this file ('-' for stdout)")
+    argparser.add_argument("-o", "--output", default=None, help="Binary file (c backend), the bytecode is written next to it with the .sbc suffix (vm backend)")
+    argparser.add_argument("program_args", nargs="*", help="Passed to the compiled program or the vm, e.g. the display library or --max-robot-ops=N (c and vm backends only, an error with the python backend)")
+    add_build_arguments(argparser)
+
+    args = argparser.parse_args(argv[1:])
+    if args.backend == "python" and args.program_args:
+        # the python runtime has only the options above, no budgets, reports or displays
+        argparser.error(f"the python backend takes no program arguments, got: {' '.join(args.program_args)} (use --backend vm or c)")
+
+    input_file = args.filename
+    if input_file == "" or input_file == "-":
+        input_file = "<stdin>"
+        text = sys.stdin.read()
+    else:
+        text = Path(input_file).read_text("utf-8")
+
+    bin_file = Path(args.output) if args.output else Path(input_file).with_suffix(".out")
+    conf = make_config(args, input_file, text, Path(input_file).with_suffix(".c"), bin_file)
+    program_args = args.program_args
+    if args.clock is not None:
+        program_args = [f"--clock={args.clock}", *program_args]
+    if args.size is not None:
+        program_args = [f"--size={args.size}", *program_args]
+    if args.maze is not None:
+        program_args = [f"--maze={args.maze}", *program_args]
+    if args.seed is not None:
+        program_args = [f"--seed={args.seed}", *program_args]
+    if args.maze_file is not None:
+        program_args = [f"--maze-file={args.maze_file}", *program_args]
+
+    try:
+        if args.backend == "python":
+            returncode = run_with_python(conf, args)
+        elif args.backend == "vm":
+            returncode = run_with_vm(conf, program_args, args.emit_bytecode)
+        else:
+            returncode = run_with_c(conf, program_args)
+    finally:
+        report_timing(conf)
+    exit(returncode)
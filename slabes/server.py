@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import io
+import os
+import sys
+import json
+import socket
+import argparse
+import traceback
+import socketserver
+
+from pathlib import Path
+from contextlib import redirect_stdout
+
+from . import errors
+from .cache import default_cache_dir
+from .main import add_build_arguments, make_config, front_end, generate_c, compile_program, report_timing
+
+
+# Protocol: one JSON object per line in both directions.
+#
+# Request:
+#     {"command": "check" | "c" | "compile" | "ping" | "shutdown", "cwd": "<dir>"?,
+#      "path": "<file>", "source": "<text>"?, "c_path": "<file>"?, "bin_path": "<file>"?,
+#      "options": {<build arguments, see main.add_build_arguments>}}
+#
+# Response:
+#     {"ok": bool, "returncode": int, "diagnostics": "<text>",
+#      "c_code": "<text>"?, "c_path": "<file>"?, "bin_path": "<file>"?}
+
+COMMANDS = ("check", "c", "compile", "ping", "shutdown")
+
+
+def default_socket_path() -> Path:
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return Path(runtime) / "slabes.sock"
+    return default_cache_dir() / "server.sock"
+
+
+def default_options() -> dict[str, object]:
+    argparser = argparse.ArgumentParser()
+    add_build_arguments(argparser)
+    return vars(argparser.parse_args([]))
+
+
+def handle_request(request: dict) -> dict:
+    """Execute the request in the current process"""
+
+    command = request.get("command")
+    if command not in COMMANDS:
+        return {"ok": False, "returncode": 2, "diagnostics": f"unknown command {command!r}\n"}
+    if command in ("ping", "shutdown"):
+        return {"ok": True, "returncode": 0, "diagnostics": ""}
+
+    if request.get("cwd"):
+        os.chdir(request["cwd"])  # relative paths are relative to the client
+
+    path = request["path"]
+    source = request.get("source")
+    if source is None:
+        source = Path(path).read_text("utf-8")
+    c_path = Path(request.get("c_path") or Path(path).with_suffix(".c"))
+    bin_path = Path(request.get("bin_path") or Path(path).with_suffix(".out"))
+
+    options = default_options()
+    options.update(request.get("options") or {})
+    conf = make_config(argparse.Namespace(**options), path, source, c_path, bin_path)
+
+    response: dict = {"ok": False, "returncode": 1}
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            if command == "check":
+                front_end(conf)
+                response["returncode"] = 0
+            elif command == "c":
+                response["c_code"] = generate_c(conf)
+                response["returncode"] = 0
+            elif command == "compile":
+                response["returncode"] = compile_program(conf)
+                response["c_path"] = str(conf.c_path)
+                response["bin_path"] = str(conf.bin_path)
+        except SystemExit as e:  # errors are reported and then exit is called
+            response["returncode"] = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc(file=output)
+        finally:
+            errors.clear_reported()
+            report_timing(conf)
+
+    response["ok"] = response["returncode"] == 0
+    response["diagnostics"] = output.getvalue()
+    return response
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    server: Server
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = handle_request(request)
+            except Exception:
+                request = {}
+                response = {"ok": False, "returncode": 1, "diagnostics": traceback.format_exc()}
+
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+            if request.get("command") == "shutdown":
+                self.server.stop_requested = True
+                break
+
+
+class Server(socketserver.UnixStreamServer):
+    """Requests are handled one by one in the same process,
+    so the lexer, parser and codegen stay warm between them"""
+
+    stop_requested = False
+
+
+def is_server_running(path: Path) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(path))
+    except OSError:
+        return False
+    return True
+
+
+def main(argv: list[str] = sys.argv) -> None:
+    argparser = argparse.ArgumentParser(prog="slabes serve", description="Keep the compiler warm and serve requests over a unix socket")
+    argparser.add_argument("--socket", default=None, help=f"Socket path (default: {default_socket_path()})")
+
+    args = argparser.parse_args(argv[1:])
+
+    path = default_socket_path() if args.socket is None else Path(args.socket)
+    if is_server_running(path):
+        print(f"server is already listening on {path}")
+        exit(1)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)  # left from a server that was killed
+
+    with Server(str(path), RequestHandler) as server:
+        print(f"listening on {path}")
+        try:
+            while not server.stop_requested:
+                server.handle_request()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,739 @@
+#include "libslabes/slabes.c"
+
+#ifdef _WIN32
+#include <windows.h>
+#elif __unix__
+#include <unistd.h>
+#endif
+
+#include <string.h>
+#include <errno.h>
+#include <stdarg.h>
+#include <inttypes.h>
+#include <pthread.h>
+#include <stdatomic.h>
+
+// "real", "virtual" or a speed multiplier like "x10" or "10"
+bool slabes_configure_clock(SlabesClock *state, const char *spec) {
+    if (strcmp(spec, "real") == 0) {
+        state->mode = SlabesClockRealTime;
+        state->speed = 1.0;
+        return true;
+    }
+    if (strcmp(spec, "virtual") == 0) {
+        state->mode = SlabesClockVirtual;
+        return true;
+    }
+
+    if (spec[0] == 'x') ++spec;
+    char *end = NULL;
+    double speed = strtod(spec, &end);
+    if (end == spec || *end != '\0' || !(speed > 0)) {
+        return false;
+    }
+    state->mode = SlabesClockScaled;
+    state->speed = speed;
+    return true;
+}
+
+// "N" for the square field of side N or "WxH" for W cells wide and H rows high
+bool slabes_parse_field_size(const char *spec, size_t *width, size_t *height) {
+    char *end = NULL;
+    unsigned long long first = strtoull(spec, &end, 10);
+    if (end == spec || first == 0) {
+        return false;
+    }
+    if (*end == '\0') {
+        *width = first;
+        *height = first * 2 + 1;
+        return field_size_is_valid(*width, *height);
+    }
+    if (*end != 'x') {
+        return false;
+    }
+
+    spec = end + 1;
+    unsigned long long second = strtoull(spec, &end, 10);
+    if (end == spec || *end != '\0' || second == 0) {
+        return false;
+    }
+    *width = first;
+    *height = second;
+    return field_size_is_valid(*width, *height);
+}
+
+bool slabes_parse_seed(const char *spec, uint64_t *seed) {
+    char *end = NULL;
+    errno = 0;
+    *seed = strtoull(spec, &end, 10);
+    return '0' <= spec[0] && spec[0] <= '9' && *end == '\0' && errno == 0;
+}
+
+bool slabes_parse_count(const char *spec, uint64_t *count) {
+    return slabes_parse_seed(spec, count);
+}
+
+bool slabes_parse_seconds(const char *spec, double *seconds) {
+    char *end = NULL;
+    *seconds = strtod(spec, &end);
+    return end != spec && *end == '\0' && *seconds > 0;
+}
+
+// frames per second of --display-fps, more would only keep a core busy
+#define SLABES_MAX_DISPLAY_FPS 1000
+
+// options of the program: [--clock=real|virtual|xN] [--size=N|WxH] [--maze=NAME] [--seed=N] [--maze-file=PATH]
+// [--max-robot-ops=N] [--max-iterations=N] [--time-limit=SECONDS] [--cycle-limit=N] [--report]
+// [--telemetry=PATH] [--heatmap=PATH] [--trace=PATH] [--display-fps=N] [--share=NAME] [--games=N] [--threads=N]
+// [display library], they can also be set with the SLABES_CLOCK, SLABES_SIZE, SLABES_MAZE, SLABES_SEED,
+// SLABES_MAZE_FILE, SLABES_MAX_ROBOT_OPS, SLABES_MAX_ITERATIONS, SLABES_TIME_LIMIT, SLABES_CYCLE_LIMIT, SLABES_REPORT,
+// SLABES_TELEMETRY, SLABES_HEATMAP, SLABES_TRACE, SLABES_DISPLAY_FPS, SLABES_SHARE, SLABES_GAMES and SLABES_THREADS
+// environment variables
+bool slabes_parse_args(int argc, char *argv[], SlabesArgs *args) {
+    const char *clock = getenv("SLABES_CLOCK");
+    const char *size = getenv("SLABES_SIZE");
+    const char *maze = getenv("SLABES_MAZE");
+    const char *seed = getenv("SLABES_SEED");
+    const char *max_robot_ops = getenv("SLABES_MAX_ROBOT_OPS");
+    const char *max_iterations = getenv("SLABES_MAX_ITERATIONS");
+    const char *time_limit = getenv("SLABES_TIME_LIMIT");
+    const char *cycle_limit = getenv("SLABES_CYCLE_LIMIT");
+    const char *display_fps = getenv("SLABES_DISPLAY_FPS");
+    const char *games = getenv("SLABES_GAMES");
+    const char *threads = getenv("SLABES_THREADS");
+    args->libname = NULL;
+    args->clock = (SlabesClock){SlabesClockRealTime, 1.0, 0};
+    args->budget = (SlabesBudget){UINT64_MAX, UINT64_MAX, 0};
+    args->report = getenv("SLABES_REPORT") != NULL;
+    args->telemetry = getenv("SLABES_TELEMETRY");
+    args->heatmap = getenv("SLABES_HEATMAP");
+    args->game.field_width = FIELD_DEFAULT_SIDE;
+    args->game.field_height = FIELD_DEFAULT_SIDE * 2 + 1;
+    args->game.maze_generator = MazeBacktracker;
+    args->game.seed = 0;
+    args->game.seeded = false;
+    args->game.maze_file = getenv("SLABES_MAZE_FILE");
+    args->game.cycle_limit = 0;
+    args->game.trace_file = getenv("SLABES_TRACE");
+    args->game.display_fps = 0;
+    args->game.share_name = getenv("SLABES_SHARE");
+    args->games = 0;
+    args->threads = 0;
+
+    for (int i = 0; i < argc; ++i) {
+        if (strncmp(argv[i], "--clock=", 8) == 0) {
+            clock = argv[i] + 8;
+        } else if (strcmp(argv[i], "--clock") == 0 && i + 1 < argc) {
+            clock = argv[++i];
+        } else if (strncmp(argv[i], "--size=", 7) == 0) {
+            size = argv[i] + 7;
+        } else if (strcmp(argv[i], "--size") == 0 && i + 1 < argc) {
+            size = argv[++i];
+        } else if (strncmp(argv[i], "--maze=", 7) == 0) {
+            maze = argv[i] + 7;
+        } else if (strcmp(argv[i], "--maze") == 0 && i + 1 < argc) {
+            maze = argv[++i];
+        } else if (strncmp(argv[i], "--seed=", 7) == 0) {
+            seed = argv[i] + 7;
+        } else if (strcmp(argv[i], "--seed") == 0 && i + 1 < argc) {
+            seed = argv[++i];
+        } else if (strncmp(argv[i], "--maze-file=", 12) == 0) {
+            args->game.maze_file = argv[i] + 12;
+        } else if (strcmp(argv[i], "--maze-file") == 0 && i + 1 < argc) {
+            args->game.maze_file = argv[++i];
+        } else if (strncmp(argv[i], "--max-robot-ops=", 16) == 0) {
+            max_robot_ops = argv[i] + 16;
+        } else if (strcmp(argv[i], "--max-robot-ops") == 0 && i + 1 < argc) {
+            max_robot_ops = argv[++i];
+        } else if (strncmp(argv[i], "--max-iterations=", 17) == 0) {
+            max_iterations = argv[i] + 17;
+        } else if (strcmp(argv[i], "--max-iterations") == 0 && i + 1 < argc) {
+            max_iterations = argv[++i];
+        } else if (strncmp(argv[i], "--time-limit=", 13) == 0) {
+            time_limit = argv[i] + 13;
+        } else if (strcmp(argv[i], "--time-limit") == 0 && i + 1 < argc) {
+            time_limit = argv[++i];
+        } else if (strncmp(argv[i], "--cycle-limit=", 14) == 0) {
+            cycle_limit = argv[i] + 14;
+        } else if (strcmp(argv[i], "--cycle-limit") == 0 && i + 1 < argc) {
+            cycle_limit = argv[++i];
+        } else if (strcmp(argv[i], "--report") == 0) {
+            args->report = true;
+        } else if (strncmp(argv[i], "--telemetry=", 12) == 0) {
+            args->telemetry = argv[i] + 12;
+        } else if (strcmp(argv[i], "--telemetry") == 0 && i + 1 < argc) {
+            args->telemetry = argv[++i];
+        } else if (strncmp(argv[i], "--heatmap=", 10) == 0) {
+            args->heatmap = argv[i] + 10;
+        } else if (strcmp(argv[i], "--heatmap") == 0 && i + 1 < argc) {
+            args->heatmap = argv[++i];
+        } else if (strncmp(argv[i], "--trace=", 8) == 0) {
+            args->game.trace_file = argv[i] + 8;
+        } else if (strcmp(argv[i], "--trace") == 0 && i + 1 < argc) {
+            args->game.trace_file = argv[++i];
+        } else if (strncmp(argv[i], "--display-fps=", 14) == 0) {
+            display_fps = argv[i] + 14;
+        } else if (strcmp(argv[i], "--display-fps") == 0 && i + 1 < argc) {
+            display_fps = argv[++i];
+        } else if (strncmp(argv[i], "--share=", 8) == 0) {
+            args->game.share_name = argv[i] + 8;
+        } else if (strcmp(argv[i], "--share") == 0 && i + 1 < argc) {
+            args->game.share_name = argv[++i];
+        } else if (strncmp(argv[i], "--games=", 8) == 0) {
+            games = argv[i] + 8;
+        } else if (strcmp(argv[i], "--games") == 0 && i + 1 < argc) {
+            games = argv[++i];
+        } else if (strncmp(argv[i], "--threads=", 10) == 0) {
+            threads = argv[i] + 10;
+        } else if (strcmp(argv[i], "--threads") == 0 && i + 1 < argc) {
+            threads = argv[++i];
+        } else if (args->libname == NULL) {
+            args->libname = argv[i];
+        } else {
+            printf("Unexpected argument '%s'\n", argv[i]);
+            return false;
+        }
+    }
+
+    if (clock && !slabes_configure_clock(&args->clock, clock)) {
+        printf("Invalid clock '%s', expected real, virtual or a speed multiplier like x10\n", clock);
+        return false;
+    }
+    if (size && !slabes_parse_field_size(size, &args->game.field_width, &args->game.field_height)) {
+        printf("Invalid field size '%s', expected a side like 10 or WIDTHxHEIGHT like 30x61, at most %lu cells\n", size, (unsigned long)FIELD_MAX_CELLS);
+        return false;
+    }
+    if (maze && !maze_generator_from_name(maze, &args->game.maze_generator)) {
+        printf("Unknown maze generator '%s', expected one of:", maze);
+        for (size_t i = 0; i < MazeGeneratorCount; ++i) {
+            printf(" %s", maze_generator_name(i));
+        }
+        printf("\n");
+        return false;
+    }
+    if (seed) {
+        if (!slabes_parse_seed(seed, &args->game.seed)) {
+            printf("Invalid seed '%s', expected a non-negative integer\n", seed);
+            return false;
+        }
+        args->game.seeded = true;
+    }
+    if (max_robot_ops && !slabes_parse_count(max_robot_ops, &args->budget.max_robot_ops)) {
+        printf("Invalid robot operation limit '%s', expected a non-negative integer\n", max_robot_ops);
+        return false;
+    }
+    if (max_iterations && !slabes_parse_count(max_iterations, &args->budget.max_iterations)) {
+        printf("Invalid loop iteration limit '%s', expected a non-negative integer\n", max_iterations);
+        return false;
+    }
+    if (time_limit && !slabes_parse_seconds(time_limit, &args->budget.time_limit)) {
+        printf("Invalid time limit '%s', expected a positive number of seconds\n", time_limit);
+        return false;
+    }
+    if (cycle_limit) {
+        uint64_t limit = 0;
+        if (!slabes_parse_count(cycle_limit, &limit) || limit < 2 || limit > UINT32_MAX) {
+            printf("Invalid cycle limit '%s', expected how many times a state may repeat, at least 2\n", cycle_limit);
+            return false;
+        }
+        args->game.cycle_limit = limit;
+    }
+    if (display_fps) {
+        uint64_t fps = 0;
+        if (!slabes_parse_count(display_fps, &fps) || fps > SLABES_MAX_DISPLAY_FPS) {
+            printf("Invalid display frame rate '%s', expected frames per second up to %d or 0 to draw every update\n", display_fps, SLABES_MAX_DISPLAY_FPS);
+            return false;
+        }
+        args->game.display_fps = fps;
+    }
+    if (games && (!slabes_parse_count(games, &args->games) || args->games == 0 || args->games - 1 > UINT64_MAX - args->game.seed)) {
+        printf("Invalid number of games '%s', expected a positive integer\n", games);
+        return false;
+    }
+    if (threads && (!slabes_parse_count(threads, &args->threads) || args->threads == 0)) {
+        printf("Invalid number of threads '%s', expected a positive integer\n", threads);
+        return false;
+    }
+    if (args->games && (args->libname || args->telemetry || args->heatmap || args->game.trace_file || args->game.share_name)) {
+        printf("The games of --games run headless and without --telemetry, --heatmap, --trace and --share\n");
+        return false;
+    }
+    // the distinct cells are in the result line too
+    args->game.count_visits = args->report || args->telemetry || args->heatmap || args->games;
+    return true;
+}
+
+// the wall clock is looked at once per this many robot commands (with the virtual clock) or loop iterations
+#define SLABES_TIME_CHECK_INTERVAL 4096
+
+uint64_t slabes_now_ns() {
+    struct timespec ts;
+    timespec_get(&ts, TIME_UTC);
+    return (uint64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
+}
+
+static void slabes_schedule_budget_check(SlabesContext *context) {
+    context->robot_op_check = context->budget.max_robot_ops;
+    context->iteration_check = context->budget.max_iterations;
+    if (context->deadline_ns) {
+        // the other clocks sleep in every robot command, so looking at the time there too is nothing
+        uint64_t robot_op_interval = (context->clock.mode == SlabesClockVirtual)? SLABES_TIME_CHECK_INTERVAL : 1;
+        // the counters go over the checks on the interval-th command or iteration from now
+        context->robot_op_check = min(context->robot_op_check, context->robot_ops + robot_op_interval - 1);
+        context->iteration_check = min(context->iteration_check, context->iterations + SLABES_TIME_CHECK_INTERVAL - 1);
+    }
+}
+
+static void slabes_stop(SlabesContext *context, SlabesStopReason reason) {
+    context->stop_reason = reason;
+    longjmp(context->stop, 1);
+}
+
+void slabes_check_budget(SlabesContext *context) {
+    if (context->robot_ops > context->budget.max_robot_ops) {
+        --context->robot_ops;  // the command is not executed
+        slabes_stop(context, SlabesRobotOpsExhausted);
+    }
+    if (context->iterations > context->budget.max_iterations) {
+        --context->iterations;  // the iteration is not run
+        slabes_stop(context, SlabesIterationsExhausted);
+    }
+    if (context->deadline_ns && slabes_now_ns() >= context->deadline_ns) {
+        slabes_stop(context, SlabesTimeLimitReached);
+    }
+    slabes_schedule_budget_check(context);
+}
+
+SlabesStopReason slabes_run(SlabesContext *context, void (*entry)(SlabesContext *context, void *data), void *data) {
+    context->deadline_ns = (context->budget.time_limit > 0)? slabes_now_ns() + (uint64_t)(context->budget.time_limit * 1e9) : 0;
+    context->stop_reason = SlabesCompleted;
+    slabes_schedule_budget_check(context);
+    if (setjmp(context->stop) == 0) {
+        entry(context, data);
+    }
+    return context->stop_reason;
+}
+
+void slabes_clock_advance(SlabesClock *state, uint64_t milliseconds) {
+    state->now_ms += milliseconds;
+    if (state->mode == SlabesClockVirtual) {
+        return;
+    }
+    slabes_sleep_us(milliseconds * 1000 / state->speed);
+}
+
+uint64_t slabes_clock_now_ms(SlabesClock *state) {
+    return state->now_ms;
+}
+
+// on stderr, so the output of the program does not depend on the clock
+void slabes_report_clock(SlabesClock *state) {
+    if (state->mode == SlabesClockVirtual) {
+        fprintf(stderr, "Simulated time: %.1fs\n", slabes_clock_now_ms(state) / 1000.0);
+    }
+}
+
+static const char *SLABES_STOP_REASON_NAMES[] = {
+    [SlabesRobotOpsExhausted] = "robot_ops_exhausted",
+    [SlabesIterationsExhausted] = "iterations_exhausted",
+    [SlabesTimeLimitReached] = "time_limit",
+    [SlabesCycleDetected] = "cycle",
+};
+
+static const char *slabes_status(SlabesContext *context) {
+    Game *game = &context->game;
+    if (context->stop_reason != SlabesCompleted) {
+        return SLABES_STOP_REASON_NAMES[context->stop_reason];
+    }
+    // without a maze the finish is nowhere, not at (0, 0) where the player starts
+    bool finished = game->has_finish && game->player_position.x == game->finish_position.x && game->player_position.y == game->finish_position.y;
+    return finished? "finished" : "stopped";
+}
+
+// distinct_cells is left out when the visits aren't counted
+void slabes_format_result(SlabesContext *context, char *buffer, size_t size) {
+    Game *game = &context->game;
+    int length = snprintf(
+        buffer, size, "status=%s steps=%" PRIu64 " robot_ops=%" PRIu64 " iterations=%" PRIu64 " x=%zu y=%zu simulated_ms=%" PRIu64
+        " cycle_length=%" PRIu64 " wall_bumps=%" PRIu64,
+        slabes_status(context), context->steps, context->robot_ops, context->iterations,
+        game->player_position.x, game->player_position.y, slabes_clock_now_ms(&context->clock), game->states.cycle_length,
+        game->telemetry.wall_bumps
+    );
+    if (game->telemetry.visits && length >= 0 && (size_t)length < size) {
+        snprintf(buffer + length, size - length, " distinct_cells=%" PRIu64, game->telemetry.distinct_cells);
+    }
+}
+
+// one line of key=value pairs on stderr for the tools running many games, see slabes/bench_run.py
+void slabes_report_result(SlabesContext *context) {
+    char result[SLABES_RESULT_MAX];
+    slabes_format_result(context, result, sizeof(result));
+    fprintf(stderr, "slabes-result %s\n", result);
+}
+
+static const char *SLABES_ROBOT_OP_NAMES[] = {
+    [RobotGo] = "go",
+    [RobotRl] = "rl",
+    [RobotRr] = "rr",
+    [RobotSonar] = "sonar",
+    [RobotCompass] = "compass",
+};
+
+static void slabes_write_json_string(FILE *file, const char *text) {
+    fputc('"', file);
+    for (; *text; ++text) {
+        unsigned char c = *text;
+        if (c == '"' || c == '\\') {
+            fprintf(file, "\\%c", c);
+        } else if (c < 0x20) {
+            fprintf(file, "\\u%04x", c);
+        } else {
+            fputc(c, file);
+        }
+    }
+    fputc('"', file);
+}
+
+static bool slabes_write_telemetry(SlabesContext *context, const char *path, const char *heatmap) {
+    Game *game = &context->game;
+    Telemetry *telemetry = &game->telemetry;
+    FILE *file = fopen(path, "w");
+    if (!file) {
+        printf("Failed to save %s: %s\n", path, strerror(errno));
+        return false;
+    }
+
+    fprintf(file, "{\n    \"status\": \"%s\",\n", slabes_status(context));
+    fprintf(file, "    \"robot_ops\": %" PRIu64 ",\n    \"ops\": {", context->robot_ops);
+    for (size_t i = 0; i < RobotOpCount; ++i) {
+        fprintf(file, "%s\"%s\": %" PRIu64, i? ", " : "", SLABES_ROBOT_OP_NAMES[i], telemetry->ops[i]);
+    }
+    fprintf(file, "},\n");
+    fprintf(file, "    \"steps\": %" PRIu64 ",\n", context->steps);
+    fprintf(file, "    \"wall_bumps\": %" PRIu64 ",\n", telemetry->wall_bumps);
+    if (telemetry->visits) {
+        fprintf(file, "    \"distinct_cells\": %" PRIu64 ",\n", telemetry->distinct_cells);
+    } else {
+        fprintf(file, "    \"distinct_cells\": null,\n");
+    }
+    fprintf(file, "    \"iterations\": %" PRIu64 ",\n", context->iterations);
+    fprintf(file, "    \"simulated_ms\": %" PRIu64 ",\n", slabes_clock_now_ms(&context->clock));
+    fprintf(file, "    \"cycle_length\": %" PRIu64 ",\n", game->states.cycle_length);
+    fprintf(file, "    \"width\": %zu,\n    \"height\": %zu,\n", game->field.width, game->field.height);
+    fprintf(file, "    \"player\": [%zu, %zu],\n", game->player_position.x, game->player_position.y);
+    if (game->has_finish) {
+        fprintf(file, "    \"finish\": [%zu, %zu],\n", game->finish_position.x, game->finish_position.y);
+    } else {
+        fprintf(file, "    \"finish\": null,\n");
+    }
+    fprintf(file, "    \"heatmap\": ");
+    if (heatmap) {
+        slabes_write_json_string(file, heatmap);
+    } else {
+        fprintf(file, "null");
+    }
+    fprintf(file, "\n}\n");
+
+    bool ok = !ferror(file);
+    ok = (fclose(file) == 0) && ok;
+    if (!ok) {
+        printf("Failed to save %s\n", path);
+    }
+    return ok;
+}
+
+// the exit hook of the program, writes --telemetry and --heatmap (the heatmap first, the summary names it)
+// and ends the --trace
+bool slabes_save_telemetry(SlabesContext *context, SlabesArgs *args) {
+    bool ok = game_stop_trace(&context->game);
+    bool heatmap_saved = false;
+    if (args->heatmap) {
+        heatmap_saved = game_save_heatmap(&context->game, args->heatmap);
+        ok = heatmap_saved && ok;
+    }
+    if (args->telemetry) {
+        ok = slabes_write_telemetry(context, args->telemetry, heatmap_saved? args->heatmap : NULL) && ok;
+    }
+    return ok;
+}
+
+static uint64_t slabes_cpu_count() {
+#ifdef _WIN32
+    SYSTEM_INFO info;
+    GetSystemInfo(&info);
+    return info.dwNumberOfProcessors;
+#elif __unix__
+    long count = sysconf(_SC_NPROCESSORS_ONLN);
+    return (count > 0)? count : 1;
+#else
+    return 1;
+#endif
+}
+
+void slabes_printf(SlabesContext *context, const char *format, ...) {
+    va_list list;
+    va_start(list, format);
+    SlabesOutput *output = context->output;
+    if (!output) {
+        vprintf(format, list);
+        va_end(list);
+        return;
+    }
+    va_list copy;
+    va_copy(copy, list);
+    int length = vsnprintf(NULL, 0, format, copy);
+    va_end(copy);
+    if (length > 0) {
+        size_t needed = output->size + length + 1;
+        if (needed > output->capacity) {
+            size_t capacity = max(output->capacity * 2, needed);
+            char *data = (char *)SLABES_MALLOC(capacity);
+            if (output->data) {
+                memcpy(data, output->data, output->size);
+                SLABES_FREE(output->data);
+            }
+            output->data = data;
+            output->capacity = capacity;
+        }
+        vsnprintf(output->data + output->size, length + 1, format, list);
+        output->size += length;
+    }
+    va_end(list);
+}
+
+// the games of slabes_run_games, the threads take the next one until none are left
+typedef struct {
+    SlabesArgs *args;
+    void (*entry)(SlabesContext *context, void *data);
+    void *data;
+    _Atomic uint64_t next;
+    char (*results)[SLABES_RESULT_MAX];  // the result line of every game
+    atomic_bool stopped;  // a game went over its budget
+    atomic_bool failed;  // a game could not be set up
+
+    pthread_mutex_t lock;  // of the outputs
+    SlabesOutput *outputs;  // of the games that are over but not printed yet
+    bool *over;
+    uint64_t printed;  // the games before this one have printed their output
+} SlabesGames;
+
+// the game is over, its output and the ones of the games after it that waited for it are printed
+static void slabes_games_print(SlabesGames *games, uint64_t game, SlabesOutput *output) {
+    pthread_mutex_lock(&games->lock);
+    games->outputs[game] = *output;
+    games->over[game] = true;
+    for (; games->printed < games->args->games && games->over[games->printed]; ++games->printed) {
+        SlabesOutput *it = &games->outputs[games->printed];
+        if (it->data) {
+            fwrite(it->data, 1, it->size, stdout);
+            SLABES_FREE(it->data);
+        }
+        *it = (SlabesOutput){0};
+    }
+    pthread_mutex_unlock(&games->lock);
+}
+
+static void *slabes_run_games_thread(void *data) {
+    SlabesGames *games = data;
+    SlabesArgs *args = games->args;
+    for (uint64_t i = atomic_fetch_add(&games->next, 1); i < args->games; i = atomic_fetch_add(&games->next, 1)) {
+        GameOptions options = args->game;
+        options.seed += i;
+        options.seeded = true;
+
+        SlabesOutput output = {0};
+        SlabesContext context = {.clock = args->clock, .budget = args->budget, .output = &output};
+        if (!game_setup(&context.game, NULL, &options)) {
+            snprintf(games->results[i], SLABES_RESULT_MAX, "status=failed");
+            atomic_store(&games->failed, true);
+            game_cleanup(&context.game);
+            slabes_games_print(games, i, &output);
+            continue;
+        }
+        game_update_display(&context.game);
+        ROBOT_OP_DELAY(&context);
+        if (slabes_run(&context, games->entry, games->data) != SlabesCompleted) {
+            atomic_store(&games->stopped, true);
+        }
+        slabes_format_result(&context, games->results[i], SLABES_RESULT_MAX);
+        game_cleanup(&context.game);
+        slabes_games_print(games, i, &output);
+    }
+    return NULL;
+}
+
+int slabes_run_games(SlabesArgs *args, void (*entry)(SlabesContext *context, void *data), void *data) {
+    SlabesGames games = {.args = args, .entry = entry, .data = data};
+    games.results = (char (*)[SLABES_RESULT_MAX])SLABES_MALLOC(SLABES_RESULT_MAX * args->games);
+    games.outputs = (SlabesOutput *)SLABES_MALLOC(sizeof(SlabesOutput) * args->games);
+    memset(games.outputs, 0, sizeof(SlabesOutput) * args->games);
+    games.over = (bool *)SLABES_MALLOC(sizeof(bool) * args->games);
+    memset(games.over, 0, sizeof(bool) * args->games);
+    pthread_mutex_init(&games.lock, NULL);
+    uint64_t thread_count = min(args->threads? args->threads : slabes_cpu_count(), args->games);
+    pthread_t *threads = (pthread_t *)SLABES_MALLOC(sizeof(pthread_t) * thread_count);
+
+    uint64_t started = 0;
+    for (; started < thread_count; ++started) {
+        if (pthread_create(&threads[started], NULL, slabes_run_games_thread, &games) != 0) {
+            break;
+        }
+    }
+    if (started == 0) {
+        slabes_run_games_thread(&games);  // no threads to spare, the games run on this one
+    }
+    for (uint64_t i = 0; i < started; ++i) {
+        pthread_join(threads[i], NULL);
+    }
+
+    for (uint64_t i = 0; i < args->games; ++i) {
+        fprintf(stderr, "slabes-result seed=%" PRIu64 " %s\n", args->game.seed + i, games.results[i]);
+    }
+    fflush(stdout);  // before the result lines on stderr
+    pthread_mutex_destroy(&games.lock);
+    SLABES_FREE(games.over);
+    SLABES_FREE(games.outputs);
+    SLABES_FREE(threads);
+    SLABES_FREE(games.results);
+    if (atomic_load(&games.failed)) {
+        return EXIT_FAILURE;
+    }
+    return atomic_load(&games.stopped)? SLABES_EXIT_BUDGET : 0;
+}
+
+#if __has_include(<stdckdint.h>)
+# include <stdckdint.h>
+#elif defined(__GNUC__)  /*gcc and clagn have this*/
+#  define ckd_add(R, A, B) __builtin_add_overflow ((A), (B), (R))
+#  define ckd_sub(R, A, B) __builtin_sub_overflow ((A), (B), (R))
+#  define ckd_mul(R, A, B) __builtin_mul_overflow ((A), (B), (R))
+#else
+#  define ckd_add(R, A, B) (
+    (((B) > 0 && (A) > INT_MAX - (B)) || ((B) < 0 && (A) < INT_MIN - (B))) ?
+    true : ((*(R) = (A) + (B)), false)
+)
+#  define ckd_sub(R, A, B) (
+    (((B) < 0 && (A) > INT_MAX + (B)) || ((B) > 0 && (A) < INT_MIN + (B))) ?
+    true : ((*(R) = (A) + (B)), false)
+)
+// #define ckd_mul(R, A, B) __builtin_mul_overflow ((A), (B), (R))
+// // There may be a need to check for -1 for two's complement machines.
+// // If one number is -1 and another is INT_MIN, multiplying them we get abs(INT_MIN) which is 1 higher than INT_MAX
+// if (a == -1 && x == INT_MIN) // `a * x` can overflow
+// if (x == -1 && a == INT_MIN) // `a * x` (or `a / x`) can overflow
+// // general case
+// if (x != 0 && a > INT_MAX / x) // `a * x` would overflow
+// if (x != 0 && a < INT_MIN / x) // `a * x` would underflow
+#endif
+
+#define BYTE_TO_BINARY_PATTERN "%c%c%c%c%c%c%c%c"
+#define BYTE_TO_BINARY(byte)  \
+  ((byte) & 0x80 ? '1' : '0'), \
+  ((byte) & 0x40 ? '1' : '0'), \
+  ((byte) & 0x20 ? '1' : '0'), \
+  ((byte) & 0x10 ? '1' : '0'), \
+  ((byte) & 0x08 ? '1' : '0'), \
+  ((byte) & 0x04 ? '1' : '0'), \
+  ((byte) & 0x02 ? '1' : '0'), \
+  ((byte) & 0x01 ? '1' : '0') 
+
+
+/*types*/
+/*ops*/
+/*conv*/
+
+// after the player moved or turned
+static void slabes_check_cycle(SlabesContext *context) {
+    if (context->game.states.cycle_length) {
+        slabes_stop(context, SlabesCycleDetected);
+    }
+}
+
+slabes_type_unsigned_tiny slabes_func___robot_command_go(SlabesContext *context) {
+    SLABES_ROBOT_OP_TICK(context);
+    ROBOT_OP_DELAY(context);
+    ++context->game.telemetry.ops[RobotGo];
+    bool moved = game_make_player_take_one_step(&context->game);
+    game_trace_op(&context->game, RobotGo, moved);
+    if (moved) {
+        ++context->steps;
+        game_update_display(&context->game);
+    }
+    slabes_check_cycle(context);
+    return moved;
+}
+
+slabes_type_unsigned_tiny slabes_func___robot_command_rl(SlabesContext *context) {
+    SLABES_ROBOT_OP_TICK(context);
+    ROBOT_OP_DELAY(context);
+    Game *game = &context->game;
+    ++game->telemetry.ops[RobotRl];
+    game_turn_player(game, left_rotated_direction(game->player_direction));
+    game_trace_op(game, RobotRl, 0);
+    game_update_display(game);
+    slabes_check_cycle(context);
+    return 1;
+}
+
+slabes_type_unsigned_tiny slabes_func___robot_command_rr(SlabesContext *context) {
+    SLABES_ROBOT_OP_TICK(context);
+    ROBOT_OP_DELAY(context);
+    Game *game = &context->game;
+    ++game->telemetry.ops[RobotRr];
+    game_turn_player(game, right_rotated_direction(game->player_direction));
+    game_trace_op(game, RobotRr, 0);
+    game_update_display(game);
+    slabes_check_cycle(context);
+    return 1;
+}
+
+slabes_type_unsigned_small slabes_func___robot_command_sonar(SlabesContext *context) {
+    SLABES_ROBOT_OP_TICK(context);
+    ROBOT_OP_DELAY(context);
+    Game *game = &context->game;
+    ++game->telemetry.ops[RobotSonar];
+    Position position = game->player_position;
+    Direction direction = game->player_direction;
+    Direction rev_dir = reverse_direction(direction);
+    Walls walls = field_checked_get_walls(&game->field, position.x, position.y);
+    slabes_type_unsigned_small result = 0;
+    size_t offset = direction_to_index(direction);
+    offset += DirectionCount - 2;  // -2 since we start from relative 120 degrees, not 0
+    for (size_t i = 0; i < DirectionCount; ++i) {
+        Direction cur_dir = 1 << ((i + offset) % DirectionCount);
+        if (cur_dir == rev_dir) continue;
+        if (!(walls & cur_dir)) result |= 1 << i;
+    }
+#ifdef SLABES_DEBUG_OP
+    printf("sonar: "BYTE_TO_BINARY_PATTERN"\n", BYTE_TO_BINARY(result));
+#endif
+    game->states.last_sonar = result;  // part of the state of the next move or turn
+    game_trace_op(game, RobotSonar, result);
+    return result;
+}
+
+slabes_type_unsigned_tiny slabes_func___robot_command_compass(SlabesContext *context) {
+    SLABES_ROBOT_OP_TICK(context);
+    ROBOT_OP_DELAY(context);
+    ++context->game.telemetry.ops[RobotCompass];
+    Position player = context->game.player_position;
+    Position finish = context->game.finish_position;
+    bool at_finish = (player.x == finish.x) && (player.y == finish.y);
+    game_trace_op(&context->game, RobotCompass, at_finish);
+    return at_finish;
+}
+
+slabes_type_unsigned_tiny slabes_func___generate_maze(SlabesContext *context) {
+    game_generate_a_maze(&context->game);
+    game_update_display(&context->game);
+    return 1;
+}
+
+slabes_type_unsigned_tiny slabes_assert(slabes_type_unsigned_tiny value, const char *msg) {
+    if (!value) {
+        printf("Assertion failed: %s\n", msg);
+        exit(1);
+    }
+    return value;
+}
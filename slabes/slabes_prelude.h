@@ -0,0 +1,151 @@
+#define min(a, b) (((a) < (b))? (a) : (b))
+#define max(a, b) (((a) > (b))? (a) : (b))
+
+#include <stdio.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <limits.h>
+#include <setjmp.h>
+
+#include "libslabes/slabes.h"
+
+// #define SLABES_DEBUG_OP
+
+// simulated duration of one robot operation
+#define ROBOT_OP_MS 100
+
+typedef enum {
+    SlabesClockRealTime,
+    SlabesClockScaled,  // real time sped up by the speed multiplier
+    SlabesClockVirtual,  // no sleeps, only the simulated time advances
+} SlabesClockMode;
+
+typedef struct {
+    SlabesClockMode mode;
+    double speed;
+    uint64_t now_ms;  // simulated time, every robot operation advances it
+} SlabesClock;
+
+bool slabes_configure_clock(SlabesClock *clock, const char *spec);
+
+// limits of one run, a program going over them is stopped, see slabes_run
+typedef struct {
+    uint64_t max_robot_ops;  // UINT64_MAX for no limit
+    uint64_t max_iterations;  // of all the loops together, UINT64_MAX for no limit
+    double time_limit;  // wall clock seconds, 0 for no limit
+} SlabesBudget;
+
+typedef struct {
+    char *libname;  // display library, NULL to run without one
+    GameOptions game;
+    SlabesClock clock;
+    SlabesBudget budget;
+    bool report;  // print the result line at the end, see slabes_report_result
+    const char *telemetry;  // JSON summary of the run written at the end, NULL for none
+    const char *heatmap;  // the visits of every cell written at the end, NULL for none
+    uint64_t games;  // headless games run by slabes_run_games, 0 to run the one game as usual
+    uint64_t threads;  // running the games at once, 0 for one per core
+} SlabesArgs;
+
+bool slabes_parse_args(int argc, char *argv[], SlabesArgs *args);
+
+// one run of the program, every function of the program gets it as the first argument,
+// so independent runs can go on concurrently in one process
+typedef enum {
+    SlabesCompleted,  // the program returned from main
+    SlabesRobotOpsExhausted,
+    SlabesIterationsExhausted,
+    SlabesTimeLimitReached,
+    SlabesCycleDetected,  // see StateTracker
+} SlabesStopReason;
+
+// exit code of a program stopped by its budget or in a cycle
+#define SLABES_EXIT_BUDGET 3
+
+// what a game of --games prints, kept until the games of the seeds before it have printed theirs
+typedef struct {
+    char *data;
+    size_t size, capacity;
+} SlabesOutput;
+
+typedef struct {
+    Game game;
+    SlabesClock clock;
+    SlabesBudget budget;
+    uint64_t robot_ops;  // robot commands executed
+    uint64_t steps;  // successful go commands
+    uint64_t iterations;  // loop iterations
+    // slabes_check_budget is called when a counter goes over its check,
+    // they are the limits themselves unless the time has to be looked at too
+    uint64_t robot_op_check, iteration_check;
+    uint64_t deadline_ns;  // 0 without the time limit
+    SlabesStopReason stop_reason;
+    jmp_buf stop;
+    SlabesOutput *output;  // NULL to print straight to stdout
+} SlabesContext;
+
+// printf of the program, into the output of the context when it has one
+void slabes_printf(SlabesContext *context, const char *format, ...);
+
+// runs entry(context, data) with the budget of the context,
+// going over it jumps back out of the program (without freeing its matrices)
+SlabesStopReason slabes_run(SlabesContext *context, void (*entry)(SlabesContext *context, void *data), void *data);
+
+void slabes_check_budget(SlabesContext *context);
+
+// before every robot command and at the end of every loop iteration
+#define SLABES_ROBOT_OP_TICK(context) if (++(context)->robot_ops > (context)->robot_op_check) slabes_check_budget(context)
+#define SLABES_LOOP_TICK(context) if (++(context)->iterations > (context)->iteration_check) slabes_check_budget(context)
+
+void slabes_clock_advance(SlabesClock *clock, uint64_t milliseconds);
+
+uint64_t slabes_clock_now_ms(SlabesClock *clock);
+
+void slabes_report_clock(SlabesClock *clock);
+
+// the longest result line, see slabes_format_result
+#define SLABES_RESULT_MAX 512
+
+// the key=value pairs of the result line of a finished run
+void slabes_format_result(SlabesContext *context, char *buffer, size_t size);
+
+void slabes_report_result(SlabesContext *context);
+
+// --games=N runs N headless games with the seeds from --seed (0 by default) on, --threads=M of them at once,
+// every game in a context of its own. What the games print comes out in the order of the seeds, as if they
+// ran one after another, then the result line of every game with its seed. Returns the exit code of the program
+int slabes_run_games(SlabesArgs *args, void (*entry)(SlabesContext *context, void *data), void *data);
+
+bool slabes_save_telemetry(SlabesContext *context, SlabesArgs *args);
+
+#ifndef NO_DELAY_ON_ROBOT_OP
+#define ROBOT_OP_DELAY(context) slabes_clock_advance(&(context)->clock, ROBOT_OP_MS)
+#else
+#define ROBOT_OP_DELAY(context)
+#endif
+
+typedef bool unsigned_bool;
+typedef unsigned char unsigned_char;
+typedef unsigned short unsigned_short;
+
+typedef uint8_t unsigned_int8_t;
+typedef uint16_t unsigned_int16_t;
+
+
+/*types*/
+/*ops*/
+/*conv*/
+
+slabes_type_unsigned_tiny slabes_func___robot_command_go(SlabesContext *context);
+
+slabes_type_unsigned_tiny slabes_func___robot_command_rl(SlabesContext *context);
+
+slabes_type_unsigned_tiny slabes_func___robot_command_rr(SlabesContext *context);
+
+slabes_type_unsigned_small slabes_func___robot_command_sonar(SlabesContext *context);
+
+slabes_type_unsigned_tiny slabes_func___robot_command_compass(SlabesContext *context);
+
+slabes_type_unsigned_tiny slabes_func___generate_maze(SlabesContext *context);
+
+slabes_type_unsigned_tiny slabes_assert(slabes_type_unsigned_tiny value, const char *msg);
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import tracemalloc
+import dataclasses
+
+from pathlib import Path
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+from typing import Iterator
+
+
+@dataclass
+class Phase:
+    name: str
+    start: float  # seconds since the report was created
+    duration: float = 0.0
+    peak_memory: int = 0  # bytes, only known when the memory is traced
+    args: dict[str, object] = field(default_factory=dict)
+
+
+@dataclass
+class TimeReport:
+    """
+    Wall time and peak memory of the compiler phases, plus assorted counters.
+    Does nothing unless enabled, so it can be passed around unconditionally.
+    The peak memory is only measured with trace_memory, tracemalloc makes
+    the phases several times slower and their times say little then.
+    """
+
+    enabled: bool = False
+    trace_memory: bool = False
+
+    phases: list[Phase] = field(default_factory=list)
+    counters: dict[str, int] = field(default_factory=dict)
+
+    origin: float = field(default_factory=time.perf_counter)
+
+    @contextmanager
+    def phase(self, name: str, **args: object) -> Iterator[Phase | None]:
+        if not self.enabled:
+            yield None
+            return
+
+        if self.trace_memory:
+            # memory allocated before the first phase is not accounted for
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        phase = Phase(name, time.perf_counter() - self.origin, args=dict(args))
+        self.phases.append(phase)
+        try:
+            yield phase
+        finally:
+            phase.duration = time.perf_counter() - self.origin - phase.start
+            if self.trace_memory:
+                phase.peak_memory = tracemalloc.get_traced_memory()[1]
+
+    def count(self, name: str, value: int) -> None:
+        if self.enabled:
+            self.counters[name] = value
+
+    @property
+    def peak_memory(self) -> int:
+        return max((it.peak_memory for it in self.phases), default=0)
+
+    def print(self) -> None:
+        if self.trace_memory:
+            print("time and peak memory (with memory tracing, the times include its overhead)")
+        else:
+            print("time (without memory tracing)")
+        width = max([len("phase")] + [len(it.name) for it in self.phases])
+        memory = f" {'peak memory':>12}" if self.trace_memory else ""
+        print(f"{'phase':<{width}} {'time':>10}{memory}")
+        for it in self.phases:
+            memory = f" {format_size(it.peak_memory):>12}" if self.trace_memory else ""
+            print(f"{it.name:<{width}} {it.duration * 1000:>8.2f}ms{memory}")
+        total = sum(it.duration for it in self.phases)
+        memory = f" {format_size(self.peak_memory):>12}" if self.trace_memory else ""
+        print(f"{'total':<{width}} {total * 1000:>8.2f}ms{memory}")
+
+        if self.counters:
+            width = max(len(it) for it in self.counters)
+            for name, value in self.counters.items():
+                print(f"{name:<{width}} {value:>10}")
+
+    def trace_events(self, tid: int = 0, label: str = "slabes") -> list[dict[str, object]]:
+        pid = os.getpid()
+        events: list[dict[str, object]] = [{
+            "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+            "args": {"name": label, "memory_traced": self.trace_memory},
+        }]
+        for it in self.phases:
+            args = dict(it.args)
+            if self.trace_memory:
+                args["peak_memory"] = it.peak_memory
+            events.append({
+                "name": it.name, "cat": "compiler", "ph": "X", "pid": pid, "tid": tid,
+                "ts": it.start * 1e6, "dur": it.duration * 1e6, "args": args,
+            })
+        if self.counters:
+            events.append({
+                "name": "counters", "ph": "i", "s": "t", "pid": pid, "tid": tid,
+                "ts": self.phases[-1].start * 1e6 if self.phases else 0, "args": dict(self.counters),
+            })
+        return events
+
+
+def write_chrome_trace(path: Path, reports: dict[str, TimeReport]) -> None:
+    """
+    Write the reports (label -> report) in the trace event format,
+    it can be opened in chrome://tracing or ui.perfetto.dev.
+    Every report gets its own row in the timeline.
+    """
+
+    events = []
+    for tid, (label, report) in enumerate(reports.items()):
+        events.extend(report.trace_events(tid, label))
+    path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), "utf-8")
+
+
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size}B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f}KiB"
+    return f"{size / (1024 * 1024):.1f}MiB"
+
+
+def count_nodes(root: object, cls: type) -> int:
+    """Number of distinct instances of cls reachable from root through dataclass fields and containers"""
+
+    seen: set[int] = set()
+    count = 0
+    stack = [root]
+    while stack:
+        it = stack.pop()
+        if id(it) in seen:
+            continue
+        seen.add(id(it))
+
+        if isinstance(it, cls):
+            count += 1
+        if isinstance(it, (list, tuple, set)):
+            stack.extend(it)
+        elif isinstance(it, dict):
+            stack.extend(it.values())
+        elif dataclasses.is_dataclass(it) and not isinstance(it, type):
+            stack.extend(getattr(it, f.name, None) for f in dataclasses.fields(it))
+    return count
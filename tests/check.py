@@ -0,0 +1,329 @@
+"""
+Regression checks of the backends and the runtime, they compile
+the programs of tests/compile and need a c compiler and libltdl.
+
+    python tests/check.py [--cc CC] [NAME...]
+
+Every check prints ok or what went wrong, the exit code is 1 if any failed.
+"""
+
+from __future__ import annotations
+
+import sys
+import argparse
+import tempfile
+import subprocess
+
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+
+from slabes.main import Config, front_end, compile_program, compile_vm  # noqa: E402
+from slabes.bytecode import generate_bytecode  # noqa: E402
+from slabes.bench_run import EXIT_BUDGET, parse_result_line  # noqa: E402
+
+
+PROGRAMS = sorted((ROOT / "tests" / "compile").glob("*.slb"))
+
+MAZE_SOLVER = ROOT / "tests" / "compile" / "maze_solver.slb"
+
+SEED = 3
+SIZE = "12"
+
+# the same maze on every backend, robot commands don't wait
+PROGRAM_ARGS = [f"--seed={SEED}", f"--size={SIZE}", "--clock=virtual"]
+
+TIMEOUT = 60.0  # seconds a program may run
+
+# turns on the spot forever, only a budget or the cycle detector stops it
+SPINNER = """big main begin
+    generate_maze(),
+    tiny forever << 0,
+    until forever do
+        rr,
+    .,
+. end,
+.
+"""
+
+# prints what the sonar sees on a walk through the maze, something else for every seed
+WALKER = """big main begin
+    generate_maze(),
+    big count << 0,
+    until count => 40 do
+        print(sonar),
+        check go == 0 do rr.,
+        count << count + 1,
+    .,
+. end,
+.
+"""
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def expect(condition: bool, message: str) -> None:
+    if not condition:
+        raise CheckFailed(message)
+
+
+def result_of(process: subprocess.CompletedProcess[str]) -> dict[str, str]:
+    values = parse_result_line(process.stderr)
+    expect(values is not None, f"no result line, {describe(process)}")
+    return values
+
+
+def run(args: list[object]) -> subprocess.CompletedProcess[str]:
+    try:
+        return subprocess.run(
+            [str(it) for it in args], cwd=ROOT, stdin=subprocess.DEVNULL,
+            capture_output=True, encoding="utf-8", timeout=TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        raise CheckFailed(f"{Path(str(args[0])).name} ran for more than {TIMEOUT:g}s") from None
+
+
+def describe(process: subprocess.CompletedProcess[str]) -> str:
+    lines = (process.stdout + process.stderr).strip().splitlines()
+    return f"exit code {process.returncode}: " + " / ".join(lines[-3:])
+
+
+@dataclass
+class Checks:
+    out_dir: Path
+    cc: str
+    binaries: dict[Path, Path] = field(default_factory=dict)
+    tools: dict[str, Path] = field(default_factory=dict)
+    vm_path: Path | None = None
+
+    def config(self, path: Path) -> Config:
+        return Config(
+            str(path), self.out_dir / (path.stem + ".out"), self.out_dir / (path.stem + ".c"),
+            path.read_text("utf-8"), cc=self.cc,
+        )
+
+    def binary(self, path: Path) -> Path:
+        """The program compiled once for all the checks"""
+
+        if path not in self.binaries:
+            conf = self.config(path)
+            if compile_program(conf):
+                raise CheckFailed(f"failed to compile {path.name}")
+            self.binaries[path] = conf.bin_path
+        return self.binaries[path]
+
+    def tool(self, name: str) -> Path:
+        """A tool of libslabes, built like the Makefile does"""
+
+        if name not in self.tools:
+            path = self.out_dir / (name + ".out")
+            process = run([self.cc, "-O2", "-o", path, ROOT / "slabes" / "libslabes" / (name + ".c"), "-l", "ltdl", "-pthread"])
+            expect(process.returncode == 0, f"failed to compile {name}, {describe(process)}")
+            self.tools[name] = path
+        return self.tools[name]
+
+    def fixture(self, name: str, source: str) -> Path:
+        """A program of this file, compiled"""
+
+        path = self.out_dir / (name + ".slb")
+        if not path.exists():
+            path.write_text(source, "utf-8")
+        return self.binary(path)
+
+    def vm(self) -> Path:
+        if self.vm_path is None:
+            path = self.out_dir / "slabes_vm.out"
+            if not compile_vm(self.config(PROGRAMS[0]), path):
+                raise CheckFailed("failed to compile the vm")
+            self.vm_path = path
+        return self.vm_path
+
+    def bytecode(self, path: Path) -> Path:
+        conf = self.config(path)
+        result = self.out_dir / (path.stem + ".sbc")
+        result.write_bytes(generate_bytecode(conf.source, front_end(conf), conf.in_path).to_bytes())
+        return result
+
+
+def check_backends(checks: Checks) -> None:
+    """Every program prints the same on the vm and the python backend as compiled, all.slb asserts the integer arithmetic"""
+
+    for path in PROGRAMS:
+        outputs = {
+            "c": run([checks.binary(path), *PROGRAM_ARGS]),
+            "vm": run([checks.vm(), checks.bytecode(path), *PROGRAM_ARGS]),
+            "python": run([sys.executable, "-m", "slabes", "run", path, "--backend", "python", *PROGRAM_ARGS]),
+        }
+        for backend, process in outputs.items():
+            expect(process.returncode == 0, f"{path.name} failed on the {backend} backend, {describe(process)}")
+            expect(process.stdout == outputs["c"].stdout, f"{path.name} prints something else on the {backend} backend than compiled")
+
+
+def check_maze_file(checks: Checks) -> None:
+    """A saved maze runs like the generated one, converting it to text and back changes nothing"""
+
+    binary = checks.binary(MAZE_SOLVER)
+    saved = checks.out_dir / "saved.maze"
+    process = run([sys.executable, "-m", "slabes", "maze", "generate", saved, f"--size={SIZE}", "--maze=wilson", f"--seed={SEED}"])
+    expect(process.returncode == 0, f"slabes maze generate failed, {describe(process)}")
+
+    generated = run([binary, *PROGRAM_ARGS, "--maze=wilson", "--report"])
+    loaded = run([binary, f"--maze-file={saved}", "--clock=virtual", "--report"])
+    for process in (generated, loaded):
+        expect(process.returncode == 0, f"{MAZE_SOLVER.name} failed, {describe(process)}")
+    expect(loaded.stdout == generated.stdout, "the program prints something else on the saved maze")
+    expect(result_of(loaded) == result_of(generated), f"the saved maze gives {result_of(loaded)}, the generated one {result_of(generated)}")
+
+    text = checks.out_dir / "saved.txt"
+    back = checks.out_dir / "back.maze"
+    for source, target in ((saved, text), (text, back)):
+        process = run([sys.executable, "-m", "slabes", "maze", "convert", source, target])
+        expect(process.returncode == 0, f"slabes maze convert {source.name} {target.name} failed, {describe(process)}")
+    expect(back.read_bytes() == saved.read_bytes(), "the maze changed in the text format and back")
+
+
+def expect_stopped(process: subprocess.CompletedProcess[str], status: str) -> dict[str, str]:
+    values = result_of(process)
+    expect(values["status"] == status, f"the status is {values['status']}, expected {status}")
+    expect(process.returncode == EXIT_BUDGET, f"stopped by {status} with {describe(process)}, expected {EXIT_BUDGET}")
+    return values
+
+
+def check_budgets(checks: Checks) -> None:
+    """A run stops when a budget runs out, with exit code 3 and what it used, a budget the run fits in changes nothing"""
+
+    binary = checks.binary(MAZE_SOLVER)
+    full = run([binary, *PROGRAM_ARGS, "--report"])
+    expect(full.returncode == 0, f"{MAZE_SOLVER.name} failed, {describe(full)}")
+    used = result_of(full)
+
+    values = expect_stopped(run([binary, *PROGRAM_ARGS, "--max-robot-ops=50"]), "robot_ops_exhausted")
+    expect(values["robot_ops"] == "50", f"{values['robot_ops']} robot commands ran with --max-robot-ops=50")
+    values = expect_stopped(run([binary, *PROGRAM_ARGS, "--max-iterations=40"]), "iterations_exhausted")
+    expect(values["iterations"] == "40", f"{values['iterations']} iterations ran with --max-iterations=40")
+
+    fits = run([binary, *PROGRAM_ARGS, f"--max-robot-ops={used['robot_ops']}", "--report"])
+    expect(fits.returncode == 0, f"{MAZE_SOLVER.name} failed with a budget of exactly what it uses, {describe(fits)}")
+    expect(result_of(fits) == used, f"the budget of exactly what the run uses gives {result_of(fits)}, without one {used}")
+
+    expect_stopped(run([checks.fixture("spinner", SPINNER), *PROGRAM_ARGS, "--time-limit=0.2"]), "time_limit")
+
+
+def check_cycle(checks: Checks) -> None:
+    """The spinner is back in the same state after the six turns of a full circle, the detector stops it on the third visit"""
+
+    values = expect_stopped(run([checks.fixture("spinner", SPINNER), *PROGRAM_ARGS, "--cycle-limit=3", "--max-robot-ops=1000"]), "cycle")
+    expect(values["cycle_length"] == "6", f"the cycle is {values['cycle_length']} long, expected 6 turns")
+    expect(values["robot_ops"] == "13", f"the cycle was found after {values['robot_ops']} robot commands, expected 13")
+
+    process = run([checks.binary(MAZE_SOLVER), *PROGRAM_ARGS, "--cycle-limit=3", "--report"])
+    expect(process.returncode == 0, f"the detector stopped {MAZE_SOLVER.name}, {describe(process)}")
+
+
+def check_trace(checks: Checks) -> None:
+    """The trace of a run on a saved maze replays to the end, from the start and from the middle"""
+
+    saved = checks.out_dir / "trace.maze"
+    process = run([sys.executable, "-m", "slabes", "maze", "generate", saved, f"--size={SIZE}", f"--seed={SEED}"])
+    expect(process.returncode == 0, f"slabes maze generate failed, {describe(process)}")
+
+    trace = checks.out_dir / "run.trace"
+    process = run([checks.binary(MAZE_SOLVER), f"--maze-file={saved}", "--clock=virtual", f"--trace={trace}", "--report"])
+    expect(process.returncode == 0, f"{MAZE_SOLVER.name} failed, {describe(process)}")
+    robot_ops = int(result_of(process)["robot_ops"])
+
+    for step in (0, robot_ops // 2):
+        process = run([checks.tool("slabes_replay"), trace, "--speed=0", f"--step={step}"])
+        expect(process.returncode == 0, f"the trace doesn't replay from step {step}, {describe(process)}")
+        expect(f"Replayed {robot_ops} robot commands" in process.stdout, f"expected {robot_ops} robot commands replayed, {describe(process)}")
+
+
+def check_status(checks: Checks) -> None:
+    """A program that makes no maze has no finish to reach, it ends stopped and not finished"""
+
+    process = run([checks.binary(ROOT / "tests" / "compile" / "fibonacci_iter.slb"), *PROGRAM_ARGS, "--report"])
+    expect(process.returncode == 0, f"fibonacci_iter.slb failed, {describe(process)}")
+    status = result_of(process)["status"]
+    expect(status == "stopped", f"fibonacci_iter.slb ended {status}, expected stopped")
+
+    process = run([checks.binary(MAZE_SOLVER), *PROGRAM_ARGS, "--report"])
+    status = result_of(process)["status"]
+    expect(status == "finished", f"{MAZE_SOLVER.name} ended {status}, expected finished")
+
+
+def check_games(checks: Checks) -> None:
+    """--games prints what every game prints and its result in the order of the seeds, on any number of threads"""
+
+    binary = checks.fixture("walker", WALKER)
+    games = 32
+    separate_out, separate_results = "", []
+    for seed in range(games):
+        process = run([binary, f"--seed={seed}", f"--size={SIZE}", "--clock=virtual", "--report"])
+        expect(process.returncode == 0, f"walker.slb failed, {describe(process)}")
+        separate_out += "".join(line + "\n" for line in process.stdout.splitlines() if line not in ("Starting...", "Finishing..."))
+        separate_results.append(f"seed={seed} " + process.stderr.splitlines()[-1].removeprefix("slabes-result "))
+
+    for threads in (1, 4):
+        process = run([binary, "--seed=0", f"--games={games}", f"--threads={threads}", f"--size={SIZE}", "--clock=virtual"])
+        expect(process.returncode == 0, f"walker.slb failed with --threads={threads}, {describe(process)}")
+        expect(process.stdout == separate_out, f"the games print something else with --threads={threads} than one by one")
+        results = [line.removeprefix("slabes-result ") for line in process.stderr.splitlines() if line.startswith("slabes-result ")]
+        expect(results == separate_results, f"the result lines differ with --threads={threads} from the ones of the games one by one")
+
+
+def check_failed_save(checks: Checks) -> None:
+    """A trace that fails to write fails the run, also when the heatmap after it is saved"""
+
+    heatmap = checks.out_dir / "failed_save.heatmap"
+    process = run([checks.binary(MAZE_SOLVER), *PROGRAM_ARGS, "--trace=/dev/full", f"--heatmap={heatmap}"])
+    expect(process.returncode == 1, f"the trace failed to write and the run ended with {describe(process)}")
+    expect("Failed to record /dev/full" in process.stdout, f"the failed trace isn't reported, {describe(process)}")
+    expect(heatmap.exists(), "the heatmap isn't saved after the failed trace")
+
+
+CHECKS: dict[str, Callable[[Checks], None]] = {
+    "backends": check_backends,
+    "maze_file": check_maze_file,
+    "budgets": check_budgets,
+    "cycle": check_cycle,
+    "trace": check_trace,
+    "status": check_status,
+    "games": check_games,
+    "failed_save": check_failed_save,
+}
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("--cc", default="clang", help="C compiler of the programs and the tools")
+    argparser.add_argument("names", nargs="*", metavar="NAME", help=f"Checks to run: {', '.join(CHECKS)} (default: all)")
+    args = argparser.parse_args()
+    for name in args.names:
+        if name not in CHECKS:
+            argparser.error(f"unknown check '{name}', expected one of: {', '.join(CHECKS)}")
+
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        checks = Checks(Path(tmp), args.cc)
+        for name in args.names or CHECKS:
+            try:
+                CHECKS[name](checks)
+            except CheckFailed as e:
+                print(f"FAIL {name}: {e}")
+                failed.append(name)
+            else:
+                print(f"ok   {name}")
+
+    if failed:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()